@@ -1,110 +1,56 @@
-from flask import Flask, render_template_string
+from flask import Flask, Response, g, jsonify, request
+import base64
+import gzip
+import hashlib
 import json
+import math
 import os
+import random
+import string
+import threading
+import time
+from collections import namedtuple
 from datetime import datetime, timezone
+import sys
+import numpy as np
 from bs4 import BeautifulSoup
 
-app = Flask(__name__)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'scripts'))
+from ranking import INDEX_FIELDS, build_secondary_indexes
+from metrics import Counter, Gauge, Histogram, stage_timer, render_prometheus
+from post_store import PostStore, load_index
+import sqlite_store
 
-SCORED_PATH = os.path.join(os.path.dirname(__file__), 'data', 'processed', 'posts_scored.json')
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
-def get_plain_text(html):
-    if not isinstance(html, (str, bytes)):
-        print(f"Warning: html is of type {type(html)}, value: {html}")
-        html = str(html)
-    soup = BeautifulSoup(html, 'html.parser')
-    return soup.get_text()
-
-def get_time_ago(published_at):
-    if not published_at:
-        return ''
-    try:
-        dt = datetime.fromisoformat(published_at.replace('Z', '+00:00'))
-    except Exception:
-        return ''
-    now = datetime.now(timezone.utc)
-    delta = now - dt
-    seconds = delta.total_seconds()
-    hours = int(seconds // 3600)
-    days = int(seconds // 86400)
-    weeks = int(seconds // (86400 * 7))
-    years = int(seconds // (86400 * 365))
-    if hours < 24:
-        return f"{hours}h" if hours > 0 else "<1h"
-    elif days < 7:
-        return f"{days}d"
-    elif weeks < 52:
-        return f"{weeks}w"
-    else:
-        return f"{years}y"
+app = Flask(__name__)
 
-def truncate_body(body, word_limit=40):
-    words = body.split()
-    if len(words) <= word_limit:
-        return body, False
-    return ' '.join(words[:word_limit]) + ' ...', True
+INDEX_PATH = os.path.join(os.path.dirname(__file__), 'data', 'processed', 'posts_index.npy')
+STORE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'processed', 'posts_store.bin')
+STORE_OFFSETS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'processed', 'posts_store_offsets.npy')
+ORDERINGS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'processed', 'posts_orderings.npz')
+REFRESH_STATUS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'processed', 'refresh_status.json')
+# when set, feeds are paged straight from this SQLite database (see scripts/sqlite_store.py)
+DB_PATH = os.environ.get('CIRCLE_DB_PATH')
+SORTS = ('top', 'hot', 'recent')
+RELOAD_INTERVAL_SECONDS = 5
+FEED_SIZE = 50
+EXCLUDED_SPACES = {'Feature requests'}
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
 
-def get_avatar_initials(name):
-    if not name:
-        return "?"
-    parts = name.split()
-    if len(parts) == 1:
-        return parts[0][0].upper()
-    return (parts[0][0] + parts[-1][0]).upper()
+REQUEST_SECONDS = Histogram('circle_http_request_seconds', 'Request latency by endpoint and status', ['endpoint', 'status'])
+RENDER_CACHE = Counter('circle_render_cache_total', 'Feed page renders served from the cached page or rendered anew', ['result'])
+FEED_RELOADS = Counter('circle_feed_reloads_total', 'Feed cache reloads by outcome', ['outcome'])
+FEED_VERSION = Gauge('circle_feed_version_mtime_seconds', 'Modification time of the rank index the feed is serving')
+FEED_POSTS = Gauge('circle_feed_posts', 'Posts in the serving feed snapshot by sort', ['sort'])
+REFRESH_LAST_SUCCESS = Gauge('circle_refresh_last_success_timestamp_seconds', 'Unix time the last successful refresh finished')
+REFRESH_DURATION = Gauge('circle_refresh_duration_seconds', 'Duration of the last refresh cycle')
 
-@app.route('/')
-def feed():
-    with open(SCORED_PATH, encoding='utf-8') as f:
-        posts_data = json.load(f)
-    posts = []
-    count = 0
-    for post in posts_data:
-        space_name = post.get('space_name') or 'General'
-        if space_name == 'Feature requests':
-            continue
-        if count >= 50:
-            break
-        user_name = post.get('user_name') or 'Unknown User'
-        user_avatar = post.get('user_avatar_url')
-        title = post.get('name')
-        body_field = post.get('body', '')
-        if isinstance(body_field, dict):
-            body_html = body_field.get('body', '')
-        else:
-            body_html = body_field or ''
-        body = get_plain_text(body_html)
-        likes = post.get('likes_count', 0)
-        comments = post.get('comments_count', 0)
-        time_ago = get_time_ago(post.get('published_at'))
-        body_preview, is_truncated = truncate_body(body, 40)
-
-        avatars = []
-        if user_avatar:
-            avatars.append({'img': user_avatar, 'initials': None})
-        else:
-            avatars.append({'img': None, 'initials': get_avatar_initials(user_name)})
-
-        import random, string
-        for _ in range(2):
-            if random.random() > 0.5:
-                avatars.append({'img': None, 'initials': ''.join(random.choices(string.ascii_uppercase, k=2))})
-            else:
-                avatars.append({'img': f'https://randomuser.me/api/portraits/men/{random.randint(10,99)}.jpg', 'initials': None})
-        avatars = avatars[:3]
-        posts.append({
-            'user': user_name,
-            'profile_pic': user_avatar,
-            'category': space_name,
-            'title': title,
-            'body': body_preview,
-            'comments': comments,
-            'likes': likes,
-            'time_ago': time_ago,
-            'see_more': is_truncated,
-            'avatars': avatars,
-        })
-        count += 1
-    return render_template_string('''
+FEED_TEMPLATE = '''
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -158,7 +104,8 @@ def feed():
             font-size: 0.9em;
             font-weight: 400;
             font-family: 'Inter', Arial, sans-serif;
-            cursor: not-allowed;
+            cursor: pointer;
+            text-decoration: none;
             outline: none;
             box-shadow: 0 1px 4px rgba(0,0,0,0.04);
             transition: background 0.2s, color 0.2s;
@@ -403,9 +350,9 @@ def feed():
 <body>
     <div class="top-bar">Circle's Advanced Feed</div>
     <div class="feed-sort-bar">
-        <button class="feed-sort-btn active" disabled>Top</button>
-        <button class="feed-sort-btn" disabled>Hot</button>
-        <button class="feed-sort-btn" disabled>Recent</button>
+        {% for name in sorts %}
+        <a class="feed-sort-btn{% if name == sort %} active{% endif %}" href="?sort={{ name }}">{{ name | capitalize }}</a>
+        {% endfor %}
     </div>
     <div class="feed-container">
         {% for post in posts %}
@@ -477,7 +424,583 @@ def feed():
     </div>
 </body>
 </html>
-''', posts=posts)
+'''
+
+feed_template = app.jinja_env.from_string(FEED_TEMPLATE)
+
+def get_plain_text(html):
+    if not isinstance(html, (str, bytes)):
+        print(f"Warning: html is of type {type(html)}, value: {html}")
+        html = str(html)
+    soup = BeautifulSoup(html, 'html.parser')
+    return soup.get_text()
+
+def parse_published_at(published_at):
+    if not published_at:
+        return None
+    try:
+        return datetime.fromisoformat(published_at.replace('Z', '+00:00'))
+    except Exception:
+        return None
+
+def get_time_ago(published_at, now=None):
+    dt = published_at if isinstance(published_at, datetime) else parse_published_at(published_at)
+    if dt is None:
+        return ''
+    now = now or datetime.now(timezone.utc)
+    delta = now - dt
+    seconds = delta.total_seconds()
+    hours = int(seconds // 3600)
+    days = int(seconds // 86400)
+    weeks = int(seconds // (86400 * 7))
+    years = int(seconds // (86400 * 365))
+    if hours < 24:
+        return f"{hours}h" if hours > 0 else "<1h"
+    elif days < 7:
+        return f"{days}d"
+    elif weeks < 52:
+        return f"{weeks}w"
+    else:
+        return f"{years}y"
+
+def truncate_body(body, word_limit=40):
+    words = body.split()
+    if len(words) <= word_limit:
+        return body, False
+    return ' '.join(words[:word_limit]) + ' ...', True
+
+def get_avatar_initials(name):
+    if not name:
+        return "?"
+    parts = name.split()
+    if len(parts) == 1:
+        return parts[0][0].upper()
+    return (parts[0][0] + parts[-1][0]).upper()
+
+def build_card(post):
+    space_name = post.get('space_name') or 'General'
+    user_name = post.get('user_name') or 'Unknown User'
+    user_avatar = post.get('user_avatar_url')
+    title = post.get('name')
+    if 'body_preview' in post:
+        # precomputed by scripts/processing.py
+        body_preview, is_truncated = post['body_preview'], post.get('see_more', False)
+    else:
+        body_field = post.get('body', '')
+        if isinstance(body_field, dict):
+            body_html = body_field.get('body', '')
+        else:
+            body_html = body_field or ''
+        body_preview, is_truncated = truncate_body(get_plain_text(body_html), 40)
+    likes = post.get('likes_count', 0)
+    comments = post.get('comments_count', 0)
+
+    avatars = []
+    if user_avatar:
+        avatars.append({'img': user_avatar, 'initials': None})
+    else:
+        avatars.append({'img': None, 'initials': get_avatar_initials(user_name)})
+
+    for _ in range(2):
+        if random.random() > 0.5:
+            avatars.append({'img': None, 'initials': ''.join(random.choices(string.ascii_uppercase, k=2))})
+        else:
+            avatars.append({'img': f'https://randomuser.me/api/portraits/men/{random.randint(10,99)}.jpg', 'initials': None})
+    avatars = avatars[:3]
+    return {
+        'user': user_name,
+        'profile_pic': user_avatar,
+        'category': space_name,
+        'title': title,
+        'body': body_preview,
+        'comments': comments,
+        'likes': likes,
+        'published_at': parse_published_at(post.get('published_at')),
+        'see_more': is_truncated,
+        'avatars': avatars,
+    }
+
+def build_feed(posts_data):
+    posts = []
+    for post in posts_data:
+        if (post.get('space_name') or 'General') in EXCLUDED_SPACES:
+            continue
+        if len(posts) >= FEED_SIZE:
+            break
+        posts.append(build_card(post))
+    return posts
+
+def output_paths(index_path):
+    # The index, store, offsets and orderings to load as one version. If the index is a
+    # link (refresher.py publishes through current/), it is resolved once and the rest
+    # are opened from the same directory, so a publish meanwhile can't mix two versions.
+    if not os.path.islink(index_path):
+        return index_path, STORE_PATH, STORE_OFFSETS_PATH, ORDERINGS_PATH
+    index_path = os.path.realpath(index_path)
+    directory = os.path.dirname(index_path)
+    return (index_path, *(os.path.join(directory, os.path.basename(path)) for path in (STORE_PATH, STORE_OFFSETS_PATH, ORDERINGS_PATH)))
+
+def file_version(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+class RankIndex:
+    # One sort's feed as rows of the memory-mapped rank index, in display order, plus
+    # the (tier, key) columns they are sorted by: tier ascending, then key descending
+    # (age_bucket and score for Top). A cursor from an older version can then be placed
+    # in this one by binary search on the last post's (tier, key). Post records are
+    # read from the store only for the positions a page returns.
+    def __init__(self, index, rows, store, version, tiers, keys):
+        self.index = index
+        self.rows = rows
+        self.store = store
+        self.version = version
+        self.buckets = np.asarray(tiers, dtype=np.int64)
+        self.scores = np.asarray(keys, dtype=float)
+        self.ids = index['id'][rows]
+        self.fields = {field: index[field][rows] for field in INDEX_FIELDS}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def posts(self, positions):
+        return [load_post(self.index, self.store, row) for row in self.rows[positions].tolist()]
+
+    def cursor_at(self, position):
+        last = position - 1
+        return encode_cursor({
+            'v': self.version,
+            'p': position,
+            'b': int(self.buckets[last]),
+            's': float(self.scores[last]),
+            'id': int(self.ids[last]),
+        })
+
+    def locate(self, cursor):
+        if cursor['v'] == self.version:
+            return cursor['p']
+        lo, hi = np.searchsorted(self.buckets, cursor['b'], side='left'), np.searchsorted(self.buckets, cursor['b'], side='right')
+        tied_from = lo + np.searchsorted(-self.scores[lo:hi], -cursor['s'], side='left')
+        tied_to = lo + np.searchsorted(-self.scores[lo:hi], -cursor['s'], side='right')
+        # among posts tied on the key, resume after the last one served if it is still there
+        for position in range(tied_from, tied_to):
+            if self.ids[position] == cursor['id']:
+                return position + 1
+        return int(tied_from)
+
+    def attach_groups(self, secondary, rows, total):
+        # Re-express the scoring stage's per-value position lists (positions in the scored
+        # file) as sorted positions within this index, dropping filtered-out posts. Per
+        # field, all groups are kept as one sorted array of group * len(rows) + position,
+        # so the positions of many groups in a range take one vectorized binary search.
+        rank = np.full(total, -1, dtype=np.int64)
+        rank[rows] = np.arange(len(rows))
+        self.groups = {}
+        for field in INDEX_FIELDS:
+            keys = secondary[f'{field}_keys']
+            offsets = secondary[f'{field}_offsets']
+            positions = rank[secondary[f'{field}_positions']]
+            group = np.repeat(np.arange(len(keys), dtype=np.int64), np.diff(offsets))
+            present = positions >= 0
+            positions, group = positions[present], group[present]
+            codes = {key: i for i, key in enumerate(keys.tolist())}
+            self.groups[field] = (codes, np.bincount(group, minlength=len(keys)), np.sort(group * len(rows) + positions))
+
+    def group_codes(self, field, values):
+        codes = self.groups[field][0]
+        return np.array([codes[value] for value in values if value in codes], dtype=np.int64)
+
+    def group_size(self, field, values):
+        return int(self.groups[field][1][self.group_codes(field, values)].sum())
+
+    def positions_in(self, field, codes, lo, hi):
+        # the positions in [lo, hi) of the posts in any of `field`'s groups `codes`, sorted
+        flat, n = self.groups[field][2], len(self.rows)
+        starts = flat.searchsorted(codes * n + lo)
+        lengths = flat.searchsorted(codes * n + hi) - starts
+        picked = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.unique(flat[picked] % n)
+
+    def select(self, include, exclude, start, count):
+        # Filtered positions from `start` on, a window of positions at a time, the window
+        # doubling until `count` are found. In a window, the posts of the most selective
+        # included field (or every position, with only exclusions) and of the excluded
+        # groups are cut from the secondary index by binary search, so an excluded post
+        # is dropped with its group rather than tested row by row; any other included
+        # field is checked on the candidates left.
+        driver = min(include, key=lambda field: self.group_size(field, include[field])) if include else None
+        driver_codes = self.group_codes(driver, include[driver]) if driver else None
+        excluded = [(field, self.group_codes(field, values)) for field, values in exclude.items()]
+        excluded = [(field, codes) for field, codes in excluded if len(codes)]
+        checks = [(self.fields[field], [v for v in values if is_int(v)]) for field, values in include.items() if field != driver]
+        if driver is not None and not len(driver_codes):
+            return []
+        selected = []
+        lo, window = start, 2 * count
+        while lo < len(self.rows) and len(selected) < count:
+            hi = min(lo + window, len(self.rows))
+            candidates = np.arange(lo, hi) if driver is None else self.positions_in(driver, driver_codes, lo, hi)
+            for field, codes in excluded:
+                candidates = candidates[~np.isin(candidates, self.positions_in(field, codes, lo, hi))]
+            for values, wanted in checks:
+                candidates = candidates[np.isin(values[candidates], wanted)]
+            selected.extend(candidates[:count - len(selected)].tolist())
+            lo, window = hi, window * 2
+        return selected
+
+    def page(self, cursor, limit, include=None, exclude=None):
+        start = 0 if cursor is None else self.locate(decode_cursor(cursor))
+        if not include and not exclude:
+            end = min(start + limit, len(self.rows))
+            next_cursor = self.cursor_at(end) if end < len(self.rows) else None
+            return self.posts(np.arange(start, end)), next_cursor
+        positions = self.select(include or {}, exclude or {}, start, limit + 1)
+        next_cursor = self.cursor_at(positions[limit - 1] + 1) if len(positions) > limit else None
+        return self.posts(np.array(positions[:limit], dtype=np.int64)), next_cursor
+
+def encode_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def is_int(value):
+    # an int that fits the index's and SQLite's 64-bit columns
+    return isinstance(value, int) and not isinstance(value, bool) and -2**63 <= value < 2**63
+
+# every cursor field's check; a cursor is client input, so a bad field must be a 400
+# here rather than a TypeError once it reaches RankIndex.locate or a query
+CURSOR_FIELDS = {
+    'v': lambda value: isinstance(value, str),
+    'p': lambda value: is_int(value) and value >= 0,
+    'b': is_int,
+    's': lambda value: (is_int(value) or isinstance(value, float)) and math.isfinite(value),
+    'id': is_int,
+}
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        cursor = {key: payload[key] for key in CURSOR_FIELDS}
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f'invalid cursor: {e}')
+    for key, valid in CURSOR_FIELDS.items():
+        if not valid(cursor[key]):
+            raise ValueError(f'invalid cursor: bad {key!r}')
+    return cursor
+
+def api_post(post):
+    if 'body_preview' in post:
+        body_preview, see_more = post['body_preview'], post.get('see_more', False)
+    else:
+        body_field = post.get('body', '')
+        body_html = body_field.get('body', '') if isinstance(body_field, dict) else body_field or ''
+        body_preview, see_more = truncate_body(get_plain_text(body_html), 40)
+    return {
+        'id': post.get('id'),
+        'title': post.get('name'),
+        'body_preview': body_preview,
+        'see_more': see_more,
+        'url': post.get('url'),
+        'space_id': post.get('space_id'),
+        'space_name': post.get('space_name') or 'General',
+        'user_id': post.get('user_id'),
+        'user_name': post.get('user_name') or 'Unknown User',
+        'user_avatar_url': post.get('user_avatar_url'),
+        'likes_count': post.get('likes_count', 0),
+        'comments_count': post.get('comments_count', 0),
+        'published_at': post.get('published_at'),
+        'score': post.get('score'),
+    }
+
+def load_post(index, store, row):
+    # the stored record with the ranking fields put back from the index
+    entry = index[row]
+    return dict(store.get(int(entry['id'])), score=float(entry['score']), age_bucket=int(entry['age_bucket']), hot_score=float(entry['hot_score']))
+
+def load_orderings(path, index):
+    # Sort orderings and secondary indexes as written by the scoring scripts; recomputed
+    # from the rank index (once per version) if the file is missing or belongs to another one.
+    try:
+        with np.load(path, allow_pickle=False) as saved:
+            if np.array_equal(saved['ids'], index['id']):
+                return {key: saved[key] for key in saved.files}
+    except (OSError, KeyError, ValueError):
+        pass
+    # the index also holds posts only Hot or Recent list (outside the age buckets or
+    # past Top's limit), so Top is the bucketed posts, fresher buckets first
+    top = np.flatnonzero(index['age_bucket'] >= 0)
+    orderings = {
+        'top': top[np.lexsort((-index['score'][top], index['age_bucket'][top]))],
+        'hot': np.argsort(-index['hot_score'], kind='stable'),
+        'recent': np.argsort(-index['published_ts'], kind='stable'),
+    }
+    orderings.update(build_secondary_indexes({field: np.asarray(index[field]) for field in INDEX_FIELDS}))
+    return orderings
+
+def excluded_space_ids(index, store):
+    # space names are only in the store, so one record per distinct space is read;
+    # all posts of a space are taken to share its name
+    space_ids, first = np.unique(index['space_id'], return_index=True)
+    return [
+        space_id for space_id, row in zip(space_ids.tolist(), first.tolist())
+        if (store.get(int(index['id'][row])).get('space_name') or 'General') in EXCLUDED_SPACES
+    ]
+
+def sort_keys(sort, index, rows):
+    if sort == 'top':
+        return index['age_bucket'][rows], index['score'][rows]
+    if sort == 'hot':
+        return np.zeros(len(rows)), index['hot_score'][rows]
+    return np.zeros(len(rows)), index['published_ts'][rows]
+
+def feed_cards(index, cards, reusable):
+    # the first FEED_SIZE posts of a sort as feed cards; a post whose card is in
+    # `cards` (built for another sort) or `reusable` (unchanged since the last
+    # snapshot) isn't read from the store again
+    feed = []
+    for position, post_id in enumerate(index.ids[:FEED_SIZE].tolist()):
+        card = cards.get(post_id) or reusable.get(post_id)
+        if card is None:
+            card = build_card(index.posts([position])[0])
+        cards[post_id] = card
+        feed.append(card)
+    return feed
+
+FeedSnapshot = namedtuple('FeedSnapshot', ['version', 'posts', 'indexes', 'cards', 'processed'])
+
+class FeedCache:
+    # Holds the rendered feeds and rank indexes as one FeedSnapshot. A watcher thread
+    # rebuilds it when the rank index changes and swaps it in a single assignment, so
+    # a request sees either the old feed or the new one, never a mix. A snapshot keeps
+    # its own mappings of the index and store, which stay readable after they are replaced.
+    # Cards of posts that processing reports unchanged carry over to the next snapshot.
+    def __init__(self, path, interval=RELOAD_INTERVAL_SECONDS):
+        self.path = path
+        self.interval = interval
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def load(self):
+        index_path, store_path, offsets_path, orderings_path = output_paths(self.path)
+        version = file_version(index_path)
+        if self._snapshot is not None and self._snapshot.version == version:
+            return False
+        with stage_timer('feed_load'):
+            index = load_index(index_path)
+            store = PostStore(store_path, offsets_path)
+            if not store.contains(index['id']).all():
+                raise ValueError(f'{store_path} does not hold every post in {index_path}')
+            orderings = load_orderings(orderings_path, index)
+            keep = ~np.isin(index['space_id'], excluded_space_ids(index, store))
+            reusable = self.reusable_cards(orderings)
+            posts, indexes, cards = {}, {}, {}
+            for sort in SORTS:
+                order = np.asarray(orderings[sort], dtype=np.int64)
+                rows = order[keep[order]]
+                indexes[sort] = RankIndex(index, rows, store, f'{version[0]}-{version[1]}', *sort_keys(sort, index, rows))
+                indexes[sort].attach_groups(orderings, rows, len(index))
+                posts[sort] = feed_cards(indexes[sort], cards, reusable)
+        processed = str(orderings['processed']) if 'processed' in orderings else None
+        self._snapshot = FeedSnapshot(version, posts, indexes, cards, processed)
+        FEED_RELOADS.inc(outcome='loaded')
+        FEED_VERSION.set(version[0] / 1e9)
+        for sort in SORTS:
+            FEED_POSTS.set(len(indexes[sort]), sort=sort)
+        return True
+
+    def reusable_cards(self, orderings):
+        # The previous snapshot's cards that still match their posts: all of them if
+        # the processed posts are the same, those not in processing's change set if
+        # it is relative to them, and none if the chain of runs can't be followed.
+        previous = self._snapshot
+        if previous is None or not previous.processed or 'processed' not in orderings:
+            return {}
+        if str(orderings['processed']) == previous.processed:
+            return previous.cards
+        if str(orderings['changed_base']) != previous.processed:
+            return {}
+        changed = set(orderings['changed_ids'].tolist())
+        return {post_id: card for post_id, card in previous.cards.items() if post_id not in changed}
+
+    def get(self):
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self.load()
+                if self._watcher is None:
+                    self._watcher = threading.Thread(target=self._watch, daemon=True)
+                    self._watcher.start()
+        return self._snapshot
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.load()
+            except Exception as e:
+                # missing, half-written or malformed output (e.g. an npz without a sort):
+                # keep serving the last good feed and retry, whatever the error
+                FEED_RELOADS.inc(outcome='failed')
+                print(f"Warning: feed reload failed: {type(e).__name__}: {e}")
+
+feed_cache = FeedCache(INDEX_PATH)
+
+def get_db():
+    # one read-only connection per request; WAL lets the pipeline write meanwhile
+    if 'db' not in g:
+        g.db = sqlite_store.connect(DB_PATH, readonly=True)
+    return g.db
+
+@app.teardown_appcontext
+def close_db(exception):
+    db = g.pop('db', None)
+    if db is not None:
+        db.close()
+
+def db_version(db):
+    return (sqlite_store.get_meta(db, 'processed_at'), sqlite_store.get_meta(db, 'scored_at'))
+
+def db_page(db, sort, cursor, limit, include=None, exclude=None):
+    # Cursors carry the last post's (age_bucket, sort key, id), which the next query
+    # resumes after; unlike rank index cursors they need no snapshot to stay valid.
+    start, after = 0, None
+    if cursor is not None:
+        payload = decode_cursor(cursor)
+        if payload['v'] != 'db':
+            raise ValueError('invalid cursor: not a database cursor')
+        start, after = payload['p'], (payload['b'], payload['s'], payload['id'])
+    posts = sqlite_store.page_posts(db, sort, after, limit + 1, include, exclude, EXCLUDED_SPACES)
+    next_cursor = None
+    if len(posts) > limit:
+        last = posts[limit - 1]
+        next_cursor = encode_cursor({
+            'v': 'db',
+            'p': start + limit,
+            'b': last['age_bucket'],
+            's': last[sqlite_store.SORT_KEYS[sort]],
+            'id': last['id'],
+        })
+    return posts[:limit], next_cursor
+
+# (database version, {sort: feed}); a new version starts an empty dict
+_db_feeds = (None, {})
+
+def db_feed(db, version, sort):
+    # built once per database version and sort, like the file feed is once per load
+    global _db_feeds
+    feeds_version, feeds = _db_feeds
+    if feeds_version != version:
+        feeds = {}
+        _db_feeds = (version, feeds)
+    if sort not in feeds:
+        feeds[sort] = build_feed(db_page(db, sort, None, FEED_SIZE)[0])
+    return feeds[sort]
+
+ENCODING_PREFERENCE = ('br', 'gzip', 'identity')
+RenderedPage = namedtuple('RenderedPage', ['key', 'etag', 'variants'])
+# (feed version, {sort: RenderedPage}), so switching sorts doesn't evict the others
+_rendered_pages = (None, {})
+
+def compress_variants(body):
+    variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body)
+    return variants
+
+def render_feed_page(version, sort, posts):
+    # A sort's page only changes with the feed version or when a "time ago" label
+    # ticks over, so it is rendered, hashed and compressed once per such key and
+    # reused. Each sort keeps its own page until the version changes.
+    global _rendered_pages
+    pages_version, pages = _rendered_pages
+    if pages_version != version:
+        pages = {}
+        _rendered_pages = (version, pages)
+    key = tuple(post['time_ago'] for post in posts)
+    page = pages.get(sort)
+    if page is None or page.key != key:
+        RENDER_CACHE.inc(result='miss')
+        body = feed_template.render(posts=posts, sort=sort, sorts=SORTS).encode('utf-8')
+        page = RenderedPage(key, hashlib.sha256(body).hexdigest()[:32], compress_variants(body))
+        pages[sort] = page
+    else:
+        RENDER_CACHE.inc(result='hit')
+    return page
+
+def requested_sort():
+    sort = request.args.get('sort', 'top')
+    return sort if sort in SORTS else 'top'
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    REQUEST_SECONDS.observe(time.perf_counter() - g.started, endpoint=request.endpoint or 'unknown', status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    # the refresher runs in its own process; its status file is read at scrape time
+    try:
+        with open(REFRESH_STATUS_PATH, encoding='utf-8') as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        status = {}
+    if status.get('last_success'):
+        REFRESH_LAST_SUCCESS.set(status['last_success'])
+    if status.get('last_duration_seconds') is not None:
+        REFRESH_DURATION.set(status['last_duration_seconds'])
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/')
+def feed():
+    sort = requested_sort()
+    if DB_PATH:
+        version = db_version(get_db())
+        cached_posts = db_feed(get_db(), version, sort)
+    else:
+        snapshot = feed_cache.get()
+        version, cached_posts = snapshot.version, snapshot.posts[sort]
+    now = datetime.now(timezone.utc)
+    posts = [dict(post, time_ago=get_time_ago(post['published_at'], now)) for post in cached_posts]
+    page = render_feed_page(version, sort, posts)
+    encoding = request.accept_encodings.best_match([e for e in ENCODING_PREFERENCE if e in page.variants], default='identity')
+    response = Response(page.variants[encoding], mimetype='text/html')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.cache_control.no_cache = True
+    response.set_etag(f'{page.etag}-{encoding}')
+    return response.make_conditional(request)
+
+def filter_value(value):
+    return int(value) if value.lstrip('-').isdigit() else value
+
+def requested_filters():
+    # ?space_id=1&space_id=2 keeps posts in either space; different fields must all
+    # match; ?exclude_user_id=7 drops that author's posts
+    include, exclude = {}, {}
+    for field in INDEX_FIELDS:
+        if field in request.args:
+            include[field] = {filter_value(v) for v in request.args.getlist(field)}
+        if f'exclude_{field}' in request.args:
+            exclude[field] = {filter_value(v) for v in request.args.getlist(f'exclude_{field}')}
+    return include, exclude
+
+@app.route('/api/feed')
+def api_feed():
+    limit = max(1, min(request.args.get('limit', API_PAGE_SIZE, type=int), API_MAX_PAGE_SIZE))
+    cursor = request.args.get('cursor') or None
+    include, exclude = requested_filters()
+    try:
+        if DB_PATH:
+            posts, next_cursor = db_page(get_db(), requested_sort(), cursor, limit, include, exclude)
+        else:
+            posts, next_cursor = feed_cache.get().indexes[requested_sort()].page(cursor, limit, include, exclude)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(posts=[api_post(post) for post in posts], next_cursor=next_cursor)
 
 if __name__ == '__main__':
     app.run(debug=True, port=8000)
@@ -0,0 +1,97 @@
+import numpy as np
+
+# Synthetic raw posts shaped like the Circle /posts API. Engagement is Zipfian,
+# publish times cover every age bucket, bodies are HTML of log-normally varying
+# length, and posts are spread over many spaces and authors (both Zipfian too).
+# Bodies come from a fixed pool, and posts are generated a chunk at a time, so a
+# 10M-post corpus can be streamed to disk without ever being held in memory.
+
+AGE_SPREAD_DAYS = [(0, 2, 0.15), (2, 5, 0.1), (5, 7, 0.05), (7, 15, 0.1), (15, 30, 0.1), (30, 90, 0.2), (90, 730, 0.3)]
+BODY_POOL_SIZE = 4096
+CHUNK_POSTS = 100000
+WORDS = ["feed", "ranking", "community", "launch", "question", "update", "thanks", "event", "welcome", "idea", "help", "roadmap"]
+NAMES = ["Ann Lee", "Bob", "Cy Dee Ee", "Dana Fox", "Eli", "Fatima Noor", "Gus Hale", "Hiro Tanaka"]
+EXCLUDED_SPACE = (7, "Feature requests")
+
+def make_body(rng, words):
+    parts = []
+    for i in range(words):
+        word = WORDS[rng.integers(len(WORDS))]
+        if i % 17 == 5:
+            word = f"<a href=\"https://example.com/{i}\">{word}</a>"
+        elif i % 11 == 3:
+            word = f"<strong>{word}</strong> &amp;"
+        parts.append(word)
+        if i % 40 == 39:
+            parts.append("</p><p>")
+    return f"<div><p>{' '.join(parts)}</p></div>"
+
+def make_bodies(rng, size = BODY_POOL_SIZE):
+    # median ~35 words with a long tail into the thousands
+    lengths = np.minimum(rng.lognormal(3.5, 1.1, size).astype(int), 5000)
+    return [make_body(rng, n) for n in lengths.tolist()]
+
+def zipf_ids(rng, n, count, a = 1.3):
+    # ids 1..count, id 1 most frequent
+    return (rng.zipf(a, n) - 1) % count + 1
+
+def published_times(rng, n, now):
+    spans = np.array([(lo, hi) for lo, hi, _ in AGE_SPREAD_DAYS], dtype = float)
+    weights = np.array([w for _, _, w in AGE_SPREAD_DAYS])
+    bucket = rng.choice(len(spans), n, p = weights / weights.sum())
+    age_days = rng.uniform(spans[bucket, 0], spans[bucket, 1])
+    return np.datetime64(int(now * 1000), "ms") - (age_days * 86400000).astype("timedelta64[ms]")
+
+def iso(times):
+    return [f"{t}Z" for t in np.datetime_as_string(times, unit = "ms").tolist()]
+
+def make_chunk(rng, start, n, now, bodies, n_spaces, n_users):
+    published = published_times(rng, n, now)
+    updated = published + rng.integers(0, 6 * 3600000, n).astype("timedelta64[ms]")
+    columns = {
+        "id": np.arange(start + 1, start + n + 1).tolist(),
+        "published_at": iso(published),
+        "updated_at": iso(updated),
+        "likes_count": np.minimum(rng.zipf(1.8, n) - 1, 100000).tolist(),
+        "comments_count": np.minimum(rng.zipf(2.2, n) - 1, 20000).tolist(),
+        "space_id": zipf_ids(rng, n, n_spaces).tolist(),
+        "user_id": zipf_ids(rng, n, n_users, a = 1.5).tolist(),
+        "community_id": rng.integers(1, 4, n).tolist(),
+        "body": rng.integers(0, len(bodies), n).tolist(),
+        "name": rng.integers(0, 3, n).tolist(),
+        "user_name": rng.integers(0, len(NAMES), n).tolist(),
+    }
+    posts = []
+    for post_id, published_at, updated_at, likes, comments, space_id, user_id, community_id, body, name, user_name in zip(*columns.values()):
+        posts.append({
+            "id": post_id,
+            "status": "published",
+            "name": f"Post {post_id}" if name else None,
+            "published_at": published_at,
+            "created_at": published_at,
+            "updated_at": updated_at,
+            "url": f"https://community.example.com/c/{space_id}/{post_id}",
+            "body": {"body": bodies[body], "record_type": "Post"},
+            "space_id": space_id,
+            "space_name": EXCLUDED_SPACE[1] if space_id == EXCLUDED_SPACE[0] else f"Space {space_id}",
+            "community_id": community_id,
+            "user_id": user_id,
+            "user_name": NAMES[user_name],
+            "user_email": f"user{user_id}@example.com",
+            "likes_count": likes,
+            "comments_count": comments,
+        })
+    return posts
+
+def iter_raw_posts(n, now, seed = 0, chunk_size = CHUNK_POSTS):
+    # the corpus one post at a time, drawing chunk_size posts' columns at once
+    rng = np.random.default_rng(seed)
+    bodies = make_bodies(rng)
+    n_spaces = max(20, n // 500)
+    n_users = max(100, n // 20)
+    for start in range(0, n, chunk_size):
+        yield from make_chunk(rng, start, min(chunk_size, n - start), now, bodies, n_spaces, n_users)
+
+def make_raw_posts(n, now, seed = 0):
+    # the whole corpus as a list, about 1.1 KB a post; large runs use iter_raw_posts
+    return list(iter_raw_posts(n, now, seed))
@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import requests
+from live_index import LiveIndex
+from scoring import DEFAULT_CONFIG
+
+# Synthetic engagement events for scripts/live_server.py, no Circle API needed.
+# Popularity is skewed (a few posts get most likes), with a trickle of new posts
+# and deletions. Without --url the events are applied to an in-process LiveIndex
+# at several corpus sizes to show the per-event cost staying flat as n grows.
+
+EVENT_MIX = {"like": 0.78, "comment": 0.17, "post": 0.03, "delete": 0.02}
+
+def make_post(post_id, now, max_age_days = 120):
+    published = now - timedelta(seconds = random.uniform(0, max_age_days * 86400))
+    return {
+        "id": post_id,
+        "published_at": published.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "likes_count": int(random.paretovariate(1.5)) - 1,
+        "comments_count": int(random.paretovariate(2)) - 1,
+    }
+
+def make_posts(n, now):
+    return [make_post(post_id, now) for post_id in range(1, n + 1)]
+
+def make_events(post_ids, count, now):
+    # post_ids is extended/shrunk as new-post and delete events are generated
+    kinds = random.choices(list(EVENT_MIX), weights = list(EVENT_MIX.values()), k = count)
+    next_id = max(post_ids) + 1
+    events = []
+    for kind in kinds:
+        if kind == "post":
+            events.append({"type": "post", "post": make_post(next_id, now, max_age_days = 0.01)})
+            post_ids.append(next_id)
+            next_id += 1
+            continue
+        # paretovariate picks low positions far more often: the newest posts stay hot
+        post_id = post_ids[-min(len(post_ids), int(random.paretovariate(0.6)))]
+        if kind == "delete":
+            post_ids.remove(post_id)
+            events.append({"type": "delete", "post_id": post_id})
+        else:
+            events.append({"type": kind, "post_id": post_id, "delta": 1 if random.random() < 0.97 else -1})
+    return events
+
+def run_in_process(sizes, count):
+    now = datetime.now(timezone.utc)
+    config = DEFAULT_CONFIG._replace(mode = "log")
+    for n in sizes:
+        posts = make_posts(n, now)
+        start = time.perf_counter()
+        index = LiveIndex.from_records(posts, config)
+        build = time.perf_counter() - start
+        events = make_events([post["id"] for post in posts], count, now)
+        start = time.perf_counter()
+        for event in events:
+            index.apply(event)
+        seconds = time.perf_counter() - start
+        print(f"{n:9d} posts: build {build:6.2f}s  {count} events in {seconds:6.2f}s  {seconds / count * 1e6:6.1f}us/event")
+
+def run_http(url, count, batch):
+    response = requests.get(f"{url}/feed", params = {"limit": 100})
+    response.raise_for_status()
+    post_ids = [post["id"] for post in response.json()["posts"]]
+    if not post_ids:
+        raise SystemExit("live server has no ranked posts to send events for")
+    session = requests.Session()
+    now = datetime.now(timezone.utc)
+    applied = 0
+    start = time.perf_counter()
+    for offset in range(0, count, batch):
+        events = make_events(post_ids, min(batch, count - offset), now)
+        response = session.post(f"{url}/events", data = json.dumps(events), headers = {"Content-Type": "application/json"})
+        response.raise_for_status()
+        applied += response.json()["applied"]
+    seconds = time.perf_counter() - start
+    print(f"sent {count} events in batches of {batch}: {applied} applied, {count / seconds:.0f} events/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Generate engagement events for the live ranking index.")
+    parser.add_argument("--url", default = None, help = "live server base URL, e.g. http://127.0.0.1:8765 (default: run in-process)")
+    parser.add_argument("--events", type = int, default = 20000)
+    parser.add_argument("--batch", type = int, default = 100, help = "events per POST when sending to --url")
+    parser.add_argument("--posts", type = int, nargs = "+", default = [10000, 100000, 1000000], help = "corpus sizes for the in-process run")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if args.url:
+        run_http(args.url.rstrip("/"), args.events, args.batch)
+    else:
+        run_in_process(args.posts, args.events)
@@ -0,0 +1,39 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from fetching import fetch_all
+from mock_api import MockPostsServer
+
+def make_posts(n):
+    return [{"id": i, "updated_at": "2025-07-23T03:04:22.206Z", "body": {"body": "<p>post</p>"}} for i in range(n, 0, -1)]
+
+def run(server, concurrency, per_page):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        posts, failed = fetch_all(server.url, per_page = per_page, headers = {"Authorization": "Bearer benchmark"}, concurrency = concurrency)
+    return time.perf_counter() - start, len(posts), failed
+
+def main():
+    parser = argparse.ArgumentParser(description = "Time fetch_all against a local mock /posts server.")
+    parser.add_argument("--posts", type = int, default = 5000)
+    parser.add_argument("--per-page", type = int, default = 100)
+    parser.add_argument("--latency", type = float, default = 0.05, help = "seconds added to every response")
+    parser.add_argument("--throttle-rate", type = float, default = 0.0, help = "share of requests answered with 429")
+    parser.add_argument("--concurrency", type = int, nargs = "+", default = [1, 4, 8, 16])
+    args = parser.parse_args()
+
+    posts = make_posts(args.posts)
+    print(f"{args.posts} posts, {args.per_page}/page, {args.latency * 1000:.0f}ms latency, {args.throttle_rate:.0%} throttled")
+    for concurrency in args.concurrency:
+        with MockPostsServer(posts, latency = args.latency, throttle_rate = args.throttle_rate) as server:
+            seconds, fetched, failed = run(server, concurrency, args.per_page)
+        print(f"concurrency {concurrency:3d}: {seconds:7.2f}s  {fetched} posts  {server.requests} requests  {server.throttled} throttled  failed pages: {failed}")
+
+if __name__ == "__main__":
+    main()
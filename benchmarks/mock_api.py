@@ -0,0 +1,91 @@
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Minimal stand-in for the Circle /posts endpoint: paginated records with
+# has_next_page, a fixed per-request latency and an optional share of 429s.
+# faults: {page: [status, ...]} answers given to that page's requests in turn
+# before it is served normally; "truncated" is a 200 with a cut-off JSON body.
+# sort=updated_at&order=desc pages the posts most recently updated first, unless
+# sortable is False (an API that ignores it); otherwise they are paged as given.
+class MockPostsServer:
+    def __init__(self, posts, latency = 0.0, throttle_rate = 0.0, retry_after = 0.1, port = 0, faults = None, sortable = True):
+        self.posts = posts
+        self.sortable = sortable
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.faults = {page: list(answers) for page, answers in (faults or {}).items()}
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = threading.Thread(target = self._server.serve_forever, daemon = True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/api/admin/v2/posts"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                page = int(query.get("page", ["1"])[0])
+                per_page = int(query.get("per_page", ["100"])[0])
+                with mock._lock:
+                    mock.requests += 1
+                    throttle = random.random() < mock.throttle_rate
+                    if throttle:
+                        mock.throttled += 1
+                    fault = mock.faults[page].pop(0) if mock.faults.get(page) else None
+                time.sleep(mock.latency)
+                if fault == "truncated":
+                    self._send(200, {"records": []}, cut = 5)
+                    return
+                if fault is not None:
+                    self._send(fault, {"error": "injected"}, {"Retry-After": str(mock.retry_after)} if fault == 429 else None)
+                    return
+                if throttle:
+                    self._send(429, {"error": "rate limited"}, {"Retry-After": str(mock.retry_after)})
+                    return
+                posts = mock.posts
+                if mock.sortable and query.get("sort") == ["updated_at"] and query.get("order") == ["desc"]:
+                    posts = sorted(posts, key = lambda post: post.get("updated_at") or "", reverse = True)
+                start = (page - 1) * per_page
+                self._send(200, {
+                    "page": page,
+                    "per_page": per_page,
+                    "has_next_page": start + per_page < len(posts),
+                    "records": posts[start:start + per_page],
+                })
+
+            def _send(self, status, payload, headers = None, cut = None):
+                body = json.dumps(payload).encode()[:cut]
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -0,0 +1,202 @@
+import argparse
+import contextlib
+import gc
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import app
+import bucketed_scoring
+import scoring
+from corpus import iter_raw_posts
+from ndjson import read_ndjson, read_ndjson_chunks, write_ndjson, write_json_array
+from post_table import PostTable
+from processing import processing_function
+from ranking import compute_age_in_days, assign_buckets, bucket_rows
+
+# Times and memory-profiles each pipeline stage on a synthetic corpus and writes a
+# JSON report. Every stage is checked against benchmarks/thresholds.json (per-post
+# limits for stages that scale with the corpus, absolute ones for the feed page)
+# and, with --baseline, against an earlier report; any breach is listed under
+# "regressions" and makes the run exit non-zero. Stages that work on Python records
+# (processing_function, post_table) run on the first SAMPLE_POSTS posts and report
+# per post of that sample; bucketed_main loads the whole corpus into memory by
+# design, so it is skipped above IN_MEMORY_POSTS.
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), 'thresholds.json')
+REPORT_PATH = os.path.join(os.path.dirname(__file__), 'results', 'pipeline_report.json')
+DEFAULT_SIZES = [10000, 100000]
+SAMPLE_POSTS = 100000
+IN_MEMORY_POSTS = 1000000
+SAMPLED_STAGES = ('processing_function', 'post_table')
+
+def table_columns(clean_path, now):
+    # the columns assign_scores needs, gathered a chunk of records at a time
+    likes, comments, published = [], [], []
+    for _, records in read_ndjson_chunks(clean_path, scoring.STREAM_CHUNK_SIZE):
+        table = PostTable.from_records(records)
+        likes.append(table.column('likes_count'))
+        comments.append(table.column('comments_count'))
+        published.append(scoring.load_published_at(table, now))
+    columns = {'likes_count': np.concatenate(likes), 'comments_count': np.concatenate(comments)}
+    return PostTable(list(columns), columns, {}, len(columns['likes_count'])), np.concatenate(published)
+
+def prepare(size, workdir, now, seed, stages):
+    # Per-size inputs for every stage, built outside the timed sections. The corpus
+    # goes straight to NDJSON on disk and is scored with score_stream, so only numpy
+    # columns are held for all of it; stages over Python records get a sample.
+    raw_path = os.path.join(workdir, 'posts_raw.ndjson')
+    clean_path = os.path.join(workdir, 'posts_clean.ndjson')
+    write_ndjson(raw_path, iter_raw_posts(size, now, seed))
+    write_ndjson(clean_path, (processing_function(post) for post in read_ndjson(raw_path)))
+    ctx = {'now': now}
+    ctx['raw'] = list(itertools.islice(read_ndjson(raw_path), SAMPLE_POSTS))
+    ctx['clean'] = [processing_function(post) for post in ctx['raw']]
+    ctx['table'], ctx['published_ts'] = table_columns(clean_path, now)
+    ctx['age_days'] = compute_age_in_days(ctx['published_ts'], now)
+    ctx['bucket'] = assign_buckets(ctx['age_days'], scoring.DEFAULT_CONFIG.buckets)
+
+    if 'bucketed_main' in stages and size <= IN_MEMORY_POSTS:
+        bucketed_scoring.RAW_PATH = os.path.join(workdir, 'posts_raw.json')
+        write_json_array(bucketed_scoring.RAW_PATH, read_ndjson(raw_path))
+    bucketed_scoring.INDEX_PATH = os.path.join(workdir, 'bucketed_index.npy')
+    bucketed_scoring.STORE_PATH = os.path.join(workdir, 'bucketed_store.bin')
+    bucketed_scoring.STORE_OFFSETS_PATH = os.path.join(workdir, 'bucketed_store_offsets.npy')
+    bucketed_scoring.ORDERINGS_PATH = os.path.join(workdir, 'bucketed_orderings.npz')
+
+    scoring.INDEX_PATH = os.path.join(workdir, 'posts_index.npy')
+    scoring.STORE_PATH = os.path.join(workdir, 'posts_store.bin')
+    scoring.STORE_OFFSETS_PATH = os.path.join(workdir, 'posts_store_offsets.npy')
+    scoring.ORDERINGS_PATH = os.path.join(workdir, 'posts_orderings.npz')
+    scoring.STREAM_MANIFEST_PATH = os.path.join(workdir, 'posts_stream_manifest.npz')
+    with contextlib.redirect_stdout(io.StringIO()):
+        scoring.score_stream(clean_path)
+    app.ORDERINGS_PATH = scoring.ORDERINGS_PATH
+    app.STORE_PATH = scoring.STORE_PATH
+    app.STORE_OFFSETS_PATH = scoring.STORE_OFFSETS_PATH
+    app.feed_cache = app.FeedCache(scoring.INDEX_PATH)
+    app.feed_cache.load()
+    ctx['client'] = app.app.test_client()
+    return ctx
+
+def render_cold(ctx):
+    app._rendered_pages = (None, {})
+    return ctx['client'].get('/')
+
+STAGES = {
+    'processing_function': lambda ctx: [processing_function(post) for post in ctx['raw']],
+    'post_table': lambda ctx: PostTable.from_records(ctx['clean']),
+    'assign_scores': lambda ctx: scoring.assign_scores(ctx['table'], ctx['published_ts'], ctx['bucket']),
+    'bucketize_posts': lambda ctx: bucket_rows(assign_buckets(ctx['age_days'], scoring.DEFAULT_CONFIG.buckets), len(scoring.DEFAULT_CONFIG.buckets)),
+    'bucketed_main': lambda ctx: bucketed_scoring.main(),
+    'feed_load': lambda ctx: app.FeedCache(scoring.INDEX_PATH).load(),
+    'feed_render': render_cold,
+    'feed_request': lambda ctx: ctx['client'].get('/'),
+}
+
+def measure(stage, ctx, repeat):
+    fn = STAGES[stage]
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            fn(ctx)
+            times.append(time.perf_counter() - start)
+        # a separate traced run: tracemalloc slows allocation-heavy code too much to time under it
+        gc.collect()
+        tracemalloc.start()
+        fn(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return min(times), peak
+
+def check(results, thresholds, baseline, tolerance):
+    regressions = []
+    for result in results:
+        limit = thresholds.get(result['stage'], {})
+        for metric in ('seconds', 'us_per_post', 'peak_mb', 'peak_bytes_per_post'):
+            if metric in limit and result[metric] > limit[metric]:
+                regressions.append({'stage': result['stage'], 'posts': result['posts'], 'metric': metric, 'value': result[metric], 'limit': limit[metric]})
+    previous = {(r['stage'], r['posts']): r for r in (baseline or {}).get('results', [])}
+    for result in results:
+        before = previous.get((result['stage'], result['posts']))
+        if before and result['seconds'] > before['seconds'] * (1 + tolerance):
+            regressions.append({'stage': result['stage'], 'posts': result['posts'], 'metric': 'seconds', 'value': result['seconds'], 'limit': round(before['seconds'] * (1 + tolerance), 6)})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline stage on a synthetic corpus.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='corpus sizes, up to 10M posts')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage; the fastest is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--report', default=REPORT_PATH)
+    parser.add_argument('--thresholds', default=THRESHOLDS_PATH)
+    parser.add_argument('--baseline', default=None, help='earlier report to compare seconds against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown vs --baseline')
+    args = parser.parse_args()
+
+    with open(args.thresholds) as f:
+        thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    now = time.time()
+    results = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            start = time.perf_counter()
+            ctx = prepare(size, workdir, now, args.seed, args.stages)
+            print(f'{size} posts (setup {time.perf_counter() - start:.1f}s)')
+            for stage in args.stages:
+                if stage == 'bucketed_main' and size > IN_MEMORY_POSTS:
+                    print(f'  {stage:20s} skipped: loads the whole corpus, over {IN_MEMORY_POSTS} posts')
+                    continue
+                measured = len(ctx['raw']) if stage in SAMPLED_STAGES else size
+                seconds, peak = measure(stage, ctx, args.repeat)
+                results.append({
+                    'stage': stage,
+                    'posts': size,
+                    'measured_posts': measured,
+                    'seconds': round(seconds, 6),
+                    'us_per_post': round(seconds / measured * 1e6, 3),
+                    'peak_mb': round(peak / 2**20, 3),
+                    'peak_bytes_per_post': round(peak / measured, 1),
+                })
+                print(f'  {stage:20s} {seconds:9.4f}s  {seconds / measured * 1e6:9.3f}us/post  peak {peak / 2**20:9.2f}MB')
+            del ctx
+
+    regressions = check(results, thresholds, baseline, args.tolerance)
+    report = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now)),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results,
+        'regressions': regressions,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'report written to {args.report}')
+    for regression in regressions:
+        print(f"REGRESSION {regression['stage']} @ {regression['posts']}: {regression['metric']} {regression['value']} > {regression['limit']}")
+    if regressions:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
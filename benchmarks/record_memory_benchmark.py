@@ -0,0 +1,53 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from corpus import iter_raw_posts
+from post_record import PostRecord, json_default
+from post_table import PostTable
+from processing import processing_function
+
+# Bytes each processed post keeps alive, as plain dicts (what processing_function
+# used to return and what json gives back) against PostRecord with interned
+# strings, plus the scoring stage's PostTable built from the same records. Every
+# form is decoded from the same clean NDJSON lines, so no string is shared with
+# the input and the count is everything a post holds.
+
+def retained(build, lines):
+    gc.collect()
+    tracemalloc.start()
+    result = build(lines)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+FORMS = {
+    'dict': lambda lines: [json.loads(line) for line in lines],
+    'compact': lambda lines: [PostRecord(**json.loads(line)) for line in lines],
+    'post_table': lambda lines: PostTable.from_records([json.loads(line) for line in lines]),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='Report bytes per processed post for each record form.')
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    lines = [json.dumps(processing_function(post), default=json_default) for post in iter_raw_posts(args.posts, time.time(), args.seed)]
+    print(f'{args.posts} posts, {sum(map(len, lines)) / args.posts:.0f} bytes of JSON per post')
+    baseline = None
+    for form, build in FORMS.items():
+        per_post = retained(build, lines) / args.posts
+        baseline = baseline or per_post
+        print(f'  {form:12s} {per_post:9.1f} bytes/post  {per_post / baseline:6.2f}x')
+
+if __name__ == '__main__':
+    main()
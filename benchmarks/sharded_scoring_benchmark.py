@@ -0,0 +1,50 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import numpy as np
+from ranking import score_posts, compute_hot_score
+from scoring import DEFAULT_CONFIG
+from sharded_scoring import score_sharded
+
+# Serial vs process-pool scoring on synthetic columns (no JSON I/O, which would
+# dominate otherwise), checking that every worker count reproduces the serial scores.
+
+def make_columns(n, communities, now, seed):
+    rng = np.random.default_rng(seed)
+    likes = np.minimum(rng.zipf(1.8, n) - 1, 100000)
+    comments = np.minimum(rng.zipf(2.2, n) - 1, 20000)
+    published = now - rng.uniform(0, 730 * 86400, n)
+    community = (rng.zipf(1.3, n) - 1) % communities
+    return likes, comments, published, community
+
+def main():
+    parser = argparse.ArgumentParser(description='Time sharded multi-process scoring against the serial path.')
+    parser.add_argument('--posts', type=int, default=5000000)
+    parser.add_argument('--communities', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    now = time.time()
+    likes, comments, published, community = make_columns(args.posts, args.communities, now, args.seed)
+    print(f'{args.posts} posts, {args.communities} communities, {os.cpu_count()} cpus')
+
+    start = time.perf_counter()
+    scores, bucket, _ = score_posts(likes, comments, published, now, DEFAULT_CONFIG)
+    hot_scores = np.round(compute_hot_score(likes, comments, published, now), 6)
+    serial = time.perf_counter() - start
+    print(f'serial      {serial:7.2f}s')
+
+    for workers in args.workers:
+        start = time.perf_counter()
+        sharded = score_sharded(likes, comments, published, now, DEFAULT_CONFIG, community, workers)
+        seconds = time.perf_counter() - start
+        identical = all(np.array_equal(a, b) for a, b in zip(sharded, (scores, bucket, hot_scores)))
+        print(f'workers {workers:3d} {seconds:7.2f}s  speedup {serial / seconds:5.2f}x  identical: {identical}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import app
+import processing
+import scoring
+import sqlite_store
+from corpus import make_raw_posts
+
+# The JSON file pipeline against the SQLite backend on one synthetic corpus: storing
+# raw posts, processing, scoring, the app's first and a deep feed page, and a 1%
+# update pushed through every stage. The file path reads and rewrites whole files
+# at each stage; the database upserts rows and pages from its indexes.
+
+REPORT_PATH = os.path.join(os.path.dirname(__file__), 'results', 'sqlite_report.json')
+DEFAULT_POSTS = 1000000
+PAGE_SIZE = 20
+
+def timed(fn):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn()
+    return time.perf_counter() - start, result
+
+def use_workdir(workdir):
+    processing.RAW_DATA_PATH = os.path.join(workdir, 'posts_raw.json')
+    processing.PROCESSED_DATA_PATH = os.path.join(workdir, 'posts_clean.json')
+    processing.MANIFEST_PATH = os.path.join(workdir, 'posts_manifest.npz')
+    scoring.PROCESSED_DATA_PATH = processing.PROCESSED_DATA_PATH
+    scoring.MANIFEST_PATH = processing.MANIFEST_PATH
+    scoring.INDEX_PATH = os.path.join(workdir, 'posts_index.npy')
+    scoring.STORE_PATH = os.path.join(workdir, 'posts_store.bin')
+    scoring.STORE_OFFSETS_PATH = os.path.join(workdir, 'posts_store_offsets.npy')
+    scoring.ORDERINGS_PATH = os.path.join(workdir, 'posts_orderings.npz')
+    scoring.STATE_PATH = os.path.join(workdir, 'scoring_state.npz')
+    app.STORE_PATH = scoring.STORE_PATH
+    app.STORE_OFFSETS_PATH = scoring.STORE_OFFSETS_PATH
+    app.ORDERINGS_PATH = scoring.ORDERINGS_PATH
+
+def json_store(posts):
+    with open(processing.RAW_DATA_PATH, 'w', encoding='utf-8') as f:
+        json.dump(posts, f)
+
+def db_store(conn, posts):
+    for start in range(0, len(posts), sqlite_store.BATCH_SIZE):
+        sqlite_store.upsert_raw(conn, posts[start:start + sqlite_store.BATCH_SIZE])
+
+def json_pages(deep):
+    cache = app.FeedCache(scoring.INDEX_PATH)
+    load_seconds, _ = timed(cache.load)
+    index = cache.get().indexes['top']
+    first_seconds, _ = timed(lambda: index.page(None, PAGE_SIZE))
+    cursor = index.cursor_at(min(deep, len(index) - 1))
+    deep_seconds, _ = timed(lambda: index.page(cursor, PAGE_SIZE))
+    return load_seconds, first_seconds, deep_seconds
+
+def db_pages(db_path, deep):
+    conn = sqlite_store.connect(db_path, readonly=True)
+    first_seconds, _ = timed(lambda: sqlite_store.page_posts(conn, 'top', None, PAGE_SIZE, excluded_spaces=app.EXCLUDED_SPACES))
+    # the post a reader `deep` rows in would resume after, found outside the timed query
+    bucket, score, post_id = conn.execute(
+        'SELECT age_bucket, score, id FROM posts WHERE age_bucket >= 0 ORDER BY age_bucket, score DESC, id DESC LIMIT 1 OFFSET ?', (deep,)
+    ).fetchone()
+    deep_seconds, _ = timed(lambda: sqlite_store.page_posts(conn, 'top', (bucket, score, post_id), PAGE_SIZE, excluded_spaces=app.EXCLUDED_SPACES))
+    conn.close()
+    return first_seconds, deep_seconds
+
+def changed_posts(posts, fraction, seed):
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(posts), max(1, int(len(posts) * fraction)), replace=False)
+    updated_at = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+    changed = []
+    for row in rows.tolist():
+        post = dict(posts[row], updated_at=updated_at, likes_count=(posts[row].get('likes_count') or 0) + 1)
+        posts[row] = post
+        changed.append(post)
+    return changed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the SQLite backend against the JSON file pipeline.')
+    parser.add_argument('--posts', type=int, default=DEFAULT_POSTS)
+    parser.add_argument('--update-fraction', type=float, default=0.01, help='share of posts changed for the update run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--report', default=REPORT_PATH)
+    args = parser.parse_args()
+
+    now = time.time()
+    results = {'json': {}, 'sqlite': {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        use_workdir(workdir)
+        db_path = os.path.join(workdir, 'posts.db')
+        start = time.perf_counter()
+        posts = make_raw_posts(args.posts, now, args.seed)
+        print(f'{args.posts} posts (setup {time.perf_counter() - start:.1f}s)')
+        deep = args.posts // 2
+
+        json_results, db_results = results['json'], results['sqlite']
+        json_results['store_raw'], _ = timed(lambda: json_store(posts))
+        json_results['process'], _ = timed(processing.main)
+        json_results['score'], _ = timed(scoring.main)
+        json_results['app_load'], json_results['page_first'], json_results['page_deep'] = json_pages(deep)
+
+        conn = sqlite_store.connect(db_path)
+        db_results['store_raw'], _ = timed(lambda: db_store(conn, posts))
+        db_results['process'], _ = timed(lambda: processing.main_db(db_path))
+        db_results['score'], _ = timed(lambda: scoring.score_db(db_path))
+        db_results['app_load'] = 0.0
+        db_results['page_first'], db_results['page_deep'] = db_pages(db_path, deep)
+
+        # the file pipeline has to rewrite and re-read everything for a small change
+        changed = changed_posts(posts, args.update_fraction, args.seed)
+        json_results['update'], _ = timed(lambda: (json_store(posts), processing.main(), scoring.main()))
+        db_results['update'], _ = timed(lambda: (db_store(conn, changed), processing.main_db(db_path), scoring.score_db(db_path)))
+        conn.close()
+
+        sizes = {
+            'json': sum(os.path.getsize(path) for path in (processing.RAW_DATA_PATH, processing.PROCESSED_DATA_PATH, scoring.INDEX_PATH, scoring.STORE_PATH, scoring.STORE_OFFSETS_PATH, scoring.ORDERINGS_PATH)),
+            'sqlite': sum(os.path.getsize(path) for path in (db_path, db_path + '-wal') if os.path.exists(path)),
+        }
+
+    for stage in results['json']:
+        json_seconds, db_seconds = results['json'][stage], results['sqlite'][stage]
+        print(f'  {stage:12s} json {json_seconds:9.4f}s  sqlite {db_seconds:9.4f}s')
+    print(f"  {'disk':12s} json {sizes['json'] / 2**20:8.1f}MB  sqlite {sizes['sqlite'] / 2**20:8.1f}MB")
+
+    report = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now)),
+        'python': platform.python_version(),
+        'sqlite': sqlite_store.sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'posts': args.posts,
+        'update_fraction': args.update_fraction,
+        'seconds': {backend: {stage: round(seconds, 6) for stage, seconds in stages.items()} for backend, stages in results.items()},
+        'disk_bytes': sizes,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'report written to {args.report}')
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,20 @@
+import argparse
 import json
 import os
-from datetime import datetime, timezone
 import numpy as np
+from timestamps import fill_missing, utc_now_seconds
+from post_table import PostTable
+from ranking import rank_buckets, exclude_spaces, listed_rows, compute_hot_score, build_orderings, save_orderings
+from ranking import INDEX_FIELDS, index_values, build_secondary_indexes
+from ranking import RankingConfig, buckets_from_edges, score_posts, bucket_rows, record_bucket_sizes
+from metrics import stage_timer, dump_json
+from post_store import build_index, save_index, store_entries, write_store
 
 RAW_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'posts_raw.json')
-OUT_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed', 'posts_scored.json')
+INDEX_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed', 'posts_index.npy')
+STORE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed', 'posts_store.bin')
+STORE_OFFSETS_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed', 'posts_store_offsets.npy')
+ORDERINGS_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed', 'posts_orderings.npz')
 
 WEIGHTS = {
     'likes': 1,
@@ -18,88 +28,46 @@ BIN_LABELS = [
     '0-2', '3-5', '6-7', '8-15', '16-30', '31-90', '>90'
 ]
 
-def normalize(values):
-    arr = np.array(values, dtype=float)
-    if arr.max() == arr.min():
-        return np.ones_like(arr)
-    return (arr - arr.min()) / (arr.max() - arr.min())
-
-def compute_age_in_days(published_at):
-    now = datetime.now(timezone.utc)
-    try:
-        dt = datetime.fromisoformat(published_at.replace("Z", "+00:00"))
-    except Exception:
-        dt = now
-    delta = now - dt
-    return delta.total_seconds() / (3600 * 24)
-
-def compute_recency_score(published_at_list, decay_hours=12):
-    now = datetime.now(timezone.utc)
-    recency_scores = []
-    for published_at in published_at_list:
-        try:
-            dt = datetime.fromisoformat(published_at.replace("Z", "+00:00"))
-        except Exception:
-            dt = now
-        hours_ago = (now - dt).total_seconds() / 3600
-        score = np.exp(-hours_ago / decay_hours)
-        recency_scores.append(score)
-    return np.array(recency_scores)
-
-def assign_scores(posts):
-    likes = [post.get("likes_count", 0) or 0 for post in posts]
-    comments = [post.get("comments_count", 0) or 0 for post in posts]
-    published_at = [post.get("published_at") for post in posts]
-    recency_score = compute_recency_score(published_at)
-    likes_score = normalize(likes)
-    comments_score = normalize(comments)
-    recency_score = normalize(recency_score)
-    for i, post in enumerate(posts):
-        score = (
-            WEIGHTS['likes'] * likes_score[i] +
-            WEIGHTS['comments'] * comments_score[i] +
-            WEIGHTS['recency'] * recency_score[i]
-        )
-        post["score"] = round(float(score), 6)
-    return posts
-
-def get_age_bin(age):
-    for i, upper in enumerate(AGE_BINS):
-        if age <= upper:
-            return i
-    return len(AGE_BINS)
-
-def main():
-    with open(RAW_PATH, encoding='utf-8') as f:
-        posts = json.load(f)
-
-    for post in posts:
-        age = compute_age_in_days(post.get('published_at', ''))
-        post['age_days'] = age
-        post['age_bin'] = get_age_bin(age)
-
-    bucketed = {}
-    for i in range(len(AGE_BINS)+1):
-        bucketed[i] = []
-    for post in posts:
-        bucketed[post['age_bin']].append(post)
-
-    ordered = []
-    for bin_idx in range(len(AGE_BINS)+1):
-        bin_posts = bucketed[bin_idx]
-        if not bin_posts:
-            continue
-        scored = assign_scores(bin_posts)
-        scored_sorted = sorted(scored, key = lambda x: x['score'], reverse = True)
-        ordered.extend(scored_sorted)
-
-    for post in ordered:
-        post.pop('age_days', None)
-        post.pop('age_bin', None)
-
-    with open(OUT_PATH, 'w', encoding = 'utf-8') as f:
-        json.dump(ordered, f, indent = 2)
-    print(f"Wrote {len(ordered)} posts to {OUT_PATH}")
+RECENCY_DECAY_HOURS = 12
+
+CONFIG = RankingConfig(WEIGHTS, RECENCY_DECAY_HOURS, buckets_from_edges(AGE_BINS), 'bucket')
+
+def main(limit=None, exclude=(), config=CONFIG):
+    with stage_timer('load'), open(RAW_PATH, encoding='utf-8') as f:
+        table = PostTable.from_records(json.load(f))
+
+    now = utc_now_seconds()
+    with stage_timer('score'):
+        published_ts = fill_missing(table.timestamps('published_at'), now)
+        scores, age_bin, _ = score_posts(table.column('likes_count'), table.column('comments_count'), published_ts, now, config)
+        table.set_column('score', scores)
+        table.set_column('age_bucket', age_bin)
+        hot_scores = np.round(compute_hot_score(table.column('likes_count'), table.column('comments_count'), published_ts, now), 6)
+        table.set_column('hot_score', hot_scores)
+    record_bucket_sizes(age_bin, len(config.buckets))
+    with stage_timer('rank'):
+        buckets = bucket_rows(age_bin, len(config.buckets))
+        keep = exclude_spaces(table, exclude) if exclude else None
+        ordered = rank_buckets(buckets, scores, limit=limit, keep=keep)
+        written, orderings = build_orderings(ordered, published_ts, hot_scores, listed_rows(len(table), keep), limit)
+
+    with stage_timer('write_store'):
+        write_store(STORE_PATH, STORE_OFFSETS_PATH, store_entries(table.to_records(written)))
+    ids = np.asarray(table.columns['id'].tolist())
+    field_values = {field: index_values(table.values(field, written)) for field in INDEX_FIELDS}
+    with stage_timer('write_orderings'):
+        save_orderings(ORDERINGS_PATH, ids[written], orderings, build_secondary_indexes(field_values))
+    with stage_timer('write_index'):
+        # last, as the app reloads when the index changes
+        save_index(INDEX_PATH, build_index(ids[written], scores[written], age_bin[written], hot_scores[written], published_ts[written], table.timestamps('updated_at')[written], field_values))
+    print(f"Wrote {len(written)} posts to {INDEX_PATH} ({len(ordered)} in Top)")
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Bucket posts by age, score within each bucket and write them in rank order.')
+    parser.add_argument('--limit', type=int, default=None, help='only write the top N posts of each sort (default: all)')
+    parser.add_argument('--exclude-space', action='append', default=[], help='space name to leave out; repeatable')
+    parser.add_argument('--metrics-json', default=None, help="write this run's metrics to a JSON file")
+    args = parser.parse_args()
+    main(limit=args.limit, exclude=args.exclude_space)
+    if args.metrics_json:
+        dump_json(args.metrics_json) 
\ No newline at end of file
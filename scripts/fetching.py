@@ -1,60 +1,406 @@
 import requests
+from requests.adapters import HTTPAdapter
+import argparse
 import json
+import random
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from timestamps import parse_timestamps
+from metrics import Counter, Histogram, stage_timer, dump_json
+from ndjson import replacing
+import sqlite_store
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 loaded = load_dotenv(dotenv_path=dotenv_path)
 
 API_TOKEN = os.environ.get("CIRCLE_API_TOKEN")
 
-if not API_TOKEN:
-    raise RuntimeError("CIRCLE_API_TOKEN environment variable not set. Please set it in your .env file.")
-    
-HEADERS = {
-    "Authorization": f"Bearer {API_TOKEN}",
-    "Content-Type": "application/json"
-}
-
-BASE_POSTS_URL = "https://app.circle.so/api/admin/v2/posts"
+BASE_POSTS_URL = os.environ.get("CIRCLE_POSTS_URL", "https://app.circle.so/api/admin/v2/posts")
 
 RAW_DATA_DIR = Path("data/raw")
 RAW_DATA_DIR.mkdir(parents = True, exist_ok = True)
+RAW_POSTS_PATH = RAW_DATA_DIR / "posts_raw.json"
+SYNC_STATE_PATH = RAW_DATA_DIR / "posts_sync.json"
+
+DEFAULT_CONCURRENCY = 8
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30
+REQUEST_TIMEOUT_SECONDS = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Incremental syncs ask for the most recently updated posts first and only stop
+# early while the pages really come back in that order (see in_update_order).
+SYNC_PARAMS = {"sort": "updated_at", "order": "desc"}
+# fields compared with the stored post; likes and comments don't always bump updated_at
+SYNC_FIELDS = ("updated_at", "likes_count", "comments_count")
+
+FETCH_PAGES = Counter("circle_fetch_pages_total", "Posts API pages by final outcome", ["outcome"])
+FETCH_RETRIES = Counter("circle_fetch_retries_total", "Page requests retried, by status or error", ["reason"])
+FETCH_SECONDS = Histogram("circle_fetch_request_seconds", "Latency of single posts API requests")
+SYNC_POSTS = Counter("circle_sync_posts_total", "Posts written by incremental syncs", ["change"])
+
+def get_headers():
+    if not API_TOKEN:
+        raise RuntimeError("CIRCLE_API_TOKEN environment variable not set. Please set it in your .env file.")
+    return {
+        "Authorization": f"Bearer {API_TOKEN}",
+        "Content-Type": "application/json"
+    }
+
+class PageFetchError(Exception):
+    def __init__(self, page, reason):
+        super().__init__(f"page {page}: {reason}")
+        self.page = page
+        self.reason = reason
+
+def make_session(pool_size = DEFAULT_CONCURRENCY):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    try:
+        return min(float(value), MAX_BACKOFF_SECONDS)
+    except (TypeError, ValueError):
+        return None
+
+def backoff_seconds(attempt):
+    # exponential backoff with full jitter so throttled workers don't retry in lockstep
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** attempt))
+
+def fetch_page(session, endpoint, page, per_page, headers, retries = MAX_RETRIES, params = None):
+    # returns (payload, throttled); raises PageFetchError once retries are used up
+    print(f"fetching {endpoint} - page #{page}...")
+    throttled = False
+    for attempt in range(retries + 1):
+        delay = None
+        try:
+            with FETCH_SECONDS.time():
+                response = session.get(
+                    endpoint,
+                    headers = headers,
+                    params = {**(params or {}), "page": page, "per_page": per_page},
+                    timeout = REQUEST_TIMEOUT_SECONDS
+                )
+        except requests.RequestException as e:
+            reason, retry_reason = str(e), "error"
+        else:
+            if response.status_code == 200:
+                try:
+                    payload = response.json()
+                except ValueError:
+                    payload = None
+                if isinstance(payload, dict):
+                    FETCH_PAGES.inc(outcome = "ok")
+                    return payload, throttled
+                # a truncated or non-JSON body (e.g. a proxy's HTML page) is retried like a 5xx
+                reason, retry_reason = f"invalid JSON body - {response.text[:200]}", "invalid_json"
+            else:
+                reason, retry_reason = f"{response.status_code} - {response.text[:200]}", response.status_code
+                if response.status_code not in RETRY_STATUSES:
+                    break
+                if response.status_code == 429:
+                    throttled = True
+                    delay = retry_after_seconds(response)
+        if attempt < retries:
+            FETCH_RETRIES.inc(reason = retry_reason)
+            time.sleep(delay if delay is not None else backoff_seconds(attempt))
+    print(f"error fetching page {page}: {reason}")
+    FETCH_PAGES.inc(outcome = "failed")
+    raise PageFetchError(page, reason)
+
+class AdaptiveLimit:
+    # AIMD window on in-flight pages: halve on a throttled page, grow by one
+    # after a full window of clean pages
+    def __init__(self, maximum):
+        self.maximum = maximum
+        self.value = maximum
+        self.clean = 0
 
-# PAGINATED FETCH FUNCTION
-def fetch_all(endpoint, per_page = 100, max_pages = None):
+    def update(self, throttled):
+        if throttled:
+            self.value = max(1, self.value // 2)
+            self.clean = 0
+            return
+        self.clean += 1
+        if self.clean >= self.value:
+            self.value = min(self.maximum, self.value + 1)
+            self.clean = 0
+
+# PAGINATED FETCH FUNCTIONS
+# Keeps up to `concurrency` pages in flight on one pooled session and yields each
+# page's records in page order as soon as every earlier page is in. Pages past the
+# end are requested speculatively and dropped once a page reports has_next_page
+# false. Pages that fail after retries are skipped and appended to `failed`.
+def iter_pages(endpoint, per_page = 100, max_pages = None, headers = None, concurrency = DEFAULT_CONCURRENCY, session = None, failed = None):
+    headers = get_headers() if headers is None else headers
+    session = session or make_session(concurrency)
+    failed = [] if failed is None else failed
+    limit = AdaptiveLimit(concurrency)
+    pages = {}
+    last_page = max_pages
+    next_page = 1
+    next_to_yield = 1
+    failures_in_a_row = 0
+    pending = {}
+    with ThreadPoolExecutor(max_workers = concurrency) as pool:
+        while True:
+            while len(pending) < limit.value and (last_page is None or next_page <= last_page):
+                pending[pool.submit(fetch_page, session, endpoint, next_page, per_page, headers)] = next_page
+                next_page += 1
+            if not pending:
+                break
+            done, _ = wait(pending, return_when = FIRST_COMPLETED)
+            for future in done:
+                page = pending.pop(future)
+                try:
+                    data, throttled = future.result()
+                except PageFetchError:
+                    failed.append(page)
+                    pages[page] = []
+                    failures_in_a_row += 1
+                    # with no page telling us where the end is, don't keep probing past a dead API
+                    if last_page is None and failures_in_a_row >= concurrency:
+                        last_page = next_page - 1
+                    continue
+                failures_in_a_row = 0
+                limit.update(throttled)
+                records = data.get("records", [])
+                pages[page] = records
+                if not records or not data.get("has_next_page", False):
+                    last_page = page if last_page is None else min(last_page, page)
+            while next_to_yield in pages and (last_page is None or next_to_yield <= last_page):
+                records = pages.pop(next_to_yield)
+                next_to_yield += 1
+                if records:
+                    yield records
+
+    failed[:] = sorted(page for page in failed if last_page is None or page <= last_page)
+
+# Returns (records in page order, sorted list of pages that failed).
+def fetch_all(endpoint, per_page = 100, max_pages = None, headers = None, concurrency = DEFAULT_CONCURRENCY, session = None):
+    failed = []
     all_data = []
+    with stage_timer("fetch"):
+        for records in iter_pages(endpoint, per_page, max_pages, headers, concurrency, session, failed):
+            all_data.extend(records)
+    print(f"Fetching complete. Total fetched from {endpoint.split('/')[-1]}: {len(all_data)}")
+    if failed:
+        print(f"Failed pages: {failed}")
+    return all_data, failed
+
+def load_raw_posts(path = RAW_POSTS_PATH):
+    if not Path(path).exists():
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+def save_raw_posts(posts, path = RAW_POSTS_PATH):
+    with stage_timer("write_raw"), replacing(path) as tmp_path, open(tmp_path, "w") as f:
+        json.dump(posts, f, indent = 2)
+
+def load_sync_state(path = SYNC_STATE_PATH):
+    if not Path(path).exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_sync_state(state, path = SYNC_STATE_PATH):
+    with open(path, "w") as f:
+        json.dump(state, f, indent = 2)
+
+def high_water_mark(records):
+    # latest (updated_at, id) among records, as [epoch seconds, id]; None if no dates parse
+    updated_ts = parse_timestamps([record.get("updated_at") for record in records])
+    marks = [(ts, record.get("id")) for ts, record in zip(updated_ts.tolist(), records) if ts == ts]
+    return list(max(marks)) if marks else None
+
+def in_update_order(records, last_ts):
+    # whether records (following one last updated at last_ts) are newest-updated first,
+    # and the updated_at to compare the next page with; undated records are ignored
+    updated_ts = parse_timestamps([record.get("updated_at") for record in records])
+    updated_ts = updated_ts[~np.isnan(updated_ts)]
+    if not len(updated_ts):
+        return True, last_ts
+    ordered = updated_ts[0] <= last_ts and bool(np.all(np.diff(updated_ts) <= 0))
+    return ordered, float(updated_ts[-1])
+
+def sync_fields(post):
+    return tuple(post.get(field) for field in SYNC_FIELDS)
+
+# INCREMENTAL SYNC
+# Pages are read most recently updated first and upserted into the raw store by id.
+# Paging stops at the first page where every post is already stored with the same
+# SYNC_FIELDS and none is newer than the high-water mark saved by the last
+# successful sync. That is only safe if the API honours SYNC_PARAMS, so once a page
+# comes back out of updated_at order the sync reads every page instead.
+def sync_posts(endpoint, per_page = 100, headers = None, raw_path = RAW_POSTS_PATH, state_path = SYNC_STATE_PATH, session = None):
+    headers = get_headers() if headers is None else headers
+    session = session or make_session(1)
+    posts = load_raw_posts(raw_path)
+    index = {post.get("id"): i for i, post in enumerate(posts)}
+    state = load_sync_state(state_path)
+    mark = state["mark"] if state else None
+    new_posts = {}
+    updated = 0
+    complete = True
+    ordered, last_ts = True, float("inf")
     page = 1
     while True:
-        print(f"fetching {endpoint} - page #{page}...")
-        response = requests.get(
-            endpoint,
-            headers = HEADERS,
-            params = {"page": page, "per_page": per_page}
-        )
-        if response.status_code != 200:
-            print(f"error fetching page {page}: {response.status_code} - {response.text}")
+        try:
+            data, _ = fetch_page(session, endpoint, page, per_page, headers, params = SYNC_PARAMS)
+        except PageFetchError:
+            complete = False
             break
 
-        data = response.json()
         records = data.get("records", [])
-        all_data.extend(records)
+        page_ordered, last_ts = in_update_order(records, last_ts)
+        if ordered and not page_ordered:
+            print(f"page {page} isn't sorted by updated_at; reading every page")
+        ordered = ordered and page_ordered
+        changed = 0
+        for record in records:
+            post_id = record.get("id")
+            if post_id in new_posts:
+                continue
+            i = index.get(post_id)
+            if i is not None and sync_fields(posts[i]) == sync_fields(record):
+                continue
+            changed += 1
+            if i is None:
+                new_posts[post_id] = record
+            else:
+                posts[i] = record
+                updated += 1
 
+        page_mark = high_water_mark(records)
+        if ordered and records and not changed and (mark is None or page_mark is None or page_mark <= mark):
+            break
         if not data.get("has_next_page", False):
             break
         page += 1
-        if max_pages and page > max_pages:
+
+    posts = list(new_posts.values()) + posts
+    SYNC_POSTS.inc(len(new_posts), change = "new")
+    SYNC_POSTS.inc(updated, change = "updated")
+    save_raw_posts(posts, raw_path)
+    # a failed page may hide changes below it, so only a clean sync moves the mark
+    if complete:
+        save_sync_state({"mark": high_water_mark(posts)}, state_path)
+    print(f"Sync {'complete' if complete else 'incomplete'}: {len(new_posts)} new, {updated} updated, {len(posts)} stored.")
+    return posts
+
+def max_mark(*marks):
+    marks = [mark for mark in marks if mark is not None]
+    return max(marks) if marks else None
+
+# SQLITE BACKEND
+# Same fetch and sync, but each page is upserted into raw_posts in its own
+# transaction as it arrives instead of rewriting the whole JSON store, and the
+# high-water mark is kept in the database's meta table.
+def fetch_all_db(endpoint, conn, per_page = 100, headers = None, concurrency = DEFAULT_CONCURRENCY, session = None):
+    failed = []
+    ids = []
+    mark = None
+    with stage_timer("fetch"):
+        for records in iter_pages(endpoint, per_page, None, headers, concurrency, session, failed):
+            sqlite_store.upsert_raw(conn, records)
+            ids.extend(record.get("id") for record in records)
+            mark = max_mark(mark, high_water_mark(records))
+    print(f"Fetching complete. Total fetched from {endpoint.split('/')[-1]}: {len(ids)}")
+    if failed:
+        # fetched pages are stored, but posts on the failed ones can't be told apart from deleted ones
+        raise SystemExit(f"{len(failed)} pages failed ({failed}); nothing removed and sync mark left unchanged.")
+    removed = sqlite_store.keep_raw_ids(conn, ids)
+    sqlite_store.set_meta(conn, "sync_mark", mark)
+    print(f"Stored {len(ids)} posts, removed {removed}.")
+    return len(ids)
+
+def sync_posts_db(endpoint, conn, per_page = 100, headers = None, session = None):
+    headers = get_headers() if headers is None else headers
+    session = session or make_session(1)
+    mark = sqlite_store.get_meta(conn, "sync_mark")
+    new_mark = mark
+    seen = set()
+    new = updated = 0
+    complete = True
+    ordered, last_ts = True, float("inf")
+    page = 1
+    while True:
+        try:
+            data, _ = fetch_page(session, endpoint, page, per_page, headers, params = SYNC_PARAMS)
+        except PageFetchError:
+            complete = False
             break
 
-    print(f"Fetching complete. Total fetched from {endpoint.split('/')[-1]}: {len(all_data)}")
-    return all_data
+        page_ordered, last_ts = in_update_order(data.get("records", []), last_ts)
+        if ordered and not page_ordered:
+            print(f"page {page} isn't sorted by updated_at; reading every page")
+        ordered = ordered and page_ordered
+        records = [record for record in data.get("records", []) if record.get("id") not in seen]
+        stored = sqlite_store.stored_sync_fields(conn, (record.get("id") for record in records))
+        changed = [record for record in records if stored.get(record.get("id")) != sync_fields(record)]
+        seen.update(record.get("id") for record in records)
+        sqlite_store.upsert_raw(conn, changed)
+        new += sum(record.get("id") not in stored for record in changed)
+        updated += sum(record.get("id") in stored for record in changed)
+
+        page_mark = high_water_mark(data.get("records", []))
+        new_mark = max_mark(new_mark, high_water_mark(changed))
+        if ordered and data.get("records") and not changed and (mark is None or page_mark is None or page_mark <= mark):
+            break
+        if not data.get("has_next_page", False):
+            break
+        page += 1
+
+    SYNC_POSTS.inc(new, change = "new")
+    SYNC_POSTS.inc(updated, change = "updated")
+    if complete:
+        sqlite_store.set_meta(conn, "sync_mark", new_mark)
+    print(f"Sync {'complete' if complete else 'incomplete'}: {new} new, {updated} updated.")
+    return new + updated
 
 # MAIN FUNCTION
 if __name__ == "__main__":
-    print("\nfetching all posts...")
-    posts = fetch_all(BASE_POSTS_URL)
-    with open(RAW_DATA_DIR / "posts_raw.json", "w") as f:
-        json.dump(posts, f, indent = 2)
+    parser = argparse.ArgumentParser(description = "Fetch Circle posts into data/raw/.")
+    parser.add_argument("--incremental", action = "store_true", help = "only fetch posts changed since the last sync and merge them into the raw store")
+    parser.add_argument("--url", default = BASE_POSTS_URL, help = "posts endpoint (default: Circle admin API)")
+    parser.add_argument("--concurrency", type = int, default = DEFAULT_CONCURRENCY, help = "max pages in flight for a full fetch")
+    parser.add_argument("--db", default = None, help = "upsert into this SQLite database instead of the JSON raw store")
+    parser.add_argument("--metrics-json", default = None, help = "write this run's metrics to a JSON file")
+    args = parser.parse_args()
 
-    print("\nData saved to 'data/raw/' folder.")
+    try:
+        if args.db:
+            conn = sqlite_store.connect(args.db)
+            if args.incremental:
+                print("\nsyncing posts...")
+                sync_posts_db(args.url, conn)
+            else:
+                print("\nfetching all posts...")
+                fetch_all_db(args.url, conn, concurrency = args.concurrency)
+            conn.close()
+            print(f"\nData saved to {args.db}.")
+        else:
+            if args.incremental:
+                print("\nsyncing posts...")
+                sync_posts(args.url)
+            else:
+                print("\nfetching all posts...")
+                posts, failed = fetch_all(args.url, concurrency = args.concurrency)
+                if failed:
+                    # keep the previous store rather than replacing it with a truncated one
+                    raise SystemExit(f"{len(failed)} pages failed; {RAW_POSTS_PATH} left unchanged.")
+                save_raw_posts(posts)
+                save_sync_state({"mark": high_water_mark(posts)})
+            print("\nData saved to 'data/raw/' folder.")
+    finally:
+        if args.metrics_json:
+            dump_json(args.metrics_json)
@@ -0,0 +1,37 @@
+import html
+import re
+
+PREVIEW_WORDS = 40
+
+# a tag's name and attributes: a '>' inside a quoted value doesn't end it
+TAG_BODY = r'''[^>"']*(?:(?:"[^"]*"|'[^']*')[^>"']*)*'''
+COMMENT_RE = re.compile(r'<!--.*?-->', re.S)
+# CDATA sections are text, taken as written
+CDATA_RE = re.compile(r'<!\[CDATA\[(.*?)\]\]>', re.S)
+# script and style bodies aren't text; an unclosed one runs to the end, as in html.parser
+RAW_TEXT_RE = re.compile(r'<(script|style)\b' + TAG_BODY + r'>.*?(?:</\1\s*>|\Z)', re.S | re.I)
+# a '<' only opens a tag before a letter, '/' + letter, '!' or '?'; otherwise it's text (a < b)
+TAG_RE = re.compile(r'</?[A-Za-z]' + TAG_BODY + r'>|<[!?][^>]*>')
+
+def cdata_text(match):
+    # escaped so the text survives tag stripping and the final unescape unchanged
+    return html.escape(match.group(1), quote = False)
+
+def strip_html(body_html):
+    # regex stand-in for BeautifulSoup(html, 'html.parser').get_text(): drops comments,
+    # script/style bodies and tags, keeps text nodes back to back and decodes entities,
+    # without building a tree
+    if not body_html:
+        return ''
+    if not isinstance(body_html, str):
+        body_html = str(body_html)
+    if '<' not in body_html and '&' not in body_html:
+        return body_html
+    text = RAW_TEXT_RE.sub('', CDATA_RE.sub(cdata_text, COMMENT_RE.sub('', body_html)))
+    return html.unescape(TAG_RE.sub('', text))
+
+def truncate_words(text, word_limit = PREVIEW_WORDS):
+    words = text.split()
+    if len(words) <= word_limit:
+        return text, False
+    return ' '.join(words[:word_limit]) + ' ...', True
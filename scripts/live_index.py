@@ -0,0 +1,208 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+import numpy as np
+from timestamps import parse_timestamps, fill_missing, utc_now_seconds
+from ranking import compute_age_in_days, assign_buckets, compute_log_scores, compute_hot_score
+
+RUN_SIZE = 512
+EVENT_TYPES = ("like", "comment", "post", "delete")
+
+class SortedKeyList:
+    # Sorted keys kept as short sorted runs plus each run's last key. Adding or removing
+    # a key bisects the run maxima (O(log n)) and then shifts at most 2 * RUN_SIZE
+    # entries inside one run, so repositioning a post never moves the whole ranking.
+    def __init__(self, keys = (), run_size = RUN_SIZE):
+        keys = sorted(keys)
+        self.run_size = run_size
+        self._runs = [keys[i:i + run_size] for i in range(0, len(keys), run_size)]
+        self._maxes = [run[-1] for run in self._runs]
+        self._len = len(keys)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for run in self._runs:
+            yield from run
+
+    def add(self, key):
+        if not self._runs:
+            self._runs.append([key])
+            self._maxes.append(key)
+            self._len += 1
+            return
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            i -= 1
+            self._runs[i].append(key)
+            self._maxes[i] = key
+        else:
+            insort(self._runs[i], key)
+        run = self._runs[i]
+        if len(run) > 2 * self.run_size:
+            self._runs[i:i + 1] = [run[:self.run_size], run[self.run_size:]]
+            self._maxes[i:i + 1] = [run[self.run_size - 1], run[-1]]
+        self._len += 1
+
+    def remove(self, key):
+        i = bisect_left(self._maxes, key)
+        run = self._runs[i] if i < len(self._runs) else []
+        j = bisect_left(run, key)
+        if j == len(run) or run[j] != key:
+            raise KeyError(key)
+        del run[j]
+        if not run:
+            del self._runs[i]
+            del self._maxes[i]
+        elif j == len(run):
+            self._maxes[i] = run[-1]
+        self._len -= 1
+
+    def after(self, key = None):
+        # keys strictly greater than `key` (all keys if None), in order
+        i = j = 0
+        if key is not None:
+            i = bisect_right(self._maxes, key)
+            if i == len(self._runs):
+                return
+            j = bisect_right(self._runs[i], key)
+        for run in self._runs[i:]:
+            yield from run[j:]
+            j = 0
+
+class LiveIndex:
+    # Posts ranked by (age bucket, -log score, id) and updated one event at a time.
+    # Log-mode scores depend only on the post itself, so a like or comment re-scores
+    # and repositions that single post; bucket boundaries are re-checked on refresh().
+    def __init__(self, config, now = None):
+        self.config = config
+        self.now = utc_now_seconds() if now is None else now
+        self.posts = {}
+        self.published = {}
+        self.keys = {}
+        self.order = SortedKeyList()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_records(cls, records, config, now = None):
+        index = cls(config, now)
+        published = fill_missing(parse_timestamps([post.get("published_at") for post in records]), index.now)
+        likes = np.array([post.get("likes_count") or 0 for post in records], dtype = float)
+        comments = np.array([post.get("comments_count") or 0 for post in records], dtype = float)
+        scores = compute_log_scores(likes, comments, published, config)
+        buckets = assign_buckets(compute_age_in_days(published, index.now), config.buckets)
+        for post, ts, score, bucket in zip(records, published.tolist(), scores.tolist(), buckets.tolist()):
+            post_id = post.get("id")
+            index.posts[post_id] = post
+            index.published[post_id] = ts
+            post["score"] = score if bucket >= 0 else None
+            post["age_bucket"] = bucket
+            if bucket >= 0:
+                index.keys[post_id] = (bucket, -score, post_id)
+        index.order = SortedKeyList(index.keys.values())
+        return index
+
+    def __len__(self):
+        return len(self.posts)
+
+    def _rank_key(self, post_id):
+        post = self.posts[post_id]
+        published = np.array([self.published[post_id]])
+        score = compute_log_scores(np.array([post.get("likes_count") or 0]), np.array([post.get("comments_count") or 0]), published, self.config)[0]
+        bucket = assign_buckets(compute_age_in_days(published, self.now), self.config.buckets)[0]
+        return (int(bucket), -float(score), post_id) if bucket >= 0 else None
+
+    def _unrank(self, post_id):
+        key = self.keys.pop(post_id, None)
+        if key is not None:
+            self.order.remove(key)
+
+    def _rank(self, post_id):
+        post = self.posts[post_id]
+        key = self._rank_key(post_id)
+        post["score"] = -key[1] if key else None
+        post["age_bucket"] = key[0] if key else -1
+        if key is not None:
+            # recorded only once it is in the order, so a failed add leaves both unchanged
+            self.order.add(key)
+            self.keys[post_id] = key
+
+    def apply(self, event):
+        # -> True if the event changed the index, False if it names an unknown post
+        kind = event["type"]
+        post_id = event["post"].get("id") if kind == "post" else event["post_id"]
+        if kind == "post":
+            self._unrank(post_id)
+            self.posts[post_id] = dict(event["post"])
+            self.published[post_id] = fill_missing(parse_timestamps([event["post"].get("published_at")]), self.now)[0]
+            self._rank(post_id)
+            return True
+        if post_id not in self.posts:
+            return False
+        self._unrank(post_id)
+        if kind == "delete":
+            del self.posts[post_id]
+            del self.published[post_id]
+            return True
+        field = "likes_count" if kind == "like" else "comments_count"
+        post = self.posts[post_id]
+        post[field] = max(0, (post.get(field) or 0) + event.get("delta", 1))
+        self._rank(post_id)
+        return True
+
+    def refresh(self, now = None):
+        # moves posts whose age crossed a bucket edge since the last refresh; -> count moved
+        self.now = utc_now_seconds() if now is None else now
+        ids = list(self.published)
+        buckets = assign_buckets(compute_age_in_days(np.array([self.published[i] for i in ids]), self.now), self.config.buckets)
+        moved = 0
+        for post_id, bucket in zip(ids, buckets.tolist()):
+            key = self.keys.get(post_id)
+            if (key[0] if key else -1) != bucket:
+                self._unrank(post_id)
+                self._rank(post_id)
+                moved += 1
+        return moved
+
+    def page(self, after = None, limit = 20):
+        # -> (posts, key of the last post or None when the ranking is exhausted)
+        keys = []
+        for key in self.order.after(after):
+            keys.append(key)
+            if len(keys) > limit:
+                break
+        more = len(keys) > limit
+        keys = keys[:limit]
+        return [self.posts[key[2]] for key in keys], (keys[-1] if more else None)
+
+    def ranked_records(self):
+        # copies of every post with a fresh hot_score, for snapshots: ranked posts in
+        # order, then the ones between buckets (kept so a restart doesn't lose them)
+        ids = [key[2] for key in self.order] + [post_id for post_id in self.posts if post_id not in self.keys]
+        posts = [dict(self.posts[post_id]) for post_id in ids]
+        hot_scores = compute_hot_score(
+            np.array([post.get("likes_count") or 0 for post in posts], dtype = float),
+            np.array([post.get("comments_count") or 0 for post in posts], dtype = float),
+            np.array([self.published[post_id] for post_id in ids]),
+            self.now,
+        )
+        for post, hot_score in zip(posts, np.round(hot_scores, 6).tolist()):
+            post["hot_score"] = hot_score
+        return posts
+
+def is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def validate_event(event):
+    # raises ValueError with a message fit for a 400 response. Ids must be ints: they
+    # end up in the rank keys, and a str id would fail to compare with the others.
+    if not isinstance(event, dict) or event.get("type") not in EVENT_TYPES:
+        raise ValueError(f"event must be an object with type in {EVENT_TYPES}")
+    if event["type"] == "post":
+        if not isinstance(event.get("post"), dict) or not is_int(event["post"].get("id")):
+            raise ValueError("post event needs a post object with an integer id")
+    elif not is_int(event.get("post_id")):
+        raise ValueError(f"{event['type']} event needs an integer post_id")
+    if not is_int(event.get("delta", 1)):
+        raise ValueError("delta must be an integer")
+    return event
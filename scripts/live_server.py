@@ -0,0 +1,149 @@
+import argparse
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from live_index import LiveIndex, validate_event
+from ndjson import write_json_array, replacing
+from scoring import PROCESSED_DATA_PATH, DEFAULT_CONFIG
+
+# Local ingestion service for engagement events. Likes, comments, new posts and
+# deletions are POSTed to /events and applied to a LiveIndex straight away; /feed
+# pages through the live ranking. The ranked posts are written to the snapshot
+# file every --interval seconds (and on shutdown) in the same shape as the
+# `scoring.py --json` export, and the service resumes from that file on restart.
+
+LIVE_SNAPSHOT_PATH = Path("data/processed/posts_live.json")
+SNAPSHOT_INTERVAL_SECONDS = 30
+DEFAULT_PORT = 8765
+FEED_PAGE_SIZE = 20
+MAX_FEED_PAGE_SIZE = 100
+
+def save_snapshot(index, path):
+    with index.lock:
+        index.refresh()
+        records = index.ranked_records()
+    with replacing(path) as tmp_path:
+        write_json_array(tmp_path, records)
+    return len(records)
+
+def load_index(snapshot_path, source_path = PROCESSED_DATA_PATH, config = DEFAULT_CONFIG._replace(mode = "log")):
+    path = snapshot_path if Path(snapshot_path).exists() else source_path
+    with open(path, encoding = "utf-8") as f:
+        records = json.load(f)
+    print(f"loaded {len(records)} posts from {path}")
+    return LiveIndex.from_records(records, config)
+
+def encode_after(key):
+    bucket, neg_score, post_id = key
+    return f"{bucket}:{-neg_score}:{post_id}"
+
+def decode_after(value):
+    bucket, score, post_id = value.split(":", 2)
+    return (int(bucket), -float(score), int(post_id) if post_id.lstrip("-").isdigit() else post_id)
+
+class LiveServer:
+    def __init__(self, index, snapshot_path = LIVE_SNAPSHOT_PATH, interval = SNAPSHOT_INTERVAL_SECONDS, port = DEFAULT_PORT):
+        self.index = index
+        self.snapshot_path = snapshot_path
+        self.interval = interval
+        self.events = 0
+        self._stop = threading.Event()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._snapshotter = threading.Thread(target = self._snapshot_loop, daemon = True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        self._snapshotter.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._stop.set()
+            self._server.server_close()
+            count = save_snapshot(self.index, self.snapshot_path)
+            print(f"wrote final snapshot of {count} posts to {self.snapshot_path}")
+
+    def shutdown(self):
+        self._server.shutdown()
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self.interval):
+            started = time.perf_counter()
+            try:
+                count = save_snapshot(self.index, self.snapshot_path)
+            except Exception as e:
+                # e.g. a full disk: the last snapshot stays in place and the next interval tries again
+                print(f"Warning: snapshot failed: {type(e).__name__}: {e}")
+                continue
+            print(f"snapshot: {count} posts, {self.events} events so far, {time.perf_counter() - started:.2f}s")
+
+    def _handler(self):
+        live = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if urlparse(self.path).path != "/events":
+                    self._send(404, {"error": "not found"})
+                    return
+                try:
+                    payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+                    events = [validate_event(event) for event in (payload if isinstance(payload, list) else [payload])]
+                except ValueError as e:
+                    self._send(400, {"error": str(e)})
+                    return
+                with live.index.lock:
+                    applied = sum(live.index.apply(event) for event in events)
+                    live.events += len(events)
+                self._send(200, {"applied": applied, "ignored": len(events) - applied})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != "/feed":
+                    self._send(404, {"error": "not found"})
+                    return
+                query = parse_qs(url.query)
+                try:
+                    limit = min(max(int(query.get("limit", [FEED_PAGE_SIZE])[0]), 1), MAX_FEED_PAGE_SIZE)
+                    after = decode_after(query["after"][0]) if "after" in query else None
+                except ValueError:
+                    self._send(400, {"error": "invalid limit or after"})
+                    return
+                with live.index.lock:
+                    posts, last = live.index.page(after, limit)
+                    body = json.dumps({"posts": posts, "next_after": encode_after(last) if last else None})
+                self._send(200, body)
+
+            def _send(self, status, payload):
+                body = (payload if isinstance(payload, str) else json.dumps(payload)).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Apply live engagement events to an in-memory ranking and snapshot it.")
+    parser.add_argument("--port", type = int, default = DEFAULT_PORT)
+    parser.add_argument("--snapshot", type = Path, default = LIVE_SNAPSHOT_PATH, help = "snapshot file to resume from and write to")
+    parser.add_argument("--interval", type = float, default = SNAPSHOT_INTERVAL_SECONDS, help = "seconds between snapshots")
+    args = parser.parse_args()
+
+    server = LiveServer(load_index(args.snapshot), args.snapshot, args.interval, args.port)
+    print(f"listening on {server.url} (POST /events, GET /feed)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
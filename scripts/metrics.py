@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Process-wide counters, gauges and histograms for the pipeline and the app.
+# Metrics register themselves on creation; render_prometheus() gives the text
+# exposition format served at /metrics and dump_json() writes the same values
+# for CLI runs (--metrics-json).
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry = {}
+_lock = threading.Lock()
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(names, values, extra = ()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f"{name}=\"{escape_label(value)}\"" for name, value in pairs) + "}"
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        with _lock:
+            _registry[name] = self
+
+    def key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        with _lock:
+            return [(dict(zip(self.labels, key)), value) for key, value in sorted(self.values.items())]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount = 1, **labels):
+        key = self.key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with _lock:
+            self.values[key] = value
+
+    def inc(self, amount = 1, **labels):
+        key = self.key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels = (), buckets = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with _lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    counts[i] += 1
+                    break
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        # counts made cumulative, as exposed
+        out = []
+        for labels, (counts, total) in super().samples():
+            cumulative, running = {}, 0
+            for upper, count in zip(self.buckets, counts):
+                running += count
+                cumulative[format_value(upper)] = running
+            out.append((labels, {"buckets": cumulative, "sum": total, "count": running}))
+        return out
+
+STAGE_SECONDS = Gauge("circle_stage_seconds", "Duration of the last run of each pipeline stage", ["stage"])
+STAGE_SECONDS_TOTAL = Counter("circle_stage_seconds_total", "Time spent in each pipeline stage", ["stage"])
+STAGE_RUNS = Counter("circle_stage_runs_total", "Completed runs of each pipeline stage", ["stage"])
+
+@contextmanager
+def stage_timer(stage):
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    STAGE_SECONDS.set(seconds, stage = stage)
+    STAGE_SECONDS_TOTAL.inc(seconds, stage = stage)
+    STAGE_RUNS.inc(stage = stage)
+
+def render_prometheus():
+    lines = []
+    for metric in list(_registry.values()):
+        samples = metric.samples()
+        if not samples:
+            continue
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, value in samples:
+            names, values = list(labels), list(labels.values())
+            if metric.kind != "histogram":
+                lines.append(f"{metric.name}{format_labels(names, values)} {format_value(value)}")
+                continue
+            for upper, count in value["buckets"].items():
+                lines.append(f"{metric.name}_bucket{format_labels(names, values, [('le', upper)])} {count}")
+            lines.append(f"{metric.name}_sum{format_labels(names, values)} {format_value(value['sum'])}")
+            lines.append(f"{metric.name}_count{format_labels(names, values)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+def snapshot():
+    return {
+        metric.name: {
+            "type": metric.kind,
+            "help": metric.help,
+            "samples": [{"labels": labels, "value": value} for labels, value in metric.samples()],
+        }
+        for metric in list(_registry.values())
+    }
+
+def dump_json(path):
+    with open(path, "w") as f:
+        json.dump(snapshot(), f, indent = 2)
@@ -0,0 +1,90 @@
+import json
+import os
+from post_record import json_default
+from contextlib import contextmanager
+
+# One JSON record per line, so stages can write and read posts without ever
+# holding a whole array in memory.
+
+@contextmanager
+def replacing(path):
+    # yields a temp path next to `path` (same extension, so np.savez keeps the name)
+    # and moves it over `path` only if the block finishes; readers see the old file
+    # or the new one, never a partial write
+    root, ext = os.path.splitext(str(path))
+    tmp_path = f"{root}.tmp{ext}"
+    try:
+        yield tmp_path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+def write_ndjson(path, records):
+    # writes to a temp file and renames, so readers never see a half-written file
+    tmp_path = f"{path}.tmp"
+    count = 0
+    with open(tmp_path, "w", encoding = "utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, default = json_default))
+            f.write("\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+def write_ndjson_lines(path, lines):
+    # already-encoded lines, through a temp file like write_ndjson; returns each line's byte offset
+    offsets = []
+    offset = 0
+    with replacing(path) as tmp_path, open(tmp_path, "wb") as f:
+        for line in lines:
+            f.write(line)
+            f.write(b"\n")
+            offsets.append(offset)
+            offset += len(line) + 1
+    return offsets
+
+def read_ndjson(path):
+    with open(path, encoding = "utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def read_ndjson_chunks(path, chunk_size):
+    # yields (byte offsets, records) for up to chunk_size lines at a time
+    offsets = []
+    records = []
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                offsets.append(offset)
+                records.append(json.loads(line))
+                if len(records) >= chunk_size:
+                    yield offsets, records
+                    offsets, records = [], []
+            offset += len(line)
+    if records:
+        yield offsets, records
+
+def read_lines_at(path, offsets):
+    with open(path, "rb") as f:
+        for offset in offsets:
+            f.seek(offset)
+            yield f.readline().rstrip(b"\r\n")
+
+def read_ndjson_at(path, offsets):
+    for line in read_lines_at(path, offsets):
+        yield json.loads(line)
+
+def write_json_array(path, records):
+    # same bytes as json.dump(list(records), f, indent = 2), one record at a time
+    count = 0
+    with open(path, "w", encoding = "utf-8") as f:
+        for record in records:
+            f.write("[\n  " if count == 0 else ",\n  ")
+            f.write(json.dumps(record, indent = 2).replace("\n", "\n  "))
+            count += 1
+        f.write("\n]" if count else "[]")
+    return count
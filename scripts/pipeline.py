@@ -0,0 +1,57 @@
+import argparse
+import json
+from fetching import iter_pages, BASE_POSTS_URL, DEFAULT_CONCURRENCY
+from processing import process_stream, RAW_STREAM_PATH, PROCESSED_STREAM_PATH
+from scoring import score_stream, INDEX_PATH
+from metrics import stage_timer, dump_json
+from post_record import json_default
+from ndjson import replacing
+
+# fetch -> process -> score without any stage holding the corpus: fetched pages are
+# appended to the raw NDJSON as they arrive and go straight through
+# processing_function into the clean NDJSON, which scoring then reads in chunks.
+
+class IncompleteFetch(Exception):
+    pass
+
+def fetch_and_process(endpoint, concurrency = DEFAULT_CONCURRENCY, raw_path = RAW_STREAM_PATH, clean_path = PROCESSED_STREAM_PATH):
+    # both files are written to temp names and only moved into place if every page
+    # arrived; on failed pages or any error on the way, both are removed
+    failed = []
+    count = 0
+    try:
+        with stage_timer("fetch_and_process"), replacing(raw_path) as tmp_raw_path, replacing(clean_path) as tmp_clean_path:
+            with open(tmp_raw_path, "w", encoding = "utf-8") as raw_file, open(tmp_clean_path, "w", encoding = "utf-8") as clean_file:
+                for records in iter_pages(endpoint, concurrency = concurrency, failed = failed):
+                    for post, clean_post in zip(records, process_stream(records)):
+                        raw_file.write(json.dumps(post) + "\n")
+                        clean_file.write(json.dumps(clean_post, default = json_default) + "\n")
+                        count += 1
+            if failed:
+                raise IncompleteFetch()
+    except IncompleteFetch:
+        pass
+    return count, failed
+
+def run(endpoint = BASE_POSTS_URL, concurrency = DEFAULT_CONCURRENCY, limit = None, exclude = ()):
+    print(f"streaming posts from {endpoint}...")
+    count, failed = fetch_and_process(endpoint, concurrency)
+    if failed:
+        raise SystemExit(f"{len(failed)} pages failed ({failed}); previous outputs left unchanged.")
+    print(f"processed {count} posts, scoring...")
+    written = score_stream(limit = limit, exclude = exclude)
+    print(f"Wrote {written} posts to {INDEX_PATH}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Stream fetch -> process -> score through NDJSON.")
+    parser.add_argument("--url", default = BASE_POSTS_URL, help = "posts endpoint (default: Circle admin API)")
+    parser.add_argument("--concurrency", type = int, default = DEFAULT_CONCURRENCY)
+    parser.add_argument("--limit", type = int, default = None, help = "only write the top N posts of each sort (default: all)")
+    parser.add_argument("--exclude-space", action = "append", default = [], help = "space name to leave out; repeatable")
+    parser.add_argument("--metrics-json", default = None, help = "write this run's metrics to a JSON file")
+    args = parser.parse_args()
+    try:
+        run(args.url, args.concurrency, args.limit, args.exclude_space)
+    finally:
+        if args.metrics_json:
+            dump_json(args.metrics_json)
@@ -0,0 +1,80 @@
+import sys
+from collections.abc import Mapping
+
+# Compact form of a processed post, as processing_function returns it. A plain
+# dict with these 20 keys costs several hundred bytes before any value; a slotted
+# object holds only the 20 references. Low-cardinality strings (status, space and
+# author names) are interned, so every post in a space or by an author points at
+# one shared string instead of its own copy from the JSON decoder. Records read
+# like dicts (get, [], in, items, dict(record)); json needs default = json_default.
+
+FIELDS = (
+    "id", "status", "name", "published_at", "created_at", "updated_at",
+    "url", "body", "record_type", "body_text", "body_preview", "see_more",
+    "space_id", "space_name", "community_id",
+    "user_id", "user_name", "user_email",
+    "likes_count", "comments_count",
+)
+INTERNED_FIELDS = ("status", "record_type", "space_name", "user_name", "user_email")
+FIELD_SET = frozenset(FIELDS)
+
+def intern_value(value):
+    return sys.intern(value) if type(value) is str else value
+
+class PostRecord(Mapping):
+    __slots__ = FIELDS
+
+    def __init__(
+        self, id = None, status = None, name = None, published_at = None, created_at = None, updated_at = None,
+        url = None, body = None, record_type = None, body_text = None, body_preview = None, see_more = None,
+        space_id = None, space_name = None, community_id = None,
+        user_id = None, user_name = None, user_email = None,
+        likes_count = None, comments_count = None,
+    ):
+        # spelled out rather than looped over FIELDS: this runs once per post
+        self.id = id
+        self.status = intern_value(status)
+        self.name = name
+        self.published_at = published_at
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.url = url
+        self.body = body
+        self.record_type = intern_value(record_type)
+        self.body_text = body_text
+        self.body_preview = body_preview
+        self.see_more = see_more
+        self.space_id = space_id
+        self.space_name = intern_value(space_name)
+        self.community_id = community_id
+        self.user_id = user_id
+        self.user_name = intern_value(user_name)
+        self.user_email = intern_value(user_email)
+        self.likes_count = likes_count
+        self.comments_count = comments_count
+
+    def __getitem__(self, field):
+        if field not in FIELD_SET:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def get(self, field, default = None):
+        # Mapping.get goes through __getitem__ and KeyError; this is the hot path
+        return getattr(self, field) if field in FIELD_SET else default
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __contains__(self, field):
+        return field in FIELD_SET
+
+    def __repr__(self):
+        return f"PostRecord({dict(self)!r})"
+
+def json_default(value):
+    if isinstance(value, PostRecord):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
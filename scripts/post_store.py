@@ -0,0 +1,95 @@
+import json
+import mmap
+import numpy as np
+from ndjson import replacing
+
+# Scoring output in two parts. The rank index is one fixed-width row per ranked
+# post (id, scores, bucket, timestamps, filter ids) in Top order, saved as .npy so
+# readers can memory-map it and sort, page and filter without touching a post body.
+# The post store holds each post's JSON record back to back, in any order, with an
+# offset table sorted by id; a reader maps it and decodes only the records it shows.
+# Scores live only in the index, so re-ranking doesn't change a stored record.
+
+INDEX_DTYPE = np.dtype([
+    ("id", "<i8"),
+    ("score", "<f8"),
+    ("hot_score", "<f8"),
+    ("published_ts", "<f8"),
+    ("updated_ts", "<f8"),
+    ("age_bucket", "<i4"),
+    ("space_id", "<i8"),
+    ("user_id", "<i8"),
+    ("community_id", "<i8"),
+])
+OFFSETS_DTYPE = np.dtype([("id", "<i8"), ("offset", "<i8"), ("length", "<i8")])
+# fields kept in the index and left out of stored records
+INDEX_ONLY_FIELDS = ("score", "age_bucket", "hot_score")
+
+def build_index(ids, scores, age_bucket, hot_scores, published_ts, updated_ts, field_values):
+    # every argument in rank order; field_values: {space_id/user_id/community_id: index_values()}
+    index = np.zeros(len(ids), dtype = INDEX_DTYPE)
+    index["id"] = ids
+    index["score"] = scores
+    index["age_bucket"] = age_bucket
+    index["hot_score"] = hot_scores
+    index["published_ts"] = published_ts
+    index["updated_ts"] = updated_ts
+    for field, values in field_values.items():
+        index[field] = values
+    return index
+
+def save_index(path, index):
+    with replacing(path) as tmp_path:
+        np.save(tmp_path, index)
+
+def load_index(path):
+    index = np.load(path, mmap_mode = "r")
+    if index.dtype != INDEX_DTYPE:
+        raise ValueError(f"{path} is not a rank index (dtype {index.dtype})")
+    return index
+
+def store_entries(records):
+    # (id, encoded record) pairs for write_store(), without the index-only fields
+    for record in records:
+        yield record["id"], json.dumps({k: v for k, v in record.items() if k not in INDEX_ONLY_FIELDS}).encode("utf-8")
+
+def write_store(path, offsets_path, entries):
+    # entries: (id, bytes) in any order; returns the number written
+    ids, offsets, lengths = [], [], []
+    offset = 0
+    with replacing(path) as tmp_path, open(tmp_path, "wb") as f:
+        for post_id, data in entries:
+            f.write(data)
+            ids.append(post_id)
+            offsets.append(offset)
+            lengths.append(len(data))
+            offset += len(data)
+    table = np.zeros(len(ids), dtype = OFFSETS_DTYPE)
+    table["id"], table["offset"], table["length"] = ids, offsets, lengths
+    with replacing(offsets_path) as tmp_path:
+        np.save(tmp_path, table[np.argsort(table["id"], kind = "stable")])
+    return len(ids)
+
+class PostStore:
+    def __init__(self, path, offsets_path):
+        self.path = path
+        self.offsets = np.load(offsets_path)
+        self.ids = self.offsets["id"]
+        with open(path, "rb") as f:
+            # mapping an empty file fails; an empty store has nothing to read anyway
+            self.data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) if len(self.ids) else b""
+
+    def __len__(self):
+        return len(self.ids)
+
+    def contains(self, ids):
+        ids = np.asarray(ids, dtype = np.int64)
+        pos = np.searchsorted(self.ids, ids).clip(max = max(len(self.ids) - 1, 0))
+        return self.ids[pos] == ids if len(self.ids) else np.zeros(len(ids), dtype = bool)
+
+    def get(self, post_id):
+        i = int(np.searchsorted(self.ids, post_id))
+        if i == len(self.ids) or self.ids[i] != post_id:
+            raise KeyError(post_id)
+        _, offset, length = self.offsets[i].tolist()
+        return json.loads(self.data[offset:offset + length])
@@ -0,0 +1,96 @@
+from operator import attrgetter
+import numpy as np
+from timestamps import parse_timestamps
+from post_record import PostRecord, INTERNED_FIELDS, intern_value
+
+# count fields are held as int64 arrays (missing -> 0, as scoring always treated them)
+NUMERIC_FIELDS = ("likes_count", "comments_count")
+# high-repetition ids are dictionary-encoded: int32 codes + one array of distinct values
+ENCODED_FIELDS = ("space_id", "user_id", "community_id")
+
+def dictionary_encode(values):
+    lookup = {}
+    codes = np.fromiter((lookup.setdefault(v, len(lookup)) for v in values), dtype = np.int32, count = len(values))
+    return codes, np.fromiter(lookup, dtype = object, count = len(lookup))
+
+class PostTable:
+    def __init__(self, fields, columns, dictionaries, size):
+        self.fields = fields
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.size = size
+        self._timestamps = {}
+
+    @classmethod
+    def from_records(cls, records):
+        fields = list(dict.fromkeys(key for record in records for key in record))
+        columns = {}
+        dictionaries = {}
+        # processing_function's records hold every field, with strings already interned
+        compact = all(type(record) is PostRecord for record in records)
+        for field in fields:
+            values = list(map(attrgetter(field), records)) if compact else [record.get(field) for record in records]
+            if field in NUMERIC_FIELDS:
+                columns[field] = np.fromiter((v or 0 for v in values), dtype = np.int64, count = len(values))
+            elif field in ENCODED_FIELDS:
+                columns[field], dictionaries[field] = dictionary_encode(values)
+            elif field in INTERNED_FIELDS and not compact:
+                # records decoded from JSON each carry their own copy of these strings
+                columns[field] = np.fromiter((intern_value(v) for v in values), dtype = object, count = len(values))
+            else:
+                columns[field] = np.fromiter(values, dtype = object, count = len(values))
+        return cls(fields, columns, dictionaries, len(records))
+
+    def __len__(self):
+        return self.size
+
+    def column(self, field):
+        if field not in self.columns and field in NUMERIC_FIELDS:
+            return np.zeros(self.size, dtype = np.int64)
+        return self.columns[field]
+
+    def decoded(self, field):
+        if field in self.dictionaries:
+            return self.dictionaries[field][self.columns[field]]
+        return self.columns[field]
+
+    def values(self, field, rows = None):
+        # decoded values as a list, None for every row if the field never appeared
+        if field not in self.columns:
+            return [None] * (self.size if rows is None else len(rows))
+        column = self.columns[field] if rows is None else self.columns[field][rows]
+        if field in self.dictionaries:
+            column = self.dictionaries[field][column]
+        return column.tolist()
+
+    def timestamps(self, field):
+        # epoch seconds, NaN where missing/malformed; parsed once per table
+        if field not in self._timestamps:
+            values = self.columns.get(field)
+            if values is None:
+                values = [None] * self.size
+            self._timestamps[field] = parse_timestamps(values)
+        return self._timestamps[field]
+
+    def set_column(self, field, values):
+        if field not in self.columns:
+            self.fields.append(field)
+        self.columns[field] = values
+        self._timestamps.pop(field, None)
+
+    def take(self, indices, fields = None):
+        indices = np.asarray(indices, dtype = np.intp)
+        fields = list(self.fields) if fields is None else [f for f in fields if f in self.columns]
+        table = PostTable(
+            fields,
+            {field: self.columns[field][indices] for field in fields},
+            self.dictionaries,
+            len(indices),
+        )
+        table._timestamps = {field: ts[indices] for field, ts in self._timestamps.items() if field in fields}
+        return table
+
+    def to_records(self, order = None):
+        table = self if order is None else self.take(order)
+        values = [table.decoded(field).tolist() for field in table.fields]
+        return [dict(zip(table.fields, row)) for row in zip(*values)]
@@ -1,48 +1,279 @@
+import argparse
+import hashlib
 import json
+import os
+import time
+from contextlib import nullcontext
 from pathlib import Path
+import numpy as np
+from post_table import PostTable
+from post_record import PostRecord, json_default
+from ndjson import read_ndjson, write_ndjson_lines, replacing
+from html_text import strip_html, truncate_words
+from metrics import Counter, stage_timer, dump_json
+import sqlite_store
 
 RAW_DATA_PATH = Path("data/raw/posts_raw.json")
 PROCESSED_DATA_PATH = Path("data/processed/posts_clean.json")
+RAW_STREAM_PATH = Path("data/raw/posts_raw.ndjson")
+PROCESSED_STREAM_PATH = Path("data/processed/posts_clean.ndjson")
+MANIFEST_PATH = Path("data/processed/posts_manifest.npz")
+STREAM_MANIFEST_PATH = Path("data/processed/posts_stream_manifest.npz")
 PROCESSED_DATA_PATH.parent.mkdir(parents = True, exist_ok = True)
+# bump whenever processing_function's output changes, so records and body text from
+# runs of the older code aren't carried forward
+PROCESSING_VERSION = 3
 
-def processing_function(post):
+POSTS_PROCESSED = Counter("circle_posts_processed_total", "Posts run through processing_function")
+TEXT_CACHE = Counter("circle_text_cache_total", "Plain-text bodies reused from the previous run or extracted", ["result"])
+POSTS_CHANGED = Counter("circle_posts_changed_total", "Raw posts by content hash against the last run", ["change"])
+
+# CHANGE DETECTION
+# Every run hashes each raw post and saves the hashes next to its output in a
+# manifest, with the ids that were new or changed. A post hashing the same as last
+# run is carried forward from last run's output instead of being processed again.
+# The manifest's token names the processed content and `base` the token of the run
+# before, so a downstream stage that remembers the token it last consumed can ask
+# changed_since() for exactly the posts to redo.
+
+def load_previous(path):
+    # the previous run's output, keyed by id
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, "r") as f:
+        return {post.get("id"): post for post in json.load(f)}
+
+def text_cache_from(previous):
+    # plain text from the previous run's output, keyed by id; reused while the body HTML is unchanged
     return {
-        "id": post.get("id"),
-        "status": post.get("status"),
-        "name": post.get("name"),
-        "published_at": post.get("published_at"),
-        "created_at": post.get("created_at"),
-        "updated_at": post.get("updated_at"),
-
-        "url": post.get("url"),
-        "body": post.get("body", {}).get("body"),
-        "record_type": post.get("body", {}).get("record_type"),
-
-        "space_id": post.get("space_id"),
-        "space_name": post.get("space_name"),
-        "community_id": post.get("community_id"),
-
-        "user_id": post.get("user_id"),
-        "user_name": post.get("user_name"),
-        "user_email": post.get("user_email"),
-
-        "likes_count": post.get("likes_count"),
-        "comments_count": post.get("comments_count")
+        post_id: (post.get("body"), post["body_text"], post.get("body_preview"), post.get("see_more"))
+        for post_id, post in previous.items() if "body_text" in post
     }
 
+def content_hash(post):
+    # 64-bit hash of the post as compact JSON; keys aren't sorted, the API sends them
+    # in a fixed order and a reordered post only costs one needless reprocess
+    digest = hashlib.blake2b(json.dumps(post, separators = (",", ":")).encode("utf-8"), digest_size = 8).digest()
+    return int.from_bytes(digest, "little", signed = True)
+
+def content_token(ids, hashes):
+    # names a processed output by the posts that went into it, in any order
+    order = np.argsort(ids, kind = "stable")
+    digest = hashlib.blake2b(str(PROCESSING_VERSION).encode(), digest_size = 16)
+    digest.update(ids[order].tobytes())
+    digest.update(hashes[order].tobytes())
+    return digest.hexdigest()
+
+def output_version(path):
+    stat = os.stat(path)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype = np.int64)
+
+def load_manifest(path = MANIFEST_PATH, output_path = None):
+    # None if there is none, it is from another PROCESSING_VERSION, or it was written
+    # for another file than output_path (e.g. the output was replaced by hand)
+    path = Path(path)
+    if not path.exists():
+        return None
+    with np.load(path, allow_pickle = False) as saved:
+        manifest = {key: saved[key] for key in saved.files}
+    if int(manifest["version"]) != PROCESSING_VERSION:
+        return None
+    if output_path is not None and (not Path(output_path).exists() or not np.array_equal(manifest["output"], output_version(output_path))):
+        return None
+    return manifest
+
+def save_manifest(path, output_path, seen, manifest, offsets = None):
+    # seen: (id, hash, changed) per post of this run; offsets: where each post's line
+    # starts in an NDJSON output. Returns (changed, removed) counts.
+    ids = np.array([post_id for post_id, _, _ in seen], dtype = np.int64)
+    hashes = np.array([digest for _, digest, _ in seen], dtype = np.int64)
+    changed = ids[np.array([flag for _, _, flag in seen], dtype = bool)]
+    previous_ids = manifest["id"] if manifest is not None else np.empty(0, dtype = np.int64)
+    removed = np.setdiff1d(previous_ids, ids)
+    with replacing(path) as tmp_path:
+        np.savez(
+            tmp_path,
+            version = PROCESSING_VERSION,
+            id = ids,
+            hash = hashes,
+            changed = changed,
+            removed = removed,
+            token = content_token(ids, hashes),
+            base = str(manifest["token"]) if manifest is not None else "",
+            output = output_version(output_path),
+            **({} if offsets is None else {"offset": np.asarray(offsets, dtype = np.int64)}),
+        )
+    new = np.count_nonzero(~np.isin(changed, previous_ids))
+    POSTS_CHANGED.inc(int(new), change = "new")
+    POSTS_CHANGED.inc(len(changed) - int(new), change = "changed")
+    POSTS_CHANGED.inc(len(ids) - len(changed), change = "unchanged")
+    POSTS_CHANGED.inc(len(removed), change = "removed")
+    return len(changed), len(removed)
+
+def load_changes(path = MANIFEST_PATH, output_path = PROCESSED_DATA_PATH):
+    # the last run's token, its base and the ids it changed and removed; None if unknown
+    manifest = load_manifest(path, output_path)
+    if manifest is None:
+        return None
+    return {"token": str(manifest["token"]), "base": str(manifest["base"]), "changed": manifest["changed"], "removed": manifest["removed"]}
+
+def changed_since(token, changes):
+    # ids new or changed since the output named `token`; None if that isn't known
+    if changes is None or not token:
+        return None
+    if token == changes["token"]:
+        return np.empty(0, dtype = np.int64)
+    if token == changes["base"]:
+        return changes["changed"]
+    return None
+
+def body_text_fields(post, text_cache = None):
+    body_html = (post.get("body") or {}).get("body")
+    cached = text_cache.get(post.get("id")) if text_cache else None
+    if cached is not None and cached[0] == body_html:
+        TEXT_CACHE.inc(result = "hit")
+        return cached[1:]
+    TEXT_CACHE.inc(result = "miss")
+    body_text = strip_html(body_html)
+    body_preview, see_more = truncate_words(body_text)
+    return body_text, body_preview, see_more
+
+def processing_function(post, text_cache = None):
+    body_text, body_preview, see_more = body_text_fields(post, text_cache)
+    POSTS_PROCESSED.inc()
+    return PostRecord(
+        id = post.get("id"),
+        status = post.get("status"),
+        name = post.get("name"),
+        published_at = post.get("published_at"),
+        created_at = post.get("created_at"),
+        updated_at = post.get("updated_at"),
+
+        url = post.get("url"),
+        body = post.get("body", {}).get("body"),
+        record_type = post.get("body", {}).get("record_type"),
+        body_text = body_text,
+        body_preview = body_preview,
+        see_more = see_more,
+
+        space_id = post.get("space_id"),
+        space_name = post.get("space_name"),
+        community_id = post.get("community_id"),
+
+        user_id = post.get("user_id"),
+        user_name = post.get("user_name"),
+        user_email = post.get("user_email"),
+
+        likes_count = post.get("likes_count"),
+        comments_count = post.get("comments_count"),
+    )
+
+def process_posts(raw_posts, text_cache = None):
+    return PostTable.from_records([processing_function(post, text_cache) for post in raw_posts])
+
+def process_stream(raw_posts, text_cache = None):
+    for post in raw_posts:
+        yield processing_function(post, text_cache)
+
+def process_changed(raw_posts, previous, known, text_cache, seen):
+    # Clean records in input order. Posts hashing as in `known` (id -> last run's hash)
+    # are last run's records from `previous`, as loaded, without going through
+    # processing_function.
+    for post in raw_posts:
+        post_id = post.get("id")
+        digest = content_hash(post)
+        unchanged = known.get(post_id) == digest and post_id in previous
+        seen.append((post_id, digest, not unchanged))
+        yield previous[post_id] if unchanged else processing_function(post, text_cache)
+
+def known_hashes(manifest):
+    return {} if manifest is None else dict(zip(manifest["id"].tolist(), manifest["hash"].tolist()))
+
+def changed_lines(raw_posts, previous_file, known, seen):
+    # Encoded NDJSON lines in input order. A post hashing as in `known` (id -> (hash,
+    # byte offset) in last run's output) is copied from previous_file as it is; any
+    # other post is cleaned again, reusing its old line's body text if it had one.
+    for post in raw_posts:
+        post_id = post.get("id")
+        digest = content_hash(post)
+        last = known.get(post_id)
+        unchanged = last is not None and last[0] == digest
+        seen.append((post_id, digest, not unchanged))
+        if last is not None:
+            previous_file.seek(last[1])
+            line = previous_file.readline().rstrip(b"\r\n")
+        if unchanged:
+            yield line
+        else:
+            text_cache = text_cache_from({post_id: json.loads(line)}) if last is not None else None
+            yield json.dumps(processing_function(post, text_cache), default = json_default).encode("utf-8")
+
+def known_lines(manifest):
+    if manifest is None or "offset" not in manifest:
+        return {}
+    return dict(zip(manifest["id"].tolist(), zip(manifest["hash"].tolist(), manifest["offset"].tolist())))
+
+def main_stream():
+    # Only the manifest's hashes and line offsets are held, never the previous output:
+    # carried-forward lines are copied by seeking into it while the new file is
+    # written next to it.
+    print(f"streaming {RAW_STREAM_PATH} -> {PROCESSED_STREAM_PATH}...")
+    manifest = load_manifest(STREAM_MANIFEST_PATH, PROCESSED_STREAM_PATH)
+    known = known_lines(manifest)
+    seen = []
+    with stage_timer("process_stream"), (open(PROCESSED_STREAM_PATH, "rb") if known else nullcontext()) as previous_file:
+        offsets = write_ndjson_lines(PROCESSED_STREAM_PATH, changed_lines(read_ndjson(RAW_STREAM_PATH), previous_file, known, seen))
+    changed, removed = save_manifest(STREAM_MANIFEST_PATH, PROCESSED_STREAM_PATH, seen, manifest, offsets)
+    print(f"Cleaned {len(offsets)} posts: {changed} new or changed, {len(offsets) - changed} carried forward, {removed} removed.")
+
+def main_db(db_path = sqlite_store.DB_PATH):
+    # only raw rows that are new or changed since their processed row are cleaned,
+    # so the text cache isn't needed here
+    print(f"processing changed posts in {db_path}...")
+    conn = sqlite_store.connect(db_path)
+    count = 0
+    with stage_timer("process_db"):
+        for raw_posts in sqlite_store.iter_stale_raw(conn):
+            count += sqlite_store.upsert_posts(conn, [processing_function(post) for post in raw_posts])
+        removed = sqlite_store.prune_posts(conn)
+    sqlite_store.set_meta(conn, "processed_at", time.time())
+    conn.close()
+    print(f"Cleaned {count} posts, removed {removed}.")
+
 def main():
     print(f"loading raw post data from {RAW_DATA_PATH}...")
     with open(RAW_DATA_PATH, "r") as f:
         raw_posts = json.load(f)
 
-    print(f"processing {len(raw_posts)} posts...")
-    clean_posts = [processing_function(post) for post in raw_posts]
+    # an output without a matching manifest may be from older processing code
+    manifest = load_manifest(MANIFEST_PATH, PROCESSED_DATA_PATH)
+    previous = load_previous(PROCESSED_DATA_PATH) if manifest is not None else {}
+    text_cache = text_cache_from(previous)
+    known = known_hashes(manifest)
+    print(f"processing {len(raw_posts)} posts ({len(known)} hashed, {len(text_cache)} cached bodies)...")
+    seen = []
+    with stage_timer("process"):
+        clean_posts = list(process_changed(raw_posts, previous, known, text_cache, seen))
 
     print(f"saving cleaned posts to {PROCESSED_DATA_PATH}...")
-    with open(PROCESSED_DATA_PATH, "w") as f:
-        json.dump(clean_posts, f, indent = 2)
+    with stage_timer("write_processed"), replacing(PROCESSED_DATA_PATH) as tmp_path, open(tmp_path, "w") as f:
+        json.dump(clean_posts, f, indent = 2, default = json_default)
+    changed, removed = save_manifest(MANIFEST_PATH, PROCESSED_DATA_PATH, seen, manifest)
 
-    print("Cleaned data ready.")
+    print(f"Cleaned data ready: {changed} new or changed, {len(clean_posts) - changed} carried forward, {removed} removed.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description = "Clean raw posts for scoring.")
+    parser.add_argument("--stream", action = "store_true", help = "read and write NDJSON one post at a time")
+    parser.add_argument("--db", default = None, help = "clean changed posts in this SQLite database in place")
+    parser.add_argument("--metrics-json", default = None, help = "write this run's metrics to a JSON file")
+    args = parser.parse_args()
+    if args.db:
+        main_db(args.db)
+    elif args.stream:
+        main_stream()
+    else:
+        main()
+    if args.metrics_json:
+        dump_json(args.metrics_json)
@@ -0,0 +1,253 @@
+from collections import namedtuple
+import numpy as np
+from metrics import Gauge
+from ndjson import replacing
+from sketches import QuantileSketch
+
+HOT_GRAVITY = 1.8
+INDEX_FIELDS = ("space_id", "user_id", "community_id")
+NORMALIZATIONS = ("global", "bucket")
+SCORING_MODES = ("weighted", "log")
+SCALINGS = ("minmax", "quantile")
+ROBUST_QUANTILE = 0.99
+LOG_SCORE_EPOCH = 1577836800  # 2020-01-01T00:00:00Z; any fixed instant works, this keeps log scores small
+
+# weights: {"likes", "comments", "recency"} -> float. buckets: inclusive (start, end) age
+# ranges in days, freshest first; ages outside every range get bucket -1 and are not
+# ranked. normalization: "global" scales each signal over all posts, "bucket" within
+# each age bucket. mode: "weighted" sums normalized signals, "log" is the now-free
+# log-space score (normalization and the recency weight don't apply to it).
+# scaling: "minmax" maps likes and comments from the group's min to its max,
+# "quantile" from the min to the ROBUST_QUANTILE (estimated from a sketch) and caps
+# the rest at 1, so one viral post doesn't squash everyone else toward zero.
+BUCKET_POSTS = Gauge("circle_bucket_posts", "Posts per age bucket in the last scoring run (-1: between buckets)", ["bucket"])
+
+RankingConfig = namedtuple("RankingConfig", ["weights", "decay_hours", "buckets", "normalization", "mode", "scaling"], defaults = ("weighted", "minmax"))
+# bounds: score_bounds() array. likes/comments: QuantileSketch per group, or None
+# when the scaling doesn't need them. Every part merges across chunks and shards.
+NormalizationStats = namedtuple("NormalizationStats", ["bounds", "likes", "comments"])
+
+def buckets_from_edges(edges):
+    # upper bin edges (age <= edge) -> contiguous ranges, the last one open-ended
+    starts = [-np.inf] + [np.nextafter(edge, np.inf) for edge in edges]
+    ends = list(edges) + [np.inf]
+    return list(zip(starts, ends))
+
+def compute_age_in_days(published_ts, now):
+    return (now - published_ts) / (3600 * 24)
+
+def assign_buckets(age_days, buckets):
+    starts = np.array([start for start, _ in buckets], dtype = float)
+    ends = np.array([end for _, end in buckets], dtype = float)
+    bucket = np.searchsorted(starts, age_days, side = "right") - 1
+    inside = bucket >= 0
+    inside[inside] = age_days[inside] <= ends[bucket[inside]]
+    return np.where(inside, bucket, -1)
+
+def bucket_rows(bucket, n_buckets):
+    # row indices of each bucket in original order; rows in bucket -1 are dropped
+    order = np.argsort(bucket, kind = "stable")
+    counts = np.bincount(bucket + 1, minlength = n_buckets + 1)
+    return np.split(order, np.cumsum(counts)[:-1])[1:]
+
+def record_bucket_sizes(bucket, n_buckets):
+    for b, count in enumerate(np.bincount(bucket + 1, minlength = n_buckets + 1).tolist(), -1):
+        BUCKET_POSTS.set(count, bucket = b)
+
+def score_groups(bucket, n_buckets, normalization):
+    # the group each row is normalized within, and the number of groups
+    if normalization == "global":
+        return np.zeros(len(bucket), dtype = np.intp), 1
+    if normalization == "bucket":
+        return np.where(bucket < 0, n_buckets, bucket), n_buckets + 1
+    raise ValueError(f"unknown normalization {normalization!r}; expected one of {NORMALIZATIONS}")
+
+def score_bounds(likes, comments, published_ts, group, n_groups):
+    # (n_groups, 6): min/max of likes, comments and published_ts per group, i.e.
+    # everything a post's score depends on besides its own fields. Empty groups get
+    # (inf, -inf) so merging bounds across chunks is a plain elementwise min/max.
+    bounds = np.empty((n_groups, 6))
+    bounds[:, 0::2] = np.inf
+    bounds[:, 1::2] = -np.inf
+    if not len(group):
+        return bounds
+    order = np.argsort(group, kind = "stable")
+    present = np.flatnonzero(np.bincount(group, minlength = n_groups))
+    starts = np.searchsorted(group[order], present)
+    for col, values in enumerate((likes, comments, published_ts)):
+        values = np.asarray(values, dtype = float)[order]
+        bounds[present, 2 * col] = np.minimum.reduceat(values, starts)
+        bounds[present, 2 * col + 1] = np.maximum.reduceat(values, starts)
+    return bounds
+
+def merge_bounds(a, b):
+    merged = np.minimum(a, b)
+    merged[..., 1::2] = np.maximum(a, b)[..., 1::2]
+    return merged
+
+def score_stats(likes, comments, published_ts, group, n_groups, scaling):
+    if scaling not in SCALINGS:
+        raise ValueError(f"unknown scaling {scaling!r}; expected one of {SCALINGS}")
+    bounds = score_bounds(likes, comments, published_ts, group, n_groups)
+    if scaling == "minmax":
+        return NormalizationStats(bounds, None, None)
+    return NormalizationStats(bounds, QuantileSketch(n_groups).add(likes, group), QuantileSketch(n_groups).add(comments, group))
+
+def merge_stats(a, b):
+    if a.likes is None:
+        return NormalizationStats(merge_bounds(a.bounds, b.bounds), None, None)
+    return NormalizationStats(merge_bounds(a.bounds, b.bounds), a.likes.merge(b.likes), a.comments.merge(b.comments))
+
+def scale_bounds(stats):
+    # the bounds compute_scores() scales by: likes/comments maxima are swapped for
+    # the robust quantile where there is one above the minimum (never above the max)
+    if stats.likes is None:
+        return stats.bounds
+    bounds = stats.bounds.copy()
+    for col, sketch in ((1, stats.likes), (3, stats.comments)):
+        lo, hi = bounds[:, col - 1], bounds[:, col]
+        q = np.fmin(sketch.quantile(ROBUST_QUANTILE), hi)
+        bounds[:, col] = np.where(q > lo, q, hi)
+    return bounds
+
+def normalize(values, lo = None, hi = None):
+    # lo/hi may be scalars or per-row arrays; a zero span scores every row 1
+    arr = np.asarray(values, dtype = float)
+    lo = arr.min() if lo is None else lo
+    hi = arr.max() if hi is None else hi
+    span = hi - lo
+    flat = span == 0
+    return np.where(flat, 1.0, (arr - lo) / np.where(flat, 1, span))
+
+def compute_recency_score(published_ts, reference_ts, decay_hours):
+    # decay is measured back from the newest post of the group rather than from "now":
+    # the shared exp(-(now - newest) / decay) factor cancels out in normalize(), so
+    # normalized recency is the same whenever the run happens and doesn't underflow
+    # to zero for old buckets
+    hours_ago = (reference_ts - published_ts) / 3600
+    return np.exp(-hours_ago / decay_hours)
+
+def compute_log_scores(likes, comments, published_ts, config):
+    # ln(1 + weighted engagement) plus one unit per decay_hours of publish time: the log of
+    # engagement * exp(-hours_ago / decay_hours) with the "now" term dropped, so a post's
+    # score only changes when its engagement does and the order within a bucket holds
+    # as time passes
+    engagement = config.weights["likes"] * np.asarray(likes, dtype = float) + config.weights["comments"] * np.asarray(comments, dtype = float)
+    return np.round(np.log1p(engagement) + (published_ts - LOG_SCORE_EPOCH) / (config.decay_hours * 3600), 6)
+
+def compute_scores(likes, comments, published_ts, group, bounds, config):
+    # every group in one pass: each row is scaled by its own group's bounds
+    if config.mode == "log":
+        return compute_log_scores(likes, comments, published_ts, config)
+    if config.mode != "weighted":
+        raise ValueError(f"unknown scoring mode {config.mode!r}; expected one of {SCORING_MODES}")
+    likes_lo, likes_hi, comments_lo, comments_hi, published_lo, published_hi = bounds[group].T
+    recency_lo = compute_recency_score(published_lo, published_hi, config.decay_hours)
+    likes_score = normalize(likes, likes_lo, likes_hi)
+    comments_score = normalize(comments, comments_lo, comments_hi)
+    if config.scaling == "quantile":
+        likes_score = np.minimum(likes_score, 1.0)
+        comments_score = np.minimum(comments_score, 1.0)
+    recency_score = normalize(compute_recency_score(published_ts, published_hi, config.decay_hours), recency_lo, 1.0)
+    weights = config.weights
+    scores = (
+        weights["likes"] * likes_score +
+        weights["comments"] * comments_score +
+        weights["recency"] * recency_score
+    )
+    return np.round(scores, 6)
+
+def score_posts(likes, comments, published_ts, now, config):
+    # -> (scores, bucket, bounds) for a whole corpus
+    bucket = assign_buckets(compute_age_in_days(published_ts, now), config.buckets)
+    group, n_groups = score_groups(bucket, len(config.buckets), config.normalization)
+    bounds = scale_bounds(score_stats(likes, comments, published_ts, group, n_groups, config.scaling))
+    return compute_scores(likes, comments, published_ts, group, bounds, config), bucket, bounds
+
+def top_in_bucket(bucket, scores, k):
+    # highest k of `bucket` by score, ties kept in bucket order like a stable full sort
+    bucket_scores = -scores[bucket]
+    if k < len(bucket):
+        kth = np.partition(bucket_scores, k - 1)[k - 1]
+        candidates = bucket_scores <= kth
+        bucket, bucket_scores = bucket[candidates], bucket_scores[candidates]
+    return bucket[np.argsort(bucket_scores, kind = "stable")][:k]
+
+def rank_buckets(buckets, scores, limit = None, keep = None):
+    # buckets: row-index arrays, freshest first. keep: optional fn(rows) -> bool mask.
+    # limit=None returns the full tiered ordering.
+    ranked = []
+    remaining = limit
+    for bucket in buckets:
+        if remaining is not None and remaining <= 0:
+            break
+        bucket = np.asarray(bucket, dtype = np.intp)
+        if keep is not None and len(bucket):
+            bucket = bucket[keep(bucket)]
+        if not len(bucket):
+            continue
+        k = len(bucket) if remaining is None else min(remaining, len(bucket))
+        ranked.append(top_in_bucket(bucket, scores, k))
+        if remaining is not None:
+            remaining -= k
+    if not ranked:
+        return np.array([], dtype = np.intp)
+    return np.concatenate(ranked)
+
+def exclude_spaces(table, space_names):
+    space_name = table.columns["space_name"]
+    excluded = list(space_names)
+    return lambda rows: ~np.isin(space_name[rows], excluded)
+
+def listed_rows(n, keep = None):
+    # rows 0..n-1 that `keep` (see rank_buckets) leaves in
+    rows = np.arange(n, dtype = np.intp)
+    return rows if keep is None else rows[keep(rows)]
+
+def compute_hot_score(likes, comments, published_ts, now, gravity = HOT_GRAVITY):
+    # engagement per hour of age, with the age term raised to `gravity` so a burst of
+    # activity on a new post outranks the same total spread over weeks
+    hours = np.maximum(now - published_ts, 0) / 3600
+    return (likes + comments) / (hours + 2) ** gravity
+
+def sorted_rows(keys, rows, limit = None):
+    # rows by key, highest first and ties in row order, cut to the first `limit`
+    order = np.argsort(-keys[rows], kind = "stable")
+    return rows[order if limit is None else order[:limit]]
+
+def build_orderings(ranked, published_ts, hot_scores, listed, limit = None):
+    # Top is `ranked`; Hot and Recent are sorted over `listed` (every scored row left
+    # after space exclusions, whatever its age bucket), each cut to `limit` on its own.
+    # Returns the rows to write, Top's first and in order, then the others Hot or
+    # Recent list in row order, and all three feeds as positions into them.
+    listed = np.asarray(listed, dtype = np.intp)
+    hot = sorted_rows(hot_scores, listed, limit)
+    recent = sorted_rows(published_ts, listed, limit)
+    rows = np.concatenate([ranked, np.setdiff1d(np.concatenate([hot, recent]), ranked)]).astype(np.intp)
+    position = np.empty(len(published_ts), dtype = np.int32)
+    position[rows] = np.arange(len(rows), dtype = np.int32)
+    return rows, {
+        "top": np.arange(len(ranked), dtype = np.int32),
+        "hot": position[hot],
+        "recent": position[recent],
+    }
+
+def index_values(values):
+    return np.asarray([-1 if v is None else v for v in values])
+
+def build_secondary_indexes(values_by_field):
+    # Per field, CSR style: the distinct values, offsets into `positions`, and for each
+    # value the output positions of its posts in rank order. A per-space or per-author
+    # feed is then a slice of this instead of a scan over the whole ranking.
+    indexes = {}
+    for field, values in values_by_field.items():
+        keys, codes = np.unique(values, return_inverse = True)
+        counts = np.bincount(codes, minlength = len(keys))
+        indexes[f"{field}_keys"] = keys
+        indexes[f"{field}_offsets"] = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        indexes[f"{field}_positions"] = np.argsort(codes, kind = "stable").astype(np.int32)
+    return indexes
+
+def save_orderings(path, ids, orderings, indexes, extra = None):
+    with replacing(path) as tmp_path:
+        np.savez(tmp_path, ids = ids, **orderings, **indexes, **(extra or {}))
@@ -0,0 +1,233 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+import fetching
+import processing
+import scoring
+from metrics import Counter, Gauge, dump_json
+from ndjson import replacing
+
+# Long-running fetch -> process -> score loop. Fetches are incremental syncs, which
+# only add and update posts, so every --full-fetch-after seconds a complete crawl
+# replaces the raw store instead and posts deleted upstream drop out. Processing is
+# skipped while the raw store hashes the same as at its last run, and scoring
+# while the cleaned posts do (up to --rescore-after, since age buckets move with
+# the clock). Each scoring run writes a new directory under versions/ and is
+# published by swapping one symlink, current -> versions/<v>, into place with
+# os.replace. The paths the app reads are fixed links through current/, and the
+# app resolves the index link once and opens the store and orderings next to it,
+# so a load never pairs files of two versions. The last --keep versions stay on
+# disk for --rollback.
+
+PROCESSED_DIR = Path("data/processed")
+VERSIONS_DIR = PROCESSED_DIR / "versions"
+CURRENT_LINK = PROCESSED_DIR / "current"
+STATUS_PATH = PROCESSED_DIR / "refresh_status.json"
+PUBLISHED_FILES = ("posts_store.bin", "posts_store_offsets.npy", "posts_orderings.npz", "posts_index.npy")
+DEFAULT_INTERVAL_SECONDS = 900
+DEFAULT_KEEP = 5
+RESCORE_AFTER_SECONDS = 3600
+FULL_FETCH_AFTER_SECONDS = 86400
+HASH_CHUNK_BYTES = 1 << 20
+
+REFRESH_RUNS = Counter("circle_refresh_runs_total", "Refresh cycles by outcome", ["outcome"])
+REFRESH_STAGES = Counter("circle_refresh_stages_total", "Refresh stages run or skipped", ["stage", "outcome"])
+REFRESH_LAST_SUCCESS = Gauge("circle_refresh_last_success_timestamp_seconds", "Unix time the last successful refresh finished")
+REFRESH_DURATION = Gauge("circle_refresh_duration_seconds", "Duration of the last refresh cycle")
+
+def file_hash(path):
+    if not Path(path).exists():
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_status(path = STATUS_PATH):
+    if not Path(path).exists():
+        return {"inputs": {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_status(status, path = STATUS_PATH):
+    with replacing(path) as tmp_path, open(tmp_path, "w") as f:
+        json.dump(status, f, indent = 2)
+
+def list_versions():
+    if not VERSIONS_DIR.exists():
+        return []
+    return sorted(entry.name for entry in VERSIONS_DIR.iterdir() if entry.is_dir())
+
+def current_version():
+    if not CURRENT_LINK.is_symlink():
+        return None
+    return Path(os.readlink(CURRENT_LINK)).name
+
+def new_version(now):
+    base = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(now))
+    version, n = base, 1
+    while (VERSIONS_DIR / version).exists():
+        version, n = f"{base}-{n}", n + 1
+    (VERSIONS_DIR / version).mkdir(parents = True)
+    return version
+
+def replace_link(link, target):
+    tmp_link = link.with_name(f".{link.name}.link")
+    if tmp_link.is_symlink():
+        tmp_link.unlink()
+    os.symlink(target, tmp_link)
+    os.replace(tmp_link, link)
+
+def publish(version):
+    for name in PUBLISHED_FILES:
+        target = VERSIONS_DIR / version / name
+        if not target.exists():
+            raise FileNotFoundError(f"{target} missing; not publishing {version}")
+    replace_link(CURRENT_LINK, os.path.relpath(VERSIONS_DIR / version, PROCESSED_DIR))
+    # the published paths only need setting up once (or over files from before this layout)
+    for name in PUBLISHED_FILES:
+        link = PROCESSED_DIR / name
+        target = os.path.join(CURRENT_LINK.name, name)
+        if not link.is_symlink() or os.readlink(link) != target:
+            replace_link(link, target)
+
+def prune(keep):
+    current = current_version()
+    for version in list_versions()[:-keep]:
+        if version != current:
+            shutil.rmtree(VERSIONS_DIR / version)
+
+def fetch(endpoint, concurrency, full = False):
+    # a full fetch replaces the raw store, so posts the crawl no longer returns are removed
+    if full or fetching.load_sync_state() is None:
+        posts, failed = fetching.fetch_all(endpoint, concurrency = concurrency)
+        if failed:
+            raise RuntimeError(f"{len(failed)} pages failed; {fetching.RAW_POSTS_PATH} left unchanged")
+        kept = {post.get("id") for post in posts}
+        removed = sum(post.get("id") not in kept for post in fetching.load_raw_posts())
+        fetching.save_raw_posts(posts)
+        fetching.save_sync_state({"mark": fetching.high_water_mark(posts)})
+        print(f"Full fetch: {len(posts)} posts, {removed} removed.")
+    else:
+        fetching.sync_posts(endpoint)
+
+def score(version):
+    scoring.main(out_dir = VERSIONS_DIR / version)
+
+def run_stage(stages, stage, fn = None):
+    # fn None marks the stage skipped
+    start = time.perf_counter()
+    if fn is not None:
+        fn()
+    outcome = "skipped" if fn is None else "ran"
+    stages[stage] = {"outcome": outcome, "seconds": round(time.perf_counter() - start, 3)}
+    REFRESH_STAGES.inc(stage = stage, outcome = outcome)
+
+def refresh(status, endpoint = None, concurrency = fetching.DEFAULT_CONCURRENCY, keep = DEFAULT_KEEP, rescore_after = RESCORE_AFTER_SECONDS, full_fetch_after = FULL_FETCH_AFTER_SECONDS):
+    # one cycle; endpoint None leaves the raw store to whoever else writes it
+    started = time.time()
+    stages = {}
+    status["last_attempt"] = started
+    try:
+        full = started - status.get("last_full_fetch", 0) >= full_fetch_after
+        run_stage(stages, "full_fetch" if full else "fetch", (lambda: fetch(endpoint, concurrency, full)) if endpoint else None)
+        if endpoint and full:
+            status["last_full_fetch"] = started
+
+        raw_hash = file_hash(processing.RAW_DATA_PATH)
+        if raw_hash is None:
+            raise FileNotFoundError(f"{processing.RAW_DATA_PATH} missing; nothing to process")
+        changed = raw_hash != status["inputs"].get("process") or not processing.PROCESSED_DATA_PATH.exists()
+        run_stage(stages, "process", processing.main if changed else None)
+        status["inputs"]["process"] = raw_hash
+
+        clean_hash = file_hash(processing.PROCESSED_DATA_PATH)
+        stale = started - status.get("last_scored", 0) >= rescore_after
+        if clean_hash != status["inputs"].get("score") or stale or current_version() is None:
+            version = new_version(started)
+            try:
+                run_stage(stages, "score", lambda: score(version))
+                publish(version)
+            except BaseException:
+                shutil.rmtree(VERSIONS_DIR / version, ignore_errors = True)
+                raise
+            status["inputs"]["score"] = clean_hash
+            status["last_scored"] = started
+            prune(keep)
+            outcome = "published"
+        else:
+            run_stage(stages, "score")
+            outcome = "unchanged"
+        status["last_success"] = time.time()
+        status["last_error"] = None
+    except Exception as e:
+        # keep the loop alive; the last published version keeps being served
+        status["last_error"] = f"{type(e).__name__}: {e}"
+        outcome = "failed"
+        print(f"Refresh failed: {status['last_error']}")
+    duration = time.time() - started
+    status.update({
+        "last_outcome": outcome,
+        "last_duration_seconds": round(duration, 3),
+        "stages": stages,
+        "version": current_version(),
+        "versions": list_versions(),
+    })
+    save_status(status)
+    REFRESH_RUNS.inc(outcome = outcome)
+    REFRESH_DURATION.set(duration)
+    if status.get("last_success"):
+        REFRESH_LAST_SUCCESS.set(status["last_success"])
+    print(f"Refresh {outcome} in {duration:.1f}s (version {status['version']}).")
+    return outcome
+
+def rollback(version = None):
+    versions = list_versions()
+    current = current_version()
+    if version is None:
+        older = [v for v in versions if current is None or v < current]
+        if not older:
+            raise SystemExit("no older version to roll back to")
+        version = older[-1]
+    elif version not in versions:
+        raise SystemExit(f"unknown version {version!r}; kept: {', '.join(versions) or 'none'}")
+    publish(version)
+    status = load_status()
+    status["version"] = version
+    save_status(status)
+    print(f"Published {version} (was {current}).")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Refresh the scored feed on an interval and publish it atomically.")
+    parser.add_argument("--interval", type = float, default = DEFAULT_INTERVAL_SECONDS, help = "seconds between cycle starts")
+    parser.add_argument("--once", action = "store_true", help = "run a single cycle and exit")
+    parser.add_argument("--url", default = fetching.BASE_POSTS_URL, help = "posts endpoint (default: Circle admin API)")
+    parser.add_argument("--concurrency", type = int, default = fetching.DEFAULT_CONCURRENCY, help = "max pages in flight for full fetches")
+    parser.add_argument("--skip-fetch", action = "store_true", help = f"don't fetch; refresh from whatever is in {processing.RAW_DATA_PATH}")
+    parser.add_argument("--keep", type = int, default = DEFAULT_KEEP, help = "published versions to keep for rollback")
+    parser.add_argument("--rescore-after", type = float, default = RESCORE_AFTER_SECONDS, help = "re-score unchanged posts after this many seconds, as age buckets shift")
+    parser.add_argument("--full-fetch-after", type = float, default = FULL_FETCH_AFTER_SECONDS, help = "crawl every page after this many seconds, dropping posts deleted upstream")
+    parser.add_argument("--rollback", nargs = "?", const = "", default = None, metavar = "VERSION", help = "re-publish VERSION (default: the one before the current) and exit")
+    parser.add_argument("--metrics-json", default = None, help = "write metrics to a JSON file after every cycle")
+    args = parser.parse_args()
+    if args.keep < 1:
+        parser.error("--keep must be at least 1")
+
+    if args.rollback is not None:
+        rollback(args.rollback or None)
+        raise SystemExit()
+
+    status = load_status()
+    while True:
+        started = time.time()
+        outcome = refresh(status, None if args.skip_fetch else args.url, args.concurrency, args.keep, args.rescore_after, args.full_fetch_after)
+        if args.metrics_json:
+            dump_json(args.metrics_json)
+        if args.once:
+            raise SystemExit(1 if outcome == "failed" else 0)
+        time.sleep(max(0, started + args.interval - time.time()))
@@ -1,10 +1,29 @@
+import argparse
 import json
 from pathlib import Path
-from datetime import datetime, timezone, timedelta
 import numpy as np
+from timestamps import fill_missing, utc_now_seconds
+from post_table import PostTable
+from ranking import rank_buckets, exclude_spaces, listed_rows, compute_hot_score, build_orderings, save_orderings
+from ranking import INDEX_FIELDS, index_values, build_secondary_indexes
+from ranking import RankingConfig, NORMALIZATIONS, SCORING_MODES, SCALINGS, compute_age_in_days, assign_buckets, bucket_rows
+from ranking import score_groups, score_stats, merge_stats, scale_bounds, compute_scores, record_bucket_sizes
+from metrics import Counter, stage_timer, dump_json
+from sharded_scoring import score_sharded, SHARD_KEYS
+from ndjson import read_ndjson_chunks, read_ndjson_at, read_lines_at, write_json_array, replacing
+from post_store import build_index, save_index, store_entries, write_store
+from processing import MANIFEST_PATH, STREAM_MANIFEST_PATH, load_changes, changed_since
+import sqlite_store
 
 PROCESSED_DATA_PATH = Path("data/processed/posts_clean.json")
 SCORED_DATA_PATH = Path("data/processed/posts_scored.json")
+INDEX_PATH = Path("data/processed/posts_index.npy")
+STORE_PATH = Path("data/processed/posts_store.bin")
+STORE_OFFSETS_PATH = Path("data/processed/posts_store_offsets.npy")
+STATE_PATH = Path("data/processed/scoring_state.npz")
+ORDERINGS_PATH = Path("data/processed/posts_orderings.npz")
+PROCESSED_STREAM_PATH = Path("data/processed/posts_clean.ndjson")
+STREAM_CHUNK_SIZE = 10000
 
 AGE_BUCKETS = [
     (0, 2),
@@ -24,87 +43,347 @@ WEIGHTS = {
 
 RECENCY_DECAY_HOURS = 12
 
+DEFAULT_CONFIG = RankingConfig(WEIGHTS, RECENCY_DECAY_HOURS, AGE_BUCKETS, "global")
+
+POSTS_SCORED = Counter("circle_posts_scored_total", "Posts given a fresh score (the rest reused one from the last run)")
+
 def load_posts():
     with open(PROCESSED_DATA_PATH, "r") as f:
-        return json.load(f)
+        return PostTable.from_records(json.load(f))
 
-def save_posts(posts):
-    with open(SCORED_DATA_PATH, "w") as f:
-        json.dump(posts, f, indent = 2)
+def save_posts(table, order = None, path = None):
+    with stage_timer("write_scored"), replacing(path or SCORED_DATA_PATH) as tmp_path, open(tmp_path, "w") as f:
+        json.dump(table.to_records(order), f, indent = 2)
 
-def normalize(values):
-    arr = np.array(values, dtype = float)
-    if arr.max() == arr.min():
-        return np.ones_like(arr)
-    return (arr - arr.min()) / (arr.max() - arr.min())
+def output_path(path, out_dir = None):
+    return Path(path) if out_dir is None else Path(out_dir) / Path(path).name
 
-def compute_age_in_days(published_at):
-    now = datetime.now(timezone.utc)
-    try:
-        dt = datetime.fromisoformat(published_at.replace("Z", "+00:00"))
-    except Exception:
-        dt = now
-    delta = now - dt
-    return delta.total_seconds() / (3600 * 24)
-
-def compute_recency_score(published_at_list, decay_hours = RECENCY_DECAY_HOURS):
-    now = datetime.now(timezone.utc)
-    recency_scores = []
-    for published_at in published_at_list:
-        try:
-            dt = datetime.fromisoformat(published_at.replace("Z", "+00:00"))
-        except Exception:
-            dt = now
-        hours_ago = (now - dt).total_seconds() / 3600
-        score = np.exp(-hours_ago / decay_hours)
-        recency_scores.append(score)
-    return np.array(recency_scores)
-
-def assign_scores(posts):
-    likes = [post.get("likes_count", 0) or 0 for post in posts]
-    comments = [post.get("comments_count", 0) or 0 for post in posts]
-    published_at = [post.get("published_at") for post in posts]
-    recency_score = compute_recency_score(published_at)
-    likes_score = normalize(likes)
-    comments_score = normalize(comments)
-    recency_score = normalize(recency_score)
-    for i, post in enumerate(posts):
-        score = (
-            WEIGHTS['likes'] * likes_score[i] +
-            WEIGHTS['comments'] * comments_score[i] +
-            WEIGHTS['recency'] * recency_score[i]
+def change_fields(changes):
+    # processing's change set, passed on to the app with the orderings
+    if changes is None:
+        return None
+    return {"processed": changes["token"], "changed_base": changes["base"], "changed_ids": changes["changed"]}
+
+def save_rank_index(rows, orderings, ids, scores, bucket, hot_scores, published_ts, updated_ts, field_values, out_dir = None, changes = None):
+    # rows and orderings as build_orderings() returns them; field_values: INDEX_FIELDS
+    # values already in the order of rows. The index goes last: the app reloads when
+    # it changes, and by then the store and orderings match it.
+    with stage_timer("write_orderings"):
+        save_orderings(output_path(ORDERINGS_PATH, out_dir), ids[rows], orderings, build_secondary_indexes(field_values), change_fields(changes))
+    with stage_timer("write_index"):
+        save_index(output_path(INDEX_PATH, out_dir), build_index(
+            ids[rows], scores[rows], bucket[rows], hot_scores[rows], published_ts[rows], updated_ts[rows], field_values,
+        ))
+
+def load_published_at(table, now):
+    return fill_missing(table.timestamps("published_at"), now)
+
+def table_stats(table, published_ts, bucket, config):
+    group, n_groups = score_groups(bucket, len(config.buckets), config.normalization)
+    return group, score_stats(table.column("likes_count"), table.column("comments_count"), published_ts, group, n_groups, config.scaling)
+
+def table_bounds(table, published_ts, bucket, config):
+    group, stats = table_stats(table, published_ts, bucket, config)
+    return group, scale_bounds(stats)
+
+def table_scores(table, published_ts, group, bounds, config, rows = None):
+    likes = table.column("likes_count")
+    comments = table.column("comments_count")
+    if rows is not None:
+        likes, comments, published_ts, group = likes[rows], comments[rows], published_ts[rows], group[rows]
+    return compute_scores(likes, comments, published_ts, group, bounds, config)
+
+def assign_scores(table, published_ts, bucket, config = DEFAULT_CONFIG):
+    group, bounds = table_bounds(table, published_ts, bucket, config)
+    table.set_column("score", table_scores(table, published_ts, group, bounds, config))
+    POSTS_SCORED.inc(len(table))
+    return table
+
+def load_state():
+    if not STATE_PATH.exists():
+        return None
+    with np.load(STATE_PATH, allow_pickle = False) as state:
+        return {key: state[key] for key in state.files}
+
+def config_key(config):
+    # scores from a run with other weights, decay, buckets, normalization or scaling can't be reused
+    return json.dumps([config.weights, config.decay_hours, [list(b) for b in config.buckets], config.normalization, config.mode, config.scaling], sort_keys = True)
+
+def processed_token(state):
+    # the processed output the state was scored from ("" if unknown)
+    return str(state["processed"]) if state is not None and "processed" in state else ""
+
+def save_state(table, published_ts, bucket, bounds, config = DEFAULT_CONFIG, processed = ""):
+    np.savez(
+        STATE_PATH,
+        id = np.asarray(table.columns["id"].tolist()),
+        updated_at = table.columns["updated_at"].astype(str),
+        likes = table.column("likes_count"),
+        comments = table.column("comments_count"),
+        published_ts = published_ts,
+        bucket = bucket,
+        score = table.column("score"),
+        bounds = bounds,
+        config = config_key(config),
+        processed = processed,
+    )
+
+def match_previous(ids, previous_ids):
+    # row of each id in the previous run, and whether it was there at all
+    order = np.argsort(previous_ids, kind = "stable")
+    pos = np.searchsorted(previous_ids[order], ids).clip(max = max(len(order) - 1, 0))
+    if not len(order):
+        return pos, np.zeros(len(ids), dtype = bool)
+    found = previous_ids[order][pos] == ids
+    return order[pos], found
+
+def assign_scores_incremental(table, published_ts, bucket, state, config = DEFAULT_CONFIG, changed_ids = None):
+    # Re-scores only posts that are new, were edited, gained engagement or moved to
+    # another age bucket; everything else keeps last run's score. Any change in the
+    # normalization bounds touches every score, so that falls back to a full pass.
+    # Log-mode scores depend on neither bounds nor bucket, only on the post itself.
+    # changed_ids, from processing's manifest, stands in for comparing each post's
+    # fields with the state when it is known.
+    group, bounds = table_bounds(table, published_ts, bucket, config)
+    weighted = config.mode != "log"
+    if state is None or state.get("config") != config_key(config) or (weighted and not np.array_equal(bounds, state["bounds"])):
+        table.set_column("score", table_scores(table, published_ts, group, bounds, config))
+        POSTS_SCORED.inc(len(table))
+        return table, len(table)
+    ids = np.asarray(table.columns["id"].tolist())
+    prev, changed = match_previous(ids, state["id"])
+    changed = ~changed
+    kept = np.flatnonzero(~changed)
+    moved = weighted & (bucket[kept] != state["bucket"][prev[kept]])
+    if changed_ids is not None:
+        # a post without a usable published_at is dated `now`, so it moves every run
+        # without processing seeing a change
+        changed[kept] = np.isin(ids[kept], changed_ids) | moved | (published_ts[kept] != state["published_ts"][prev[kept]])
+    else:
+        changed[kept] = (
+            (table.columns["updated_at"][kept].astype(str) != state["updated_at"][prev[kept]]) |
+            (table.column("likes_count")[kept] != state["likes"][prev[kept]]) |
+            (table.column("comments_count")[kept] != state["comments"][prev[kept]]) |
+            (published_ts[kept] != state["published_ts"][prev[kept]]) |
+            moved
         )
-        post["score"] = round(float(score), 6)
-    return posts
+    rows = np.flatnonzero(changed)
+    scores = np.empty(len(table))
+    scores[~changed] = state["score"][prev[~changed]]
+    scores[rows] = table_scores(table, published_ts, group, bounds, config, rows)
+    table.set_column("score", scores)
+    POSTS_SCORED.inc(len(rows))
+    return table, len(rows)
+
+def chunked_bounds(chunks, now, config):
+    # one pass; each chunk's stats (min/max and, for quantile scaling, sketches) merge
+    # into the same stats a single in-memory pass would give
+    stats = None
+    for records in chunks:
+        table = PostTable.from_records(records)
+        published_ts = load_published_at(table, now)
+        bucket = assign_buckets(compute_age_in_days(published_ts, now), config.buckets)
+        _, chunk_stats = table_stats(table, published_ts, bucket, config)
+        stats = chunk_stats if stats is None else merge_stats(stats, chunk_stats)
+    return None if stats is None else scale_bounds(stats)
+
+def stream_bounds(path, now, config):
+    return chunked_bounds((records for _, records in read_ndjson_chunks(path, STREAM_CHUNK_SIZE)), now, config)
+
+def joined(parts, dtype = float):
+    return np.concatenate(parts) if parts else np.empty(0, dtype = dtype)
 
-def bucketize_posts(posts):
-    now = datetime.now(timezone.utc)
-    buckets = [[] for _ in AGE_BUCKETS]
-    for post in posts:
-        age_days = compute_age_in_days(post.get("published_at", ""))
-        for idx, (start, end) in enumerate(AGE_BUCKETS):
-            if start <= age_days <= end:
-                buckets[idx].append(post)
-                break
-    return buckets
+def score_stream(in_path = PROCESSED_STREAM_PATH, limit = None, exclude = (), config = DEFAULT_CONFIG, out_dir = None, write_json = False):
+    # Two bounded-memory passes over NDJSON: the first only gathers normalization
+    # bounds, the second scores chunk by chunk and keeps just the index columns and
+    # byte offset per post. The post store is then filled by seeking back to each
+    # ranked post, so full records are never all in memory at once.
+    now = utc_now_seconds()
+    changes = load_changes(STREAM_MANIFEST_PATH, in_path)
+    with stage_timer("stream_bounds"):
+        bounds = stream_bounds(in_path, now, config)
+    offsets, ids, scores, hot_scores, published, updated, buckets, keep = [], [], [], [], [], [], [], []
+    index_columns = {field: [] for field in INDEX_FIELDS}
+    with stage_timer("stream_score"):
+        for chunk_offsets, records in read_ndjson_chunks(in_path, STREAM_CHUNK_SIZE):
+            table = PostTable.from_records(records)
+            published_ts = load_published_at(table, now)
+            offsets.append(np.asarray(chunk_offsets, dtype = np.int64))
+            ids.append(np.asarray(table.columns["id"].tolist()))
+            for field in INDEX_FIELDS:
+                index_columns[field].append(index_values(table.values(field)))
+            chunk_bucket = assign_buckets(compute_age_in_days(published_ts, now), config.buckets)
+            group, _ = score_groups(chunk_bucket, len(config.buckets), config.normalization)
+            scores.append(table_scores(table, published_ts, group, bounds, config))
+            hot_scores.append(np.round(compute_hot_score(table.column("likes_count"), table.column("comments_count"), published_ts, now), 6))
+            published.append(published_ts)
+            updated.append(table.timestamps("updated_at"))
+            buckets.append(chunk_bucket)
+            if exclude:
+                keep.append(~np.isin(table.columns["space_name"], list(exclude)))
+    offsets, ids, scores, bucket = joined(offsets, np.int64), joined(ids, np.int64), joined(scores), joined(buckets, np.int64)
+    hot_scores, published_ts, updated_ts = joined(hot_scores), joined(published), joined(updated)
+    keep_mask = joined(keep, bool) if exclude else None
+    POSTS_SCORED.inc(len(scores))
+    record_bucket_sizes(bucket, len(config.buckets))
 
-def main():
-    posts = load_posts()
+    with stage_timer("rank"):
+        keep = (lambda rows: keep_mask[rows]) if exclude else None
+        ranked = rank_buckets(bucket_rows(bucket, len(config.buckets)), scores, limit = limit, keep = keep)
+        written, orderings = build_orderings(ranked, published_ts, hot_scores, listed_rows(len(scores), keep), limit)
+
+    def scored_posts():
+        ranked_posts = read_ndjson_at(in_path, offsets[ranked].tolist())
+        for post, score, age_bucket, hot_score in zip(ranked_posts, scores[ranked].tolist(), bucket[ranked].tolist(), hot_scores[ranked].tolist()):
+            post["score"] = score
+            post["age_bucket"] = age_bucket
+            post["hot_score"] = hot_score
+            yield post
+
+    with stage_timer("write_store"):
+        # stored records are the clean NDJSON lines as they are, read in file order
+        rows = written[np.argsort(offsets[written], kind = "stable")]
+        count = write_store(
+            output_path(STORE_PATH, out_dir), output_path(STORE_OFFSETS_PATH, out_dir),
+            zip(ids[rows].tolist(), read_lines_at(in_path, offsets[rows].tolist())),
+        )
+    if write_json:
+        with stage_timer("write_scored"), replacing(output_path(SCORED_DATA_PATH, out_dir)) as tmp_path:
+            write_json_array(tmp_path, scored_posts())
+    field_values = {field: joined(parts, np.int64)[written] for field, parts in index_columns.items()}
+    save_rank_index(written, orderings, ids, scores, bucket, hot_scores, published_ts, updated_ts, field_values, out_dir, changes)
+    return count
 
-    posts = assign_scores(posts)
+def score_db(db_path = sqlite_store.DB_PATH, config = DEFAULT_CONFIG):
+    # Same two passes as score_stream, over id-ordered batches of the posts table:
+    # normalization stats first, then scores written back a batch per transaction.
+    # Ranking is left to the (age_bucket, score) index at query time.
+    conn = sqlite_store.connect(db_path)
+    now = utc_now_seconds()
+    columns = ("id", "published_at", "likes_count", "comments_count")
+    with stage_timer("db_bounds"):
+        bounds = chunked_bounds(sqlite_store.iter_posts(conn, columns), now, config)
+    count = 0
+    bucket_counts = np.zeros(len(config.buckets) + 1, dtype = np.int64)
+    with stage_timer("db_score"):
+        for records in (sqlite_store.iter_posts(conn, columns) if bounds is not None else ()):
+            table = PostTable.from_records(records)
+            published_ts = load_published_at(table, now)
+            bucket = assign_buckets(compute_age_in_days(published_ts, now), config.buckets)
+            group, _ = score_groups(bucket, len(config.buckets), config.normalization)
+            scores = table_scores(table, published_ts, group, bounds, config)
+            hot_scores = np.round(compute_hot_score(table.column("likes_count"), table.column("comments_count"), published_ts, now), 6)
+            sqlite_store.write_scores(conn, np.asarray(table.columns["id"].tolist()), scores, bucket, hot_scores, published_ts)
+            bucket_counts += np.bincount(bucket + 1, minlength = len(bucket_counts))
+            count += len(table)
+    sqlite_store.set_meta(conn, "scored_at", now)
+    conn.close()
+    POSTS_SCORED.inc(count)
+    record_bucket_sizes(np.repeat(np.arange(-1, len(config.buckets)), bucket_counts), len(config.buckets))
+    return count
 
-    buckets = bucketize_posts(posts)
+def shard_keys(table, published_ts, now, config, shard_by):
+    if shard_by == "bucket":
+        return assign_buckets(compute_age_in_days(published_ts, now), config.buckets)
+    field = {"community": "community_id", "space": "space_id"}[shard_by]
+    return table.columns[field] if field in table.columns else np.zeros(len(table), dtype = np.int32)
 
-    ranked_posts = []
-    for bucket in buckets:
-        bucket_sorted = sorted(bucket, key = lambda x: x.get("score", 0), reverse = True)
-        ranked_posts.extend(bucket_sorted)
-    save_posts(ranked_posts)
+def main(limit = None, exclude = (), incremental = False, config = DEFAULT_CONFIG, workers = None, shard_by = "community", out_dir = None, write_json = False):
+    # read before the posts: a processing run in between then only makes the next run re-score more
+    changes = load_changes(MANIFEST_PATH, PROCESSED_DATA_PATH)
+    with stage_timer("load"):
+        table = load_posts()
+    now = utc_now_seconds()
+    with stage_timer("score"):
+        published_ts = load_published_at(table, now)
+        age_days = compute_age_in_days(published_ts, now)
 
+        if workers:
+            keys = shard_keys(table, published_ts, now, config, shard_by)
+            scores, bucket, hot_scores = score_sharded(table.column("likes_count"), table.column("comments_count"), published_ts, now, config, keys, workers)
+            table.set_column("score", scores)
+            POSTS_SCORED.inc(len(table))
+        else:
+            bucket = assign_buckets(age_days, config.buckets)
+            if incremental:
+                state = load_state()
+                table, rescored = assign_scores_incremental(table, published_ts, bucket, state, config, changed_since(processed_token(state), changes))
+                print(f"Re-scored {rescored} of {len(table)} posts.")
+            else:
+                table = assign_scores(table, published_ts, bucket, config)
+            hot_scores = np.round(compute_hot_score(table.column("likes_count"), table.column("comments_count"), published_ts, now), 6)
+        scores = table.column("score")
+        save_state(table, published_ts, bucket, table_bounds(table, published_ts, bucket, config)[1], config, changes["token"] if changes else "")
+        table.set_column("age_bucket", bucket)
+        table.set_column("hot_score", hot_scores)
+    record_bucket_sizes(bucket, len(config.buckets))
+
+    with stage_timer("rank"):
+        buckets = bucket_rows(bucket, len(config.buckets))
+        keep = exclude_spaces(table, exclude) if exclude else None
+        ranked = rank_buckets(buckets, scores, limit = limit, keep = keep)
+        written, orderings = build_orderings(ranked, published_ts, hot_scores, listed_rows(len(table), keep), limit)
+    with stage_timer("write_store"):
+        write_store(output_path(STORE_PATH, out_dir), output_path(STORE_OFFSETS_PATH, out_dir), store_entries(table.to_records(written)))
+    if write_json:
+        save_posts(table, ranked, output_path(SCORED_DATA_PATH, out_dir))
+    ids = np.asarray(table.columns["id"].tolist())
+    field_values = {field: index_values(table.values(field, written)) for field in INDEX_FIELDS}
+    save_rank_index(written, orderings, ids, scores, bucket, hot_scores, published_ts, table.timestamps("updated_at"), field_values, out_dir, changes)
+
+    titles = table.columns.get("title")
     print("Top 30 posts (tiered by age, then by score):")
-    for idx, post in enumerate(ranked_posts[:30], 1):
-        age = int(compute_age_in_days(post.get("published_at", "")))
-        print(f"{idx:2d}. Score: {post.get('score', 0):.4f} | Age: {age}d | Title: {post.get('title', '(No Title)')} | Published: {post.get('published_at', 'N/A')} | Likes: {post.get('likes_count', 0)} | Comments: {post.get('comments_count', 0)}")
+    for idx, i in enumerate(ranked[:30], 1):
+        title = titles[i] if titles is not None else '(No Title)'
+        age = int(age_days[i])
+        print(f"{idx:2d}. Score: {scores[i]:.4f} | Age: {age}d | Title: {title} | Published: {table.columns['published_at'][i]} | Likes: {table.column('likes_count')[i]} | Comments: {table.column('comments_count')[i]}")
+
+def parse_weight(value):
+    name, _, weight = value.partition("=")
+    if name not in WEIGHTS:
+        raise argparse.ArgumentTypeError(f"unknown weight {name!r}; expected one of {', '.join(WEIGHTS)}")
+    try:
+        return name, float(weight)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"weight for {name!r} must be a number, got {weight!r}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Score posts and write them in tiered rank order.")
+    parser.add_argument("--limit", type = int, default = None, help = "only write the top N posts of each sort (default: all)")
+    parser.add_argument("--exclude-space", action = "append", default = [], help = "space name to leave out; repeatable")
+    parser.add_argument("--incremental", action = "store_true", help = "only re-score posts changed since the last run")
+    parser.add_argument("--stream", action = "store_true", help = f"score {PROCESSED_STREAM_PATH} in bounded-memory passes")
+    parser.add_argument("--mode", choices = SCORING_MODES, default = DEFAULT_CONFIG.mode, help = "weighted normalized signals, or a log-space score that doesn't depend on the run time")
+    parser.add_argument("--normalization", choices = NORMALIZATIONS, default = DEFAULT_CONFIG.normalization, help = "scale signals over all posts or within each age bucket")
+    parser.add_argument("--scaling", choices = SCALINGS, default = DEFAULT_CONFIG.scaling, help = "scale likes and comments to the max, or to a sketched 99th percentile with outliers capped")
+    parser.add_argument("--decay-hours", type = float, default = DEFAULT_CONFIG.decay_hours, help = "recency decay time constant")
+    parser.add_argument("--weight", type = parse_weight, action = "append", default = [], help = "override a weight, e.g. recency=0.1; repeatable")
+    parser.add_argument("--db", default = None, help = "score the posts in this SQLite database in place")
+    parser.add_argument("--json", action = "store_true", help = f"also write the ranked posts with their scores to {SCORED_DATA_PATH}")
+    parser.add_argument("--metrics-json", default = None, help = "write this run's metrics to a JSON file")
+    parser.add_argument("--workers", type = int, default = None, help = "score shards in this many processes (default: serial)")
+    parser.add_argument("--shard-by", choices = SHARD_KEYS, default = "community", help = "how --workers splits the posts")
+    args = parser.parse_args()
+    if args.workers and (args.incremental or args.stream):
+        parser.error("--workers can't be combined with --incremental or --stream")
+    if args.db and (args.incremental or args.stream or args.workers or args.limit or args.exclude_space or args.json):
+        # the database is ranked at query time, so there is no output to limit or filter
+        parser.error("--db can't be combined with --incremental, --stream, --workers, --limit, --exclude-space or --json")
+    return args
+
+def config_from_args(args):
+    return RankingConfig({**WEIGHTS, **dict(args.weight)}, args.decay_hours, AGE_BUCKETS, args.normalization, args.mode, args.scaling)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    config = config_from_args(args)
+    if args.db:
+        count = score_db(args.db, config)
+        print(f"Scored {count} posts in {args.db}")
+    elif args.stream:
+        count = score_stream(limit = args.limit, exclude = args.exclude_space, config = config, write_json = args.json)
+        print(f"Wrote {count} posts to {INDEX_PATH}")
+    else:
+        main(limit = args.limit, exclude = args.exclude_space, incremental = args.incremental, config = config, workers = args.workers, shard_by = args.shard_by, write_json = args.json)
+    if args.metrics_json:
+        dump_json(args.metrics_json)
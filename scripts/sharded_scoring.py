@@ -0,0 +1,90 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from ranking import compute_age_in_days, assign_buckets, score_groups, score_stats, merge_stats, scale_bounds, compute_scores, compute_hot_score
+
+# Scores a corpus in a process pool. Rows are grouped by a shard key (community,
+# space or age bucket) and laid out shard by shard in one shared-memory block, so
+# each task reads and writes a contiguous slice and nothing but normalization stats
+# cross a pipe. Two passes: tasks first return per-group stats, which are merged
+# (min/max and summed sketch counts, so exactly the serial stats), then score their
+# slice against the merged bounds. Every step is elementwise, so the scores match the serial
+# path bit for bit and the caller ranks them with the same rank_buckets().
+
+SHARD_KEYS = ("community", "space", "bucket")
+TASKS_PER_WORKER = 4
+# columns of the shared block: inputs, then outputs
+LIKES, COMMENTS, PUBLISHED, BUCKET, SCORE, HOT = range(6)
+
+_block = None
+_columns = None
+
+def _attach(name, n):
+    global _block, _columns
+    _block = shared_memory.SharedMemory(name = name)
+    _columns = np.ndarray((6, n), dtype = np.float64, buffer = _block.buf)
+
+def _bucket_stats(start, end, now, config):
+    likes, comments, published = _columns[LIKES, start:end], _columns[COMMENTS, start:end], _columns[PUBLISHED, start:end]
+    bucket = assign_buckets(compute_age_in_days(published, now), config.buckets)
+    _columns[BUCKET, start:end] = bucket
+    group, n_groups = score_groups(bucket, len(config.buckets), config.normalization)
+    return score_stats(likes, comments, published, group, n_groups, config.scaling)
+
+def _score(start, end, now, bounds, config):
+    likes, comments, published = _columns[LIKES, start:end], _columns[COMMENTS, start:end], _columns[PUBLISHED, start:end]
+    bucket = _columns[BUCKET, start:end].astype(np.int64)
+    group, _ = score_groups(bucket, len(config.buckets), config.normalization)
+    _columns[SCORE, start:end] = compute_scores(likes, comments, published, group, bounds, config)
+    _columns[HOT, start:end] = np.round(compute_hot_score(likes, comments, published, now), 6)
+
+def shard_ranges(keys, tasks):
+    # -> (row permutation grouping rows by key, [(start, end)] slices of it). Whole
+    # keys are packed into roughly equal slices; a key bigger than one slice is split.
+    order = np.argsort(keys, kind = "stable")
+    sorted_keys = keys[order]
+    edges = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+    target = max(1, -(-len(keys) // tasks))
+    ranges = []
+    current = segment_start = 0
+    for end in edges.tolist() + [len(keys)]:
+        if end - current > target and segment_start > current:
+            ranges.append((current, segment_start))
+            current = segment_start
+        while end - current > target:
+            ranges.append((current, current + target))
+            current += target
+        segment_start = end
+    if current < len(keys):
+        ranges.append((current, len(keys)))
+    return order, ranges
+
+def score_sharded(likes, comments, published_ts, now, config, keys, workers = None):
+    # -> (scores, bucket, hot_scores) in the caller's row order
+    workers = workers or os.cpu_count()
+    n = len(published_ts)
+    if not n:
+        return np.empty(0), np.empty(0, dtype = np.int64), np.empty(0)
+    order, ranges = shard_ranges(np.asarray(keys), workers * TASKS_PER_WORKER)
+    block = shared_memory.SharedMemory(create = True, size = max(1, 6 * n * 8))
+    try:
+        columns = np.ndarray((6, n), dtype = np.float64, buffer = block.buf)
+        columns[LIKES] = likes[order]
+        columns[COMMENTS] = comments[order]
+        columns[PUBLISHED] = published_ts[order]
+        with ProcessPoolExecutor(max_workers = workers, initializer = _attach, initargs = (block.name, n)) as pool:
+            stats = None
+            for shard_stats in pool.map(_bucket_stats, *zip(*[(start, end, now, config) for start, end in ranges])):
+                stats = shard_stats if stats is None else merge_stats(stats, shard_stats)
+            bounds = scale_bounds(stats)
+            list(pool.map(_score, *zip(*[(start, end, now, bounds, config) for start, end in ranges])))
+        scores, bucket, hot_scores = np.empty(n), np.empty(n, dtype = np.int64), np.empty(n)
+        scores[order] = columns[SCORE]
+        bucket[order] = columns[BUCKET]
+        hot_scores[order] = columns[HOT]
+        del columns
+        return scores, bucket, hot_scores
+    finally:
+        block.close()
+        block.unlink()
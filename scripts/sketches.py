@@ -0,0 +1,78 @@
+import numpy as np
+
+# Mergeable quantile sketch over non-negative values, one per group (age bucket,
+# or the single global group). Values are counted in logarithmic bins sized so any
+# quantile estimate is within `relative_accuracy` of a true value at that rank (the
+# DDSketch scheme). Bins are plain counts, so merging the sketches of two chunks,
+# shards or runs adds them and gives exactly the sketch of the combined data.
+# Memory is O(groups * log(max / min)): about 600 bins per group for counts up to
+# 1e5 at 1%. Zero, negative and missing values share one exact "zero" count.
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+class QuantileSketch:
+    def __init__(self, n_groups = 1, relative_accuracy = DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy must be in (0, 1), got {relative_accuracy!r}")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.zeros = np.zeros(n_groups, dtype = np.int64)
+        # counts[:, j] holds values in (gamma ** (offset + j - 1), gamma ** (offset + j)]
+        self.offset = 0
+        self.counts = np.zeros((n_groups, 0), dtype = np.int64)
+
+    @property
+    def n_groups(self):
+        return len(self.zeros)
+
+    def count(self):
+        return self.zeros + self.counts.sum(axis = 1)
+
+    def _extend(self, lo, hi):
+        # widen counts to cover bin keys lo..hi
+        width = self.counts.shape[1]
+        if not width:
+            self.offset = lo
+            self.counts = np.zeros((self.n_groups, hi - lo + 1), dtype = np.int64)
+            return
+        left = max(0, self.offset - lo)
+        right = max(0, hi - (self.offset + width - 1))
+        if left or right:
+            self.counts = np.pad(self.counts, ((0, 0), (left, right)))
+            self.offset -= left
+
+    def add(self, values, group = None):
+        values = np.asarray(values, dtype = float)
+        group = np.zeros(len(values), dtype = np.intp) if group is None else np.asarray(group, dtype = np.intp)
+        positive = values > 0
+        self.zeros += np.bincount(group[~positive], minlength = self.n_groups)
+        if positive.any():
+            keys = np.ceil(np.log(values[positive]) / np.log(self.gamma)).astype(np.int64)
+            self._extend(keys.min(), keys.max())
+            flat = group[positive] * self.counts.shape[1] + (keys - self.offset)
+            self.counts += np.bincount(flat, minlength = self.counts.size).reshape(self.counts.shape)
+        return self
+
+    def merge(self, other):
+        if other.n_groups != self.n_groups or other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("can only merge sketches with the same groups and relative accuracy")
+        merged = QuantileSketch(self.n_groups, self.relative_accuracy)
+        merged.zeros = self.zeros + other.zeros
+        for sketch in (self, other):
+            if sketch.counts.shape[1]:
+                merged._extend(sketch.offset, sketch.offset + sketch.counts.shape[1] - 1)
+                start = sketch.offset - merged.offset
+                merged.counts[:, start:start + sketch.counts.shape[1]] += sketch.counts
+        return merged
+
+    def quantile(self, q):
+        # (n_groups,) estimates of the q-quantile; NaN for groups with no values
+        if not 0 <= q <= 1:
+            raise ValueError(f"quantile must be in [0, 1], got {q!r}")
+        total = self.count()
+        rank = q * (total - 1)
+        cumulative = self.zeros[:, None] + np.cumsum(self.counts, axis = 1)
+        # first bin whose cumulative count passes the rank
+        key = self.offset + (cumulative <= rank[:, None]).sum(axis = 1)
+        estimate = 2 * self.gamma ** key.astype(float) / (self.gamma + 1)
+        return np.where(total == 0, np.nan, np.where(rank < self.zeros, 0.0, estimate))
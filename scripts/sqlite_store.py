@@ -0,0 +1,200 @@
+import json
+import sqlite3
+from pathlib import Path
+from post_record import json_default
+
+# Optional SQLite backend for the pipeline (--db on fetching.py, processing.py and
+# scoring.py; CIRCLE_DB_PATH for app.py). Raw and processed posts are upserted by
+# id in batched transactions; scoring writes score, age_bucket, hot_score and
+# published_ts back onto the processed rows, and a feed page is a keyset query over
+# the (age_bucket, score) index instead of a scan. Ties on a sort key are broken by
+# id, newest first, so pages are stable without a stored rank.
+
+DB_PATH = Path("data/posts.db")
+BATCH_SIZE = 10000
+# post columns queried or indexed; the full processed record is kept in `data`
+POST_COLUMNS = ("id", "updated_at", "published_at", "space_id", "space_name", "user_id", "community_id", "likes_count", "comments_count")
+SORT_KEYS = {"top": "score", "hot": "hot_score", "recent": "published_ts"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS raw_posts (id INTEGER PRIMARY KEY, updated_at TEXT, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    updated_at TEXT,
+    published_at TEXT,
+    space_id INTEGER,
+    space_name TEXT,
+    user_id INTEGER,
+    community_id INTEGER,
+    likes_count INTEGER,
+    comments_count INTEGER,
+    data TEXT NOT NULL,
+    score REAL,
+    age_bucket INTEGER,
+    hot_score REAL,
+    published_ts REAL
+);
+CREATE INDEX IF NOT EXISTS raw_posts_updated_at ON raw_posts (updated_at);
+CREATE INDEX IF NOT EXISTS posts_rank ON posts (age_bucket, score);
+CREATE INDEX IF NOT EXISTS posts_hot ON posts (hot_score);
+CREATE INDEX IF NOT EXISTS posts_recent ON posts (published_ts);
+CREATE INDEX IF NOT EXISTS posts_space_id ON posts (space_id);
+CREATE INDEX IF NOT EXISTS posts_user_id ON posts (user_id);
+CREATE INDEX IF NOT EXISTS posts_updated_at ON posts (updated_at);
+"""
+
+def connect(path = DB_PATH, readonly = False):
+    if readonly:
+        return sqlite3.connect(f"file:{path}?mode=ro", uri = True)
+    Path(path).parent.mkdir(parents = True, exist_ok = True)
+    conn = sqlite3.connect(path)
+    # WAL lets the app keep reading while a stage writes
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def get_meta(conn, key, default = None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return default if row is None else json.loads(row[0])
+
+def set_meta(conn, key, value):
+    with conn:
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, json.dumps(value)))
+
+def upsert_raw(conn, posts):
+    with conn:
+        conn.executemany(
+            "INSERT INTO raw_posts (id, updated_at, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET updated_at = excluded.updated_at, data = excluded.data",
+            ((post.get("id"), post.get("updated_at"), json.dumps(post)) for post in posts),
+        )
+    return len(posts)
+
+def stored_sync_fields(conn, ids):
+    # {id: (updated_at, likes_count, comments_count)} for the ids already in raw_posts,
+    # as fetching.sync_fields() gives them for a fetched record
+    ids = list(ids)
+    result = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            "SELECT id, updated_at, json_extract(data, '$.likes_count'), json_extract(data, '$.comments_count') "
+            f"FROM raw_posts WHERE id IN ({placeholders})", chunk,
+        )
+        result.update((post_id, tuple(fields)) for post_id, *fields in rows)
+    return result
+
+def keep_raw_ids(conn, ids):
+    # drops raw posts a complete fetch no longer returned
+    with conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS fetched (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM fetched")
+        conn.executemany("INSERT OR IGNORE INTO fetched (id) VALUES (?)", ((i,) for i in ids))
+        removed = conn.execute("DELETE FROM raw_posts WHERE id NOT IN (SELECT id FROM fetched)").rowcount
+        conn.execute("DELETE FROM fetched")
+    return removed
+
+def iter_stale_raw(conn, batch_size = BATCH_SIZE):
+    # raw posts whose processed row is missing or older, in id order, batch by batch
+    last = None
+    while True:
+        rows = conn.execute(
+            "SELECT r.id, r.data FROM raw_posts r LEFT JOIN posts p ON p.id = r.id "
+            "WHERE (? IS NULL OR r.id > ?) AND (p.id IS NULL OR p.updated_at IS NOT r.updated_at) "
+            "ORDER BY r.id LIMIT ?",
+            (last, last, batch_size),
+        ).fetchall()
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield [json.loads(data) for _, data in rows]
+
+def upsert_posts(conn, posts):
+    # scores are left as they are until the next scoring run
+    columns = ", ".join(POST_COLUMNS)
+    updates = ", ".join(f"{column} = excluded.{column}" for column in POST_COLUMNS[1:] + ("data",))
+    with conn:
+        conn.executemany(
+            f"INSERT INTO posts ({columns}, data) VALUES ({', '.join('?' * (len(POST_COLUMNS) + 1))}) "
+            f"ON CONFLICT (id) DO UPDATE SET {updates}",
+            ([post.get(column) for column in POST_COLUMNS] + [json.dumps(post, default = json_default)] for post in posts),
+        )
+    return len(posts)
+
+def prune_posts(conn):
+    with conn:
+        return conn.execute("DELETE FROM posts WHERE id NOT IN (SELECT id FROM raw_posts)").rowcount
+
+def iter_posts(conn, columns = POST_COLUMNS, batch_size = BATCH_SIZE):
+    # processed posts as records of `columns`, in id order; each batch is its own
+    # query, so the caller can write to posts between batches
+    names = ", ".join(columns)
+    last = None
+    while True:
+        rows = conn.execute(
+            f"SELECT {names} FROM posts WHERE (? IS NULL OR id > ?) ORDER BY id LIMIT ?",
+            (last, last, batch_size),
+        ).fetchall()
+        if not rows:
+            return
+        last = rows[-1][columns.index("id")]
+        yield [dict(zip(columns, row)) for row in rows]
+
+def write_scores(conn, ids, scores, age_bucket, hot_scores, published_ts):
+    with conn:
+        conn.executemany(
+            "UPDATE posts SET score = ?, age_bucket = ?, hot_score = ?, published_ts = ? WHERE id = ?",
+            zip(scores.tolist(), age_bucket.tolist(), hot_scores.tolist(), published_ts.tolist(), ids.tolist()),
+        )
+
+def filter_clauses(include, exclude, excluded_spaces):
+    # include/exclude: {space_id/user_id/community_id: values}; field names come from
+    # the caller's fixed list, values are always bound
+    clauses, params = [], []
+    for field, values in include.items():
+        clauses.append(f"{field} IN ({','.join('?' * len(values))})")
+        params.extend(values)
+    for field, values in exclude.items():
+        clauses.append(f"({field} IS NULL OR {field} NOT IN ({','.join('?' * len(values))}))")
+        params.extend(values)
+    if excluded_spaces:
+        clauses.append(f"COALESCE(space_name, 'General') NOT IN ({','.join('?' * len(excluded_spaces))})")
+        params.extend(excluded_spaces)
+    return clauses, params
+
+def page_posts(conn, sort, after = None, limit = 20, include = None, exclude = None, excluded_spaces = ()):
+    # Up to `limit` ranked posts after `after` = (age_bucket, key, id) of the last post
+    # served. Top walks age buckets in order and reads each one from the
+    # (age_bucket, score) index; hot and recent read their key's index directly, over
+    # every scored post.
+    key = SORT_KEYS[sort]
+    filters, filter_params = filter_clauses(include or {}, exclude or {}, list(excluded_spaces))
+    tier = None if after is None else after[0]
+    if sort == "top" and tier is None:
+        tier = conn.execute("SELECT MIN(age_bucket) FROM posts WHERE age_bucket >= 0").fetchone()[0]
+        if tier is None:
+            return []
+    posts = []
+    while len(posts) < limit:
+        clauses = ["age_bucket = ?" if sort == "top" else f"{key} IS NOT NULL"] + filters
+        params = ([tier] if sort == "top" else []) + filter_params
+        if after is not None:
+            clauses.append(f"({key}, id) < (?, ?)")
+            params.extend(after[1:])
+        rows = conn.execute(
+            f"SELECT data, score, age_bucket, hot_score, published_ts FROM posts WHERE {' AND '.join(clauses)} "
+            f"ORDER BY {key} DESC, id DESC LIMIT ?",
+            params + [limit - len(posts)],
+        ).fetchall()
+        for data, score, age_bucket, hot_score, published_ts in rows:
+            posts.append(dict(json.loads(data), score = score, age_bucket = age_bucket, hot_score = hot_score, published_ts = published_ts))
+        if sort != "top" or len(posts) == limit:
+            break
+        tier = conn.execute("SELECT MIN(age_bucket) FROM posts WHERE age_bucket > ?", (tier,)).fetchone()[0]
+        if tier is None:
+            break
+        after = None
+    return posts
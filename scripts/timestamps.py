@@ -0,0 +1,46 @@
+import warnings
+from datetime import datetime, timezone
+import numpy as np
+from metrics import Counter
+
+PARSE_CHUNK_SIZE = 65536
+
+TIMESTAMP_FALLBACKS = Counter("circle_timestamp_fallbacks_total", "Missing or unparseable dates replaced with the run time, counted on every pass")
+
+def utc_now_seconds():
+    return datetime.now(timezone.utc).timestamp()
+
+def _parse_one(value):
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except Exception:
+        return np.nan
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo = timezone.utc)
+    return dt.timestamp()
+
+def parse_timestamps(values):
+    # ISO-8601 strings -> float64 epoch seconds, NaN where missing or malformed.
+    # numpy parses a whole chunk in C; a chunk with a bad value falls back to
+    # per-value parsing so one broken date doesn't poison its neighbours.
+    values = np.array([v if isinstance(v, str) else None for v in values], dtype = object)
+    out = np.full(len(values), np.nan)
+    for start in range(0, len(values), PARSE_CHUNK_SIZE):
+        chunk = values[start:start + PARSE_CHUNK_SIZE]
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                parsed = chunk.astype("datetime64[ms]")
+        except (ValueError, TypeError):
+            out[start:start + len(chunk)] = [_parse_one(v) if v is not None else np.nan for v in chunk]
+            continue
+        seconds = parsed.astype("int64") / 1000
+        seconds[np.isnat(parsed)] = np.nan
+        out[start:start + len(chunk)] = seconds
+    return out
+
+def fill_missing(timestamps, now):
+    # unparseable dates are treated as "just published", same as the old per-post fallback
+    missing = np.isnan(timestamps)
+    TIMESTAMP_FALLBACKS.inc(int(missing.sum()))
+    return np.where(missing, now, timestamps)
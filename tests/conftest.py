@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the scripts import each other by module name, as when run from scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
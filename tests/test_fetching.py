@@ -0,0 +1,156 @@
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+import fetching
+import sqlite_store
+from mock_api import MockPostsServer
+
+HEADERS = {"Authorization": "Bearer test"}
+
+def make_post(post_id, day, likes = 0):
+    updated_at = f"2026-01-{day:02d}T00:00:00.000Z"
+    return {"id": post_id, "published_at": updated_at, "updated_at": updated_at, "likes_count": likes}
+
+def epoch(day, month = 1):
+    return datetime(2026, month, day, tzinfo = timezone.utc).timestamp()
+
+def test_sync_merges_new_and_updated_posts(tmp_path):
+    raw_path, state_path = tmp_path / "posts_raw.json", tmp_path / "posts_sync.json"
+    # newest first, as the API pages them
+    stored = [make_post(post_id, post_id) for post_id in range(10, 0, -1)]
+    fetching.save_raw_posts(stored, raw_path)
+    fetching.save_sync_state({"mark": fetching.high_water_mark(stored)}, state_path)
+
+    updated = dict(make_post(5, 5, likes = 3), updated_at = "2026-02-01T00:00:00.000Z")
+    new = dict(make_post(11, 11), updated_at = "2026-02-02T00:00:00.000Z")
+    served = [new, updated] + [post for post in stored if post["id"] != 5]
+    with MockPostsServer(served) as server:
+        posts = fetching.sync_posts(server.url, per_page = 3, headers = HEADERS, raw_path = raw_path, state_path = state_path)
+        requests = server.requests
+
+    expected = [new] + [updated if post["id"] == 5 else post for post in stored]
+    assert posts == expected
+    with open(raw_path) as f:
+        assert json.load(f) == expected
+    assert fetching.load_sync_state(state_path) == {"mark": [epoch(2, month = 2), 11]}
+    # page 1 holds both changes; page 2 is all known and below the mark, so paging stops there
+    assert requests == 2
+
+def test_sync_without_changes_keeps_store_and_mark(tmp_path):
+    raw_path, state_path = tmp_path / "posts_raw.json", tmp_path / "posts_sync.json"
+    stored = [make_post(post_id, post_id) for post_id in range(10, 0, -1)]
+    fetching.save_raw_posts(stored, raw_path)
+    fetching.save_sync_state({"mark": fetching.high_water_mark(stored)}, state_path)
+
+    with MockPostsServer(stored) as server:
+        posts = fetching.sync_posts(server.url, per_page = 3, headers = HEADERS, raw_path = raw_path, state_path = state_path)
+        requests = server.requests
+
+    assert posts == stored
+    assert fetching.load_sync_state(state_path) == {"mark": [epoch(10), 10]}
+    assert requests == 1
+
+def retries(reason):
+    return fetching.FETCH_RETRIES.values.get((str(reason),), 0)
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # backoff and Retry-After waits, recorded instead of slept
+    waits = []
+    monkeypatch.setattr(fetching, "time", SimpleNamespace(sleep = waits.append))
+    return waits
+
+def test_fetch_page_retries_server_errors_and_bad_bodies(sleeps):
+    posts = [make_post(post_id, post_id) for post_id in range(1, 4)]
+    before = {reason: retries(reason) for reason in (503, 502, "invalid_json")}
+    with MockPostsServer(posts, faults = {1: [503, 502, "truncated"]}) as server:
+        data, throttled = fetching.fetch_page(fetching.make_session(1), server.url, 1, 3, HEADERS)
+        requests = server.requests
+    assert data["records"] == posts
+    assert not throttled
+    assert requests == 4
+    assert len(sleeps) == 3
+    assert {reason: retries(reason) - count for reason, count in before.items()} == {503: 1, 502: 1, "invalid_json": 1}
+
+def test_fetch_page_waits_retry_after_on_429(sleeps):
+    posts = [make_post(1, 1)]
+    with MockPostsServer(posts, retry_after = 2.5, faults = {1: [429]}) as server:
+        data, throttled = fetching.fetch_page(fetching.make_session(1), server.url, 1, 3, HEADERS)
+    assert data["records"] == posts
+    assert throttled
+    assert sleeps == [2.5]
+
+def test_fetch_page_gives_up_on_client_errors_at_once(sleeps):
+    before = retries(404)
+    with MockPostsServer([make_post(1, 1)], faults = {1: [404]}) as server:
+        with pytest.raises(fetching.PageFetchError) as error:
+            fetching.fetch_page(fetching.make_session(1), server.url, 1, 3, HEADERS)
+        requests = server.requests
+    assert error.value.page == 1
+    assert requests == 1
+    assert sleeps == []
+    assert retries(404) == before
+
+@pytest.mark.parametrize("fault", [500, "truncated"])
+def test_fetch_all_reports_failed_pages(sleeps, fault):
+    posts = [make_post(post_id, post_id) for post_id in range(9, 0, -1)]
+    with MockPostsServer(posts, faults = {2: [fault] * (fetching.MAX_RETRIES + 1)}) as server:
+        fetched, failed = fetching.fetch_all(server.url, per_page = 3, headers = HEADERS, concurrency = 2)
+    assert failed == [2]
+    assert fetched == posts[:3] + posts[6:]
+    assert len(sleeps) == fetching.MAX_RETRIES
+
+def stored_posts(tmp_path, stored):
+    raw_path, state_path = tmp_path / "posts_raw.json", tmp_path / "posts_sync.json"
+    fetching.save_raw_posts(stored, raw_path)
+    fetching.save_sync_state({"mark": fetching.high_water_mark(stored)}, state_path)
+    return {"raw_path": raw_path, "state_path": state_path}
+
+def test_sync_finds_an_old_post_edited_beyond_page_one(tmp_path):
+    stored = [make_post(post_id, post_id) for post_id in range(12, 0, -1)]
+    paths = stored_posts(tmp_path, stored)
+    edited = dict(make_post(2, 2, likes = 1), updated_at = "2026-02-01T00:00:00.000Z")
+    # served in publish order, where the edit sits on page 4
+    served = [edited if post["id"] == 2 else post for post in stored]
+    with MockPostsServer(served) as server:
+        posts = fetching.sync_posts(server.url, per_page = 3, headers = HEADERS, **paths)
+        requests = server.requests
+    assert posts == served
+    # updated_at order puts the edit on page 1; page 2 is all known and below the mark
+    assert requests == 2
+
+def test_sync_reads_every_page_when_the_api_ignores_the_sort(tmp_path):
+    stored = [make_post(post_id, post_id) for post_id in range(12, 0, -1)]
+    stored[0] = make_post(12, 1)
+    paths = stored_posts(tmp_path, stored)
+    edited = dict(make_post(2, 2, likes = 1), updated_at = "2026-02-01T00:00:00.000Z")
+    served = [edited if post["id"] == 2 else post for post in stored]
+    with MockPostsServer(served, sortable = False) as server:
+        posts = fetching.sync_posts(server.url, per_page = 3, headers = HEADERS, **paths)
+        requests = server.requests
+    # page 1 isn't newest-updated first, so stopping there could miss the edit on page 4
+    assert posts == served
+    assert requests == 4
+
+def test_sync_picks_up_engagement_without_an_updated_at_bump(tmp_path):
+    stored = [make_post(post_id, post_id) for post_id in range(10, 0, -1)]
+    paths = stored_posts(tmp_path, stored)
+    served = [dict(post, likes_count = 7) if post["id"] == 9 else post for post in stored]
+    with MockPostsServer(served) as server:
+        posts = fetching.sync_posts(server.url, per_page = 3, headers = HEADERS, **paths)
+    assert posts == served
+
+def test_sync_db_finds_edits_and_engagement_changes(tmp_path):
+    conn = sqlite_store.connect(tmp_path / "posts.db")
+    stored = [make_post(post_id, post_id) for post_id in range(12, 0, -1)]
+    with MockPostsServer(stored) as server:
+        fetching.fetch_all_db(server.url, conn, per_page = 3, headers = HEADERS, concurrency = 1)
+    edited = dict(make_post(2, 2, likes = 1), updated_at = "2026-02-01T00:00:00.000Z")
+    served = [edited if post["id"] == 2 else dict(post, comments_count = 4) if post["id"] == 11 else post for post in stored]
+    with MockPostsServer(served) as server:
+        changed = fetching.sync_posts_db(server.url, conn, per_page = 3, headers = HEADERS)
+    rows = {post_id: json.loads(data) for post_id, data in conn.execute("SELECT id, data FROM raw_posts")}
+    conn.close()
+    assert changed == 2
+    assert rows == {post["id"]: post for post in served}
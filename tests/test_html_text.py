@@ -0,0 +1,37 @@
+from html_text import strip_html, truncate_words
+
+def test_strips_tags_comments_and_entities():
+    assert strip_html("<p>Hello <b>there</b><!-- note --> &amp; welcome</p>") == "Hello there & welcome"
+    assert strip_html("plain text") == "plain text"
+    assert strip_html(None) == ""
+
+def test_lone_angle_bracket_stays_text():
+    assert strip_html("<p>a < b and c > d</p>") == "a < b and c > d"
+    assert strip_html("1 <3 you") == "1 <3 you"
+    assert strip_html("<p>x <= y</p>") == "x <= y"
+    assert strip_html("a </ b") == "a </ b"
+
+def test_drops_script_and_style_bodies():
+    assert strip_html("<p>x</p><script>var a = 1;</script><style>p { color: red }</style><p>y</p>") == "xy"
+    assert strip_html("<p>a</p><SCRIPT type=\"text/javascript\">if (a < b) { run() }</SCRIPT>b") == "ab"
+    # an unclosed script swallows the rest, as html.parser does
+    assert strip_html("<p>a</p><script>never closed") == "a"
+    # only the exact tag names are raw text
+    assert strip_html("<scripts>t</scripts>") == "t"
+
+def test_quoted_angle_bracket_stays_in_the_tag():
+    assert strip_html("<a title=\"a>b\">link</a>") == "link"
+    assert strip_html("<div data-x=\"1 > 0\">t</div>") == "t"
+    assert strip_html("<p class='x>y'>q</p>") == "q"
+    assert strip_html("<script type=\"a>b\">x</script>y") == "y"
+
+def test_cdata_is_text():
+    assert strip_html("<![CDATA[hi]]>") == "hi"
+    # as written: neither tags nor entities inside it are touched
+    assert strip_html("<p><![CDATA[a < b &amp; <i>c</i>]]></p>") == "a < b &amp; <i>c</i>"
+    # unclosed, it isn't a CDATA section at all
+    assert strip_html("x <![CDATA[open") == "x <![CDATA[open"
+
+def test_truncate_words():
+    assert truncate_words("one two three", word_limit = 3) == ("one two three", False)
+    assert truncate_words("one two three four", word_limit = 3) == ("one two three ...", True)
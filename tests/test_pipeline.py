@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+import pytest
+import fetching
+import pipeline
+from mock_api import MockPostsServer
+
+def make_post(post_id):
+    return {"id": post_id, "published_at": "2026-01-01T00:00:00.000Z", "body": {"body": f"<p>post {post_id}</p>", "record_type": "Post"}}
+
+@pytest.fixture
+def outputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(fetching, "API_TOKEN", "test")
+    monkeypatch.setattr(fetching, "time", SimpleNamespace(sleep = lambda seconds: None))
+    raw_path, clean_path = tmp_path / "posts_raw.ndjson", tmp_path / "posts_clean.ndjson"
+    raw_path.write_text("old raw\n")
+    clean_path.write_text("old clean\n")
+    return raw_path, clean_path
+
+def leftovers(tmp_path):
+    return sorted(path.name for path in tmp_path.iterdir() if ".tmp" in path.name)
+
+def test_fetch_and_process_replaces_both_outputs(tmp_path, outputs):
+    raw_path, clean_path = outputs
+    with MockPostsServer([make_post(post_id) for post_id in range(1, 6)]) as server:
+        count, failed = pipeline.fetch_and_process(server.url, concurrency = 1, raw_path = raw_path, clean_path = clean_path)
+    assert (count, failed) == (5, [])
+    assert len(raw_path.read_text().splitlines()) == len(clean_path.read_text().splitlines()) == 5
+    assert leftovers(tmp_path) == []
+
+def test_failed_pages_leave_previous_outputs(tmp_path, outputs):
+    raw_path, clean_path = outputs
+    posts = [make_post(post_id) for post_id in range(1, 251)]
+    with MockPostsServer(posts, faults = {2: ["truncated"] * (fetching.MAX_RETRIES + 1)}) as server:
+        count, failed = pipeline.fetch_and_process(server.url, concurrency = 1, raw_path = raw_path, clean_path = clean_path)
+    assert failed == [2]
+    assert (raw_path.read_text(), clean_path.read_text()) == ("old raw\n", "old clean\n")
+    assert leftovers(tmp_path) == []
+
+def test_an_error_midway_leaves_no_temp_files(tmp_path, outputs, monkeypatch):
+    raw_path, clean_path = outputs
+    def broken(records):
+        raise RuntimeError("processing failed")
+        yield
+    monkeypatch.setattr(pipeline, "process_stream", broken)
+    with MockPostsServer([make_post(1)]) as server:
+        with pytest.raises(RuntimeError):
+            pipeline.fetch_and_process(server.url, concurrency = 1, raw_path = raw_path, clean_path = clean_path)
+    assert (raw_path.read_text(), clean_path.read_text()) == ("old raw\n", "old clean\n")
+    assert leftovers(tmp_path) == []
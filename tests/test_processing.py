@@ -0,0 +1,42 @@
+import json
+import processing
+
+def make_raw(post_id, likes = 0, body = "<p>Hello <b>there</b></p>"):
+    return {"id": post_id, "published_at": "2026-01-01T00:00:00.000Z", "likes_count": likes, "body": {"body": body, "record_type": "Post"}}
+
+def write_raw(path, posts):
+    with open(path, "w") as f:
+        for post in posts:
+            f.write(json.dumps(post) + "\n")
+
+def stream_paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(processing, "RAW_STREAM_PATH", tmp_path / "posts_raw.ndjson")
+    monkeypatch.setattr(processing, "PROCESSED_STREAM_PATH", tmp_path / "posts_clean.ndjson")
+    monkeypatch.setattr(processing, "STREAM_MANIFEST_PATH", tmp_path / "posts_stream_manifest.npz")
+
+def test_stream_carries_unchanged_lines_forward(tmp_path, monkeypatch):
+    stream_paths(tmp_path, monkeypatch)
+    posts = [make_raw(post_id) for post_id in range(1, 6)]
+    write_raw(processing.RAW_STREAM_PATH, posts)
+    processing.main_stream()
+
+    posts[1] = make_raw(2, likes = 4)
+    posts[2] = make_raw(3, body = "<p>edited</p>")
+    del posts[3]
+    posts.append(make_raw(9))
+    write_raw(processing.RAW_STREAM_PATH, posts)
+    processing.main_stream()
+    incremental = processing.PROCESSED_STREAM_PATH.read_bytes()
+    manifest = processing.load_manifest(processing.STREAM_MANIFEST_PATH, processing.PROCESSED_STREAM_PATH)
+    assert sorted(manifest["changed"].tolist()) == [2, 3, 9]
+    assert manifest["removed"].tolist() == [4]
+
+    # every saved offset starts its post's line
+    lines = incremental.split(b"\n")[:-1]
+    assert [json.loads(incremental[offset:].split(b"\n", 1)[0])["id"] for offset in manifest["offset"].tolist()] == [1, 2, 3, 5, 9]
+
+    # the same bytes as cleaning everything from scratch
+    processing.PROCESSED_STREAM_PATH.unlink()
+    processing.main_stream()
+    assert processing.PROCESSED_STREAM_PATH.read_bytes() == incremental
+    assert [json.loads(line)["body_text"] for line in lines] == ["Hello there", "Hello there", "edited", "Hello there", "Hello there"]
@@ -0,0 +1,77 @@
+import os
+import app
+import fetching
+import refresher
+from mock_api import MockPostsServer
+
+def make_version(version):
+    directory = refresher.VERSIONS_DIR / version
+    directory.mkdir(parents = True)
+    for name in refresher.PUBLISHED_FILES:
+        (directory / name).write_text(version)
+
+def published_dirs(paths):
+    return {os.path.basename(os.path.dirname(path)) for path in paths}
+
+def test_publish_swaps_one_link_and_app_resolves_it_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(refresher, "PROCESSED_DIR", tmp_path)
+    monkeypatch.setattr(refresher, "VERSIONS_DIR", tmp_path / "versions")
+    monkeypatch.setattr(refresher, "CURRENT_LINK", tmp_path / "current")
+    for name in ("STORE_PATH", "STORE_OFFSETS_PATH", "ORDERINGS_PATH"):
+        monkeypatch.setattr(app, name, str(tmp_path / os.path.basename(getattr(app, name))))
+    make_version("v1")
+    make_version("v2")
+
+    refresher.publish("v1")
+    assert refresher.current_version() == "v1"
+    paths = app.output_paths(str(tmp_path / "posts_index.npy"))
+    assert published_dirs(paths) == {"v1"}
+
+    # a publish between resolving and opening doesn't move the files already resolved
+    refresher.publish("v2")
+    assert refresher.current_version() == "v2"
+    assert [open(path).read() for path in paths] == ["v1"] * 4
+    assert published_dirs(app.output_paths(str(tmp_path / "posts_index.npy"))) == {"v2"}
+    for name in refresher.PUBLISHED_FILES:
+        assert os.readlink(tmp_path / name) == os.path.join("current", name)
+
+def test_publish_replaces_per_file_links(tmp_path, monkeypatch):
+    # the layout before current/: one link per file straight into a version
+    monkeypatch.setattr(refresher, "PROCESSED_DIR", tmp_path)
+    monkeypatch.setattr(refresher, "VERSIONS_DIR", tmp_path / "versions")
+    monkeypatch.setattr(refresher, "CURRENT_LINK", tmp_path / "current")
+    make_version("v1")
+    make_version("v2")
+    for name in refresher.PUBLISHED_FILES:
+        os.symlink(os.path.join("versions", "v1", name), tmp_path / name)
+
+    refresher.publish("v2")
+    for name in refresher.PUBLISHED_FILES:
+        assert (tmp_path / name).read_text() == "v2"
+
+def test_full_fetch_drops_posts_deleted_upstream(tmp_path, monkeypatch):
+    # the pipeline's data/ paths are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data" / "raw").mkdir(parents = True)
+    (tmp_path / "data" / "processed").mkdir()
+    monkeypatch.setattr(fetching, "API_TOKEN", "test")
+    posts = [{"id": post_id, "published_at": f"2026-01-{post_id:02d}T00:00:00.000Z", "updated_at": f"2026-01-{post_id:02d}T00:00:00.000Z"} for post_id in range(6, 0, -1)]
+    status = {"inputs": {}}
+
+    def stored_ids():
+        return [post["id"] for post in fetching.load_raw_posts()]
+
+    with MockPostsServer(posts) as server:
+        assert refresher.refresh(status, server.url, concurrency = 1) == "published"
+    assert stored_ids() == [6, 5, 4, 3, 2, 1]
+    assert "full_fetch" in status["stages"]
+
+    del posts[2]
+    with MockPostsServer(posts) as server:
+        # an incremental sync can't tell a deleted post from one it didn't reach
+        refresher.refresh(status, server.url, concurrency = 1)
+        assert "fetch" in status["stages"]
+        assert stored_ids() == [6, 5, 4, 3, 2, 1]
+        refresher.refresh(status, server.url, concurrency = 1, full_fetch_after = 0)
+        assert "full_fetch" in status["stages"]
+        assert stored_ids() == [6, 5, 3, 2, 1]
@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+import scoring
+from post_table import PostTable
+from ranking import score_posts, compute_hot_score
+from sharded_scoring import score_sharded, SHARD_KEYS
+
+NOW = 1792340000.0
+
+CONFIGS = {
+    "global": scoring.DEFAULT_CONFIG,
+    "bucket": scoring.DEFAULT_CONFIG._replace(normalization = "bucket"),
+    "log": scoring.DEFAULT_CONFIG._replace(mode = "log"),
+    "quantile": scoring.DEFAULT_CONFIG._replace(scaling = "quantile"),
+}
+
+def iso(ts):
+    return np.datetime_as_string(np.asarray(ts * 1000, dtype = np.int64).astype("datetime64[ms]"), unit = "ms").tolist()
+
+def make_records(n, seed = 0):
+    rng = np.random.default_rng(seed)
+    published = NOW - rng.uniform(0, 120 * 86400, n)
+    updated = published + rng.uniform(0, 3600, n)
+    return [
+        {
+            "id": post_id,
+            "published_at": published_at + "Z",
+            "updated_at": updated_at + "Z",
+            "likes_count": likes,
+            "comments_count": comments,
+            "space_id": space_id,
+            "community_id": community_id,
+        }
+        for post_id, published_at, updated_at, likes, comments, space_id, community_id in zip(
+            range(1, n + 1), iso(published), iso(updated),
+            np.minimum(rng.zipf(1.8, n) - 1, 5000).tolist(), np.minimum(rng.zipf(2.2, n) - 1, 500).tolist(),
+            rng.integers(1, 40, n).tolist(), (rng.zipf(1.5, n) % 3 + 1).tolist(),
+        )
+    ]
+
+@pytest.mark.parametrize("shard_by", SHARD_KEYS)
+@pytest.mark.parametrize("config", CONFIGS.values(), ids = CONFIGS.keys())
+def test_sharded_matches_serial(shard_by, config):
+    table = PostTable.from_records(make_records(3000))
+    likes, comments = table.column("likes_count"), table.column("comments_count")
+    published_ts = scoring.load_published_at(table, NOW)
+    scores, bucket, _ = score_posts(likes, comments, published_ts, NOW, config)
+    hot_scores = np.round(compute_hot_score(likes, comments, published_ts, NOW), 6)
+
+    keys = scoring.shard_keys(table, published_ts, NOW, config, shard_by)
+    sharded = score_sharded(likes, comments, published_ts, NOW, config, keys, workers = 2)
+    # bit for bit, not approximately: the ranking must not depend on the worker count
+    for got, expected in zip(sharded, (scores, bucket, hot_scores)):
+        assert np.array_equal(got, expected)
+
+def score_full(records, config, now = NOW):
+    table = PostTable.from_records(records)
+    published_ts = scoring.load_published_at(table, now)
+    bucket = scoring.assign_buckets(scoring.compute_age_in_days(published_ts, now), config.buckets)
+    return scoring.assign_scores(table, published_ts, bucket, config), published_ts, bucket
+
+def edit_posts(records):
+    # one edited post, one removed and one new, all inside the previous run's bounds
+    # so the incremental path is taken rather than its full-pass fallback
+    likes = sorted(record["likes_count"] for record in records)
+    median = likes[len(likes) // 2]
+    edited = next(i for i, record in enumerate(records) if record["likes_count"] == median)
+    records = [dict(record) for record in records]
+    records[edited]["likes_count"] += 1
+    records[edited]["updated_at"] = "2026-10-19T00:00:00.000Z"
+    del records[edited + 1]
+    new = dict(records[edited + 1], id = len(records) + 10, likes_count = median)
+    records.append(new)
+    return records, [records[edited]["id"], new["id"]]
+
+@pytest.mark.parametrize("config", [CONFIGS["global"], CONFIGS["log"], CONFIGS["quantile"]], ids = ["global", "log", "quantile"])
+@pytest.mark.parametrize("from_manifest", [False, True], ids = ["fields", "changed_ids"])
+def test_incremental_matches_full(tmp_path, monkeypatch, config, from_manifest):
+    monkeypatch.setattr(scoring, "STATE_PATH", tmp_path / "scoring_state.npz")
+    records = make_records(2000, seed = 1)
+    # undated posts are dated "now", which is a minute later on the second run
+    records[5]["published_at"] = None
+    records[6]["published_at"] = "not a date"
+    table, published_ts, bucket = score_full(records, config)
+    scoring.save_state(table, published_ts, bucket, scoring.table_bounds(table, published_ts, bucket, config)[1], config)
+
+    records, changed_ids = edit_posts(records)
+    expected, published_ts, bucket = score_full(records, config, now = NOW + 60)
+    table = PostTable.from_records(records)
+    table, rescored = scoring.assign_scores_incremental(
+        table, published_ts, bucket, scoring.load_state(), config, np.asarray(changed_ids) if from_manifest else None,
+    )
+
+    assert np.array_equal(table.column("score"), expected.column("score"))
+    # weighted scores are scaled by the newest publish time, which the undated posts
+    # just moved, so those runs fall back to a full pass
+    assert rescored == (len(changed_ids) + 2 if config.mode == "log" else len(records))
+
+def test_incremental_rescores_everything_when_bounds_move(tmp_path, monkeypatch):
+    monkeypatch.setattr(scoring, "STATE_PATH", tmp_path / "scoring_state.npz")
+    config = CONFIGS["global"]
+    records = make_records(500, seed = 2)
+    table, published_ts, bucket = score_full(records, config)
+    scoring.save_state(table, published_ts, bucket, scoring.table_bounds(table, published_ts, bucket, config)[1], config)
+
+    records = [dict(record) for record in records]
+    records[0]["likes_count"] = max(record["likes_count"] for record in records) + 1
+    expected, published_ts, bucket = score_full(records, config)
+    table, rescored = scoring.assign_scores_incremental(PostTable.from_records(records), published_ts, bucket, scoring.load_state(), config)
+
+    assert np.array_equal(table.column("score"), expected.column("score"))
+    assert rescored == len(records)
+
+@pytest.mark.parametrize("config", [CONFIGS["global"], CONFIGS["log"], CONFIGS["quantile"]], ids = ["global", "log", "quantile"])
+@pytest.mark.parametrize("from_manifest", [False, True], ids = ["fields", "changed_ids"])
+def test_incremental_matches_full_a_day_later(tmp_path, monkeypatch, config, from_manifest):
+    # nothing was edited, but posts crossed into older age buckets
+    monkeypatch.setattr(scoring, "STATE_PATH", tmp_path / "scoring_state.npz")
+    records = make_records(2000, seed = 3)
+    table, published_ts, bucket = score_full(records, config)
+    scoring.save_state(table, published_ts, bucket, scoring.table_bounds(table, published_ts, bucket, config)[1], config)
+
+    expected, published_ts, later_bucket = score_full(records, config, now = NOW + 86400)
+    changed_ids = np.empty(0, dtype = np.int64) if from_manifest else None
+    table, rescored = scoring.assign_scores_incremental(PostTable.from_records(records), published_ts, later_bucket, scoring.load_state(), config, changed_ids)
+
+    assert np.array_equal(table.column("score"), expected.column("score"))
+    # log scores don't depend on the bucket, so moving one re-scores nothing
+    assert rescored == (0 if config.mode == "log" else np.count_nonzero(later_bucket != bucket))
@@ -0,0 +1,37 @@
+import threading
+import zipfile
+import app
+import live_server
+
+def failing_then(errors, done):
+    # raises each of errors in turn, then sets done
+    errors = list(errors)
+    def call(*args):
+        if errors:
+            raise errors.pop(0)
+        done.set()
+        return 0
+    return call
+
+def test_feed_watcher_survives_any_reload_error():
+    failed = app.FEED_RELOADS.values.get(("failed",), 0)
+    loaded = threading.Event()
+    cache = app.FeedCache("missing.npy", interval = 0.01)
+    # the watcher thread outlives the test, so it keeps this stand-in for good
+    cache.load = failing_then([KeyError("hot"), zipfile.BadZipFile("truncated"), OSError("gone")], loaded)
+    threading.Thread(target = cache._watch, daemon = True).start()
+    assert loaded.wait(5)
+    assert app.FEED_RELOADS.values.get(("failed",), 0) - failed == 3
+
+def test_snapshot_loop_survives_a_failed_snapshot(monkeypatch, tmp_path):
+    saved = threading.Event()
+    monkeypatch.setattr(live_server, "save_snapshot", failing_then([OSError("disk full"), RuntimeError("boom")], saved))
+    server = live_server.LiveServer(None, tmp_path / "posts_live.json", interval = 0.01, port = 0)
+    thread = threading.Thread(target = server._snapshot_loop, daemon = True)
+    thread.start()
+    try:
+        assert saved.wait(5)
+    finally:
+        server._stop.set()
+        thread.join(5)
+        server._server.server_close()